@@ -0,0 +1,91 @@
+"""
+Benchmark del almacén de barras intradía con millones de barras por símbolo.
+
+Genera barras sintéticas de 1 minuto, las añade al almacén en bloques de un
+día (como haría la actualización diaria) y mide el tiempo y el pico de
+memoria (tracemalloc) de append, del remuestreo completo a varios intervalos
+y de la ventana que se pasa a los modelos.
+
+Uso:
+    python -m benchmarks.bench_bar_store --bars 1000000 5000000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.bar_store import BarStore, BAR_DTYPE, FEATURE_WINDOW
+
+MINUTE_NS = 60 * 10 ** 9
+BARS_PER_DAY = 390
+
+def synthetic_bars(n_bars, seed=42, start="2010-01-04T14:30"):
+    """Barras de 1 minuto (390 por sesión, sesiones consecutivas) con un paseo aleatorio."""
+    rng = np.random.default_rng(seed)
+    day, minute = np.divmod(np.arange(n_bars), BARS_PER_DAY)
+    bars = np.empty(n_bars, dtype=BAR_DTYPE)
+    bars['ts'] = np.datetime64(start, 'ns').astype(np.int64) + day * 86400 * 10 ** 9 + minute * MINUTE_NS
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, n_bars)))
+    bars['open'] = np.r_[close[0], close[:-1]]
+    bars['close'] = close
+    bars['high'] = np.maximum(bars['open'], close) * 1.0002
+    bars['low'] = np.minimum(bars['open'], close) * 0.9998
+    bars['volume'] = rng.integers(100, 10000, n_bars)
+    return bars
+
+def measure(func):
+    """Returns: tuple (resultado, tiempo de pared en s, pico de memoria en MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, wall, peak / 2 ** 20
+
+def run_case(n_bars, intervals, seed):
+    root = tempfile.mkdtemp()
+    try:
+        store = BarStore(root)
+        bars = synthetic_bars(n_bars, seed)
+
+        def append_all():
+            for start in range(0, n_bars, BARS_PER_DAY):
+                store.append("SYN", bars[start:start + BARS_PER_DAY])
+        results = {'append': measure(append_all)[1:]}
+        del bars
+
+        for interval in intervals:
+            count, wall, peak = measure(lambda: sum(len(chunk) for chunk in store.iter_resampled("SYN", interval)))
+            results[f"resample {interval} ({count})"] = (wall, peak)
+        results['window'] = measure(lambda: store.window("SYN", FEATURE_WINDOW, "5m"))[1:]
+        size = sum(os.path.getsize(path) for path in store.partitions("SYN"))
+        return results, size
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del almacén de barras intradía")
+    parser.add_argument("--bars", type=int, nargs='+', default=[1_000_000], help="Barras de 1 minuto por símbolo")
+    parser.add_argument("--intervals", nargs='+', default=["5m", "1h", "1d"])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'caso':<40} {'tiempo (s)':>12} {'pico (MB)':>10}")
+    for n_bars in args.bars:
+        results, size = run_case(n_bars, args.intervals, args.seed)
+        print(f"--- {n_bars} barras, {size / 2 ** 20:.1f} MB en disco")
+        for name, (wall, peak) in results.items():
+            print(f"{name:<40} {wall:>12.4f} {peak:>10.2f}")
+
+if __name__ == "__main__":
+    main()
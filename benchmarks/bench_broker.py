@@ -0,0 +1,134 @@
+"""
+Benchmark del camino de órdenes contra el broker simulado.
+
+Mide el tiempo total de close_positions + execute_trades (y de un ciclo de
+monitor_positions) para distintos tamaños de universo, sin tocar Alpaca.
+
+Uso:
+    python -m benchmarks.bench_broker --sizes 8 100 1000 --latency 0.005
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+
+# El módulo broker crea el cliente REST al importarse: basta con credenciales ficticias
+os.environ.setdefault("ALPACA_API_KEY", "benchmark")
+os.environ.setdefault("ALPACA_SECRET_KEY", "benchmark")
+os.environ["TELEGRAM_API_TOKEN"] = ""
+os.environ["TELEGRAM_CHAT_ID"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution import broker
+from execution.simulator import SimulatedBroker
+from execution.trade_journal import TradeJournal, set_trade_journal
+import position_monitor_action
+
+def build_scenario(n_symbols, latency, jitter, error_rate, seed):
+    """
+    Crea un broker simulado con n símbolos, la mitad con posición abierta,
+    y un objetivo que mantiene, invierte, abre y cierra posiciones.
+    """
+    rng = random.Random(seed)
+    symbols = [f"S{i:04d}" for i in range(n_symbols)]
+    prices = {s: rng.uniform(20, 500) for s in symbols}
+    sim = SimulatedBroker(prices, cash=1_000_000 * max(1, n_symbols / 8),
+                          latency=latency, jitter=jitter, error_rate=error_rate, seed=seed)
+
+    for s in symbols[: n_symbols // 2]:
+        sim.set_position(s, rng.choice([-1, 1]) * rng.randint(1, 50))
+
+    # Objetivo sobre los tres últimos cuartos: se cierra el primer cuarto,
+    # el segundo mantiene o invierte posición y la segunda mitad abre posiciones nuevas
+    targets = {s: rng.choice([-1, 1]) * rng.uniform(0.01, 0.05) for s in symbols[n_symbols // 4:]}
+    return sim, targets
+
+def run_case(n_symbols, latency, jitter, error_rate, seed, concurrent=False, net=False):
+    sim, targets = build_scenario(n_symbols, latency, jitter, error_rate, seed)
+    broker.api = sim
+    broker.invalidate_snapshot()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = TradeJournal(os.path.join(tmp, "trade_journal.db"), legacy_log=None)
+        set_trade_journal(journal)
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            if net:
+                # Rebalanceo neto: una sola pasada, sin fase de cierre separada
+                closed = start
+                try:
+                    failed = len(broker.rebalance(targets, concurrent=concurrent))
+                except Exception:
+                    # Sin foto de la cuenta no se envía ninguna orden
+                    failed = None
+            else:
+                failed = 0
+                broker.close_positions(targets)
+                closed = time.perf_counter()
+                broker.execute_trades(targets, concurrent=concurrent)
+            executed = time.perf_counter()
+            rebalance_calls = sim.total_calls()
+            orders = len(sim.orders)
+
+            position_monitor_action.monitor_positions(api=sim, check_calendar=False)
+            monitored = time.perf_counter()
+        journal.close()
+
+    return {
+        'symbols': n_symbols,
+        'close_positions_s': round(closed - start, 4),
+        'execute_trades_s': round(executed - closed, 4),
+        'rebalance_s': round(executed - start, 4),
+        'rebalance_api_calls': rebalance_calls,
+        'monitor_s': round(monitored - executed, 4),
+        'monitor_api_calls': sim.total_calls() - rebalance_calls,
+        'orders': orders,
+        'order_errors': failed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del camino de órdenes con broker simulado")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[8, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.005, help="Latencia por llamada (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación máxima de latencia (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de error por llamada")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrent", action='store_true', help="Usar el modo concurrente de execute_trades")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Peticiones por segundo del modo concurrente (por defecto el límite de Alpaca)")
+    parser.add_argument("--net", action='store_true', help="Usar rebalance (órdenes netas) en lugar de las dos pasadas")
+    parser.add_argument("--in-flight", type=int, default=None, help="Tickers en vuelo en modo concurrente")
+    parser.add_argument("--output", default=None, help="Fichero JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    if args.rate_limit:
+        broker.BROKER_RATE_LIMIT = args.rate_limit
+        broker.BROKER_RATE_BURST = max(broker.BROKER_RATE_BURST, int(args.rate_limit))
+    if args.in_flight:
+        broker.MAX_IN_FLIGHT_ORDERS = args.in_flight
+
+    results = [run_case(n, args.latency, args.jitter, args.error_rate, args.seed, args.concurrent, args.net)
+               for n in args.sizes]
+
+    header = (f"{'símbolos':>9} {'close (s)':>10} {'execute (s)':>12} {'total (s)':>10} {'llamadas':>9} "
+              f"{'órdenes':>8} {'errores':>8} {'monitor (s)':>12} {'llamadas':>9}")
+    print(header)
+    for r in results:
+        print(f"{r['symbols']:>9} {r['close_positions_s']:>10.3f} {r['execute_trades_s']:>12.3f} "
+              f"{r['rebalance_s']:>10.3f} {r['rebalance_api_calls']:>9} {r['orders']:>8} "
+              f"{'abortado' if r['order_errors'] is None else r['order_errors']:>8} "
+              f"{r['monitor_s']:>12.3f} {r['monitor_api_calls']:>9}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'latency': args.latency, 'error_rate': args.error_rate,
+                       'concurrent': args.concurrent, 'net': args.net, 'results': results}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
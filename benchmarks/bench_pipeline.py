@@ -0,0 +1,260 @@
+"""
+Benchmark de los caminos calientes del pipeline sobre universos sintéticos.
+
+Mide por separado, para cada tamaño de universo (tickers x años), el tiempo
+de pared (mínimo de --repeat ejecuciones) y el pico de memoria (tracemalloc,
+en una ejecución aparte para no distorsionar el tiempo) de:
+
+    get_data (fuente local), train_model, predict_returns, create_sequences,
+    predict_lstm_returns, combine_predictions, generate_signals,
+    apply_risk_controls, rebalance y monitor_positions (broker simulado)
+
+Los caminos cuyo módulo no se puede importar (p.ej. sin keras o yfinance)
+se marcan como omitidos.
+
+Con --compact se mide el modo numérico compacto (float32, ver utils/numeric.py).
+
+Con --save-baseline se guardan los resultados como referencia; con
+--baseline se comparan contra ella y el proceso termina con código 1 si
+algún camino empeora más que la tolerancia.
+
+Uso:
+    python -m benchmarks.bench_pipeline --tickers 8 100 --years 1 5 --save-baseline baseline.json
+    python -m benchmarks.bench_pipeline --tickers 8 100 --years 1 5 --baseline baseline.json --tolerance 0.25
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import tracemalloc
+import contextlib
+import logging
+from datetime import datetime
+
+os.environ.setdefault("ALPACA_API_KEY", "benchmark")
+os.environ.setdefault("ALPACA_SECRET_KEY", "benchmark")
+os.environ["TELEGRAM_API_TOKEN"] = ""
+os.environ["TELEGRAM_CHAT_ID"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_panel, local_downloader
+from benchmarks.bench_broker import build_scenario
+from execution import broker
+from execution.trade_journal import TradeJournal, set_trade_journal
+from model.predictor import train_model, predict_returns
+from utils import numeric
+from strategy.risk_manager import generate_signals, apply_risk_controls
+import position_monitor_action
+
+# Módulos con dependencias opcionales en este entorno
+_skipped = {}
+try:
+    from data.data_loader import get_data
+except ImportError as e:
+    get_data = None
+    _skipped['get_data'] = str(e)
+try:
+    from model import lstm_model
+    from utils.scheduler import combine_predictions
+except ImportError as e:
+    lstm_model = combine_predictions = None
+    for path in ('create_sequences', 'predict_lstm_returns', 'combine_predictions'):
+        _skipped[path] = str(e)
+
+PATHS = ['get_data', 'train_model', 'predict_returns', 'create_sequences', 'predict_lstm_returns',
+         'combine_predictions', 'generate_signals', 'apply_risk_controls', 'rebalance', 'monitor_positions']
+
+# Por debajo de esta diferencia absoluta (s / MB) no se considera regresión: es ruido
+MIN_WALL_DELTA = 0.005
+MIN_MEMORY_DELTA_MB = 1.0
+
+def measure(func, setup=None, repeat=3):
+    """
+    Ejecuta func (con los argumentos que devuelva setup, fuera del tiempo medido).
+
+    Returns:
+        tuple: (resultado, mejor tiempo de pared en s, pico de memoria en MB)
+    """
+    walls = []
+    result = None
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        result = func(*args)
+        walls.append(time.perf_counter() - start)
+
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, min(walls), peak / 2 ** 20
+
+def _broker_setup(n_tickers, seed):
+    """Broker simulado sin latencia y diario temporal, recreados en cada ejecución."""
+    tmp = tempfile.mkdtemp()
+    journals = []
+    def setup():
+        sim, targets = build_scenario(n_tickers, 0.0, 0.0, 0.0, seed)
+        broker.api = sim
+        broker.invalidate_snapshot()
+        if journals:
+            journals.pop().close()
+        journals.append(TradeJournal(os.path.join(tmp, f"journal_{time.perf_counter_ns()}.db"), legacy_log=None))
+        set_trade_journal(journals[-1])
+        return sim, targets
+    return setup
+
+def run_case(n_tickers, years, paths, repeat, estimators, lstm_tickers, seed):
+    """Mide los caminos pedidos para un universo de n_tickers x years."""
+    panel = synthetic_panel(n_tickers, years, seed=seed)
+    if numeric.is_compact():
+        panel = numeric.price_frame(numeric.price_block(panel), panel.index, panel.columns)
+        returns = numeric.simple_returns(numeric.price_block(panel))
+    else:
+        returns = panel.pct_change().dropna()
+    results = {}
+
+    def run(path, func):
+        # Los caminos no pedidos se ejecutan igualmente (sin medir) si los siguientes necesitan su resultado
+        if path in _skipped:
+            if path in paths:
+                results[path] = {'skipped': _skipped[path]}
+            return None
+        if path not in paths:
+            return func()
+        result, wall, peak = measure(func, repeat=repeat)
+        results[path] = {'wall_s': round(wall, 6), 'peak_mb': round(peak, 3)}
+        return result
+
+    if 'get_data' in paths:
+        run('get_data', lambda: get_data(f"{years:g}y", "1d", tickers=list(panel.columns),
+                                         downloader=local_downloader(panel)))
+
+    rf_model = run('train_model', lambda: train_model(panel, n_estimators=estimators))
+    rf_predictions = run('predict_returns', lambda: predict_returns(rf_model, panel))
+
+    lstm_predictions = {}
+    if 'create_sequences' in paths:
+        run('create_sequences', lambda: [lstm_model.create_sequences(panel[t].to_numpy(), lstm_model.sequence_length)
+                                         for t in panel.columns])
+    if 'predict_lstm_returns' in paths and lstm_model is not None:
+        # Modelos mínimos sobre un subconjunto: interesa el coste de la inferencia
+        subset = panel[panel.columns[:lstm_tickers]]
+        with tempfile.TemporaryDirectory() as model_dir:
+            models = lstm_model.train_lstm_model(subset, model_dir=model_dir, epochs=1, units=8)
+            lstm_predictions = run('predict_lstm_returns', lambda: lstm_model.predict_lstm_returns(models, subset))
+    elif 'predict_lstm_returns' in paths:
+        run('predict_lstm_returns', None)
+
+    predictions = run('combine_predictions', lambda: combine_predictions(panel, rf_predictions, lstm_predictions))
+    if predictions is None:
+        predictions = rf_predictions
+    signals = run('generate_signals', lambda: generate_signals(panel, predictions))
+    if 'apply_risk_controls' in paths:
+        # Sin límite de drawdown: un universo aleatorio suele superarlo y el filtro terminaría antes de tiempo
+        run('apply_risk_controls', lambda: apply_risk_controls(signals, panel, 10000, returns, predictions,
+                                                               max_drawdown_allowed=float('inf')))
+    return results
+
+def run_broker_case(n_tickers, paths, repeat, seed):
+    """Mide rebalance y un ciclo de monitor_positions contra el broker simulado."""
+    results = {}
+    setup = _broker_setup(n_tickers, seed)
+    if 'rebalance' in paths:
+        _, wall, peak = measure(lambda sim, targets: broker.rebalance(targets), setup, repeat)
+        results['rebalance'] = {'wall_s': round(wall, 6), 'peak_mb': round(peak, 3)}
+    if 'monitor_positions' in paths:
+        # Sin el calendario local: el mercado lo decide el reloj del broker simulado
+        monitor = lambda sim, targets: position_monitor_action.monitor_positions(api=sim, check_calendar=False)
+        _, wall, peak = measure(monitor, setup, repeat)
+        results['monitor_positions'] = {'wall_s': round(wall, 6), 'peak_mb': round(peak, 3)}
+    return results
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    """
+    Compara los resultados con la referencia.
+
+    Returns:
+        list: Regresiones como (clave, métrica, referencia, actual)
+    """
+    regressions = []
+    for key, current in results.items():
+        reference = baseline.get(key)
+        if not reference or 'wall_s' not in current or 'wall_s' not in reference:
+            continue
+        wall, base_wall = current['wall_s'], reference['wall_s']
+        if wall > base_wall * (1 + tolerance) and wall - base_wall > MIN_WALL_DELTA:
+            regressions.append((key, 'wall_s', base_wall, wall))
+        peak, base_peak = current['peak_mb'], reference['peak_mb']
+        if peak > base_peak * (1 + memory_tolerance) and peak - base_peak > MIN_MEMORY_DELTA_MB:
+            regressions.append((key, 'peak_mb', base_peak, peak))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline con universos sintéticos")
+    parser.add_argument("--tickers", type=int, nargs='+', default=[8, 100], help="Tamaños del universo (8 a 5000)")
+    parser.add_argument("--years", type=float, nargs='+', default=[1, 5], help="Años de histórico (1 a 20)")
+    parser.add_argument("--paths", nargs='+', default=PATHS, choices=PATHS)
+    parser.add_argument("--repeat", type=int, default=3, help="Ejecuciones por camino (se toma la mejor)")
+    parser.add_argument("--estimators", type=int, default=20, help="Árboles del RandomForest")
+    parser.add_argument("--lstm-tickers", type=int, default=4, help="Tickers con modelo LSTM para la inferencia")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--compact", action="store_true", help="Modo numérico compacto (float32)")
+    parser.add_argument("--baseline", default=None, help="JSON de referencia con el que comparar")
+    parser.add_argument("--save-baseline", default=None, help="Guardar los resultados como referencia")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento de tiempo tolerado (fracción)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="Empeoramiento de memoria tolerado")
+    args = parser.parse_args()
+
+    numeric.set_compact(args.compact)
+
+    # Los mensajes por ticker no aportan nada al benchmark
+    logging.getLogger("trading_bot").setLevel("ERROR")
+    position_monitor_action.logger.setLevel("WARNING")
+
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for n_tickers in args.tickers:
+            for years in args.years:
+                case = run_case(n_tickers, years, args.paths, args.repeat, args.estimators,
+                                args.lstm_tickers, args.seed)
+                results.update({f"{path}/{n_tickers}x{years:g}y": r for path, r in case.items()})
+            case = run_broker_case(n_tickers, args.paths, args.repeat, args.seed)
+            results.update({f"{path}/{n_tickers}": r for path, r in case.items()})
+
+    print(f"{'camino':<40} {'tiempo (s)':>12} {'pico (MB)':>10}")
+    for key, r in results.items():
+        if 'skipped' in r:
+            print(f"{key:<40} {'omitido':>12} {'':>10}  ({r['skipped']})")
+        else:
+            print(f"{key:<40} {r['wall_s']:>12.4f} {r['peak_mb']:>10.2f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results
+            }, f, indent=4)
+        print(f"Referencia guardada en {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        for key, metric, reference, current in regressions:
+            print(f"REGRESIÓN {key} {metric}: {reference} -> {current} ({(current / reference - 1) * 100:+.1f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"Sin regresiones respecto a {args.baseline}")
+
+if __name__ == "__main__":
+    main()
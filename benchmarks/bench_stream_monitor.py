@@ -0,0 +1,111 @@
+"""
+Benchmark del monitor en modo daemon con un feed de precios reproducido.
+
+Mide el tiempo de reacción por trade (desde que llega el precio hasta que se
+ha evaluado la posición y, si toca, enviado la orden de cierre) para distintos
+números de posiciones abiertas, contra el broker simulado.
+
+Uso:
+    python -m benchmarks.bench_stream_monitor --positions 10 100 500 --ticks 200
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+os.environ.setdefault("ALPACA_API_KEY", "benchmark")
+os.environ.setdefault("ALPACA_SECRET_KEY", "benchmark")
+os.environ["TELEGRAM_API_TOKEN"] = ""
+os.environ["TELEGRAM_CHAT_ID"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution.simulator import SimulatedBroker
+from execution.streams import ReplayPriceSource
+from execution.trade_journal import TradeJournal, set_trade_journal
+import position_monitor_action
+
+def build_ticks(prices, ticks_per_symbol, volatility, seed):
+    """Paseo aleatorio intercalado por símbolo, un trade por segundo."""
+    rng = random.Random(seed)
+    start = datetime.now()
+    ticks = []
+    current = dict(prices)
+    for step in range(ticks_per_symbol):
+        for symbol in prices:
+            current[symbol] *= 1 + rng.gauss(0, volatility)
+            ticks.append((start + timedelta(seconds=len(ticks)), symbol, current[symbol]))
+    return ticks
+
+def run_case(n_positions, ticks_per_symbol, volatility, order_mode, seed):
+    rng = random.Random(seed)
+    symbols = [f"S{i:04d}" for i in range(n_positions)]
+    prices = {s: rng.uniform(20, 500) for s in symbols}
+    sim = SimulatedBroker(prices, cash=1_000_000)
+    for symbol in symbols:
+        sim.set_position(symbol, rng.choice([-1, 1]) * rng.randint(10, 100))
+
+    source = ReplayPriceSource(build_ticks(prices, ticks_per_symbol, volatility, seed))
+    # El broker simulado ve el mismo precio que el monitor (se suscribe antes)
+    source.subscribe(lambda trade: sim.set_price(trade.symbol, trade.price))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = TradeJournal(os.path.join(tmp, "trade_journal.db"), legacy_log=None)
+        set_trade_journal(journal)
+        monitor = position_monitor_action.StreamingPositionMonitor(sim, source, order_mode=order_mode)
+
+        latencies = []
+        on_trade = monitor.on_trade
+        def timed(trade):
+            start = time.perf_counter()
+            on_trade(trade)
+            latencies.append(time.perf_counter() - start)
+        # Sustituir el manejador registrado por su versión cronometrada
+        source._handlers[-1] = timed
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            monitor.resync()
+            calls_before = sim.total_calls()
+            start = time.perf_counter()
+            source.run()
+            elapsed = time.perf_counter() - start
+        journal.close()
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'positions': n_positions,
+        'ticks': len(latencies),
+        'ticks_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 4),
+        'max_ms': round(float(latencies.max()), 4),
+        'closed': n_positions - len(monitor.trade_log),
+        'api_calls': sim.total_calls() - calls_before
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del monitor en modo daemon")
+    parser.add_argument("--positions", type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument("--ticks", type=int, default=200, help="Trades por símbolo")
+    parser.add_argument("--volatility", type=float, default=0.003, help="Desviación del retorno por trade")
+    parser.add_argument("--order-mode", default="market", choices=["market", "bracket"])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Los avisos por posición no aportan nada al benchmark
+    position_monitor_action.logger.setLevel("WARNING")
+    results = [run_case(n, args.ticks, args.volatility, args.order_mode, args.seed) for n in args.positions]
+
+    header = ['positions', 'ticks', 'ticks_per_s', 'p50_ms', 'p99_ms', 'max_ms', 'closed', 'api_calls']
+    print(" ".join(f"{h:>12}" for h in header))
+    for row in results:
+        print(" ".join(f"{row[h]:>12}" for h in header))
+
+if __name__ == "__main__":
+    main()
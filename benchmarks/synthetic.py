@@ -0,0 +1,52 @@
+"""
+Universos sintéticos de precios para los benchmarks.
+
+Los precios siguen un paseo aleatorio geométrico con un factor de mercado
+común, de modo que los tickers están correlacionados como en un universo
+real, y se generan en días hábiles para que los índices se parezcan a los de
+yfinance.
+"""
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+
+def synthetic_panel(n_tickers, years, seed=42, start="2000-01-03", market_beta=0.6,
+                    daily_vol=0.015, daily_drift=0.0003):
+    """
+    Panel de precios de cierre sintético.
+
+    Args:
+        n_tickers: Número de tickers (columnas T0000, T0001...)
+        years: Años de histórico (252 sesiones por año)
+        seed: Semilla del generador
+        start: Primera fecha del índice
+        market_beta: Peso del factor de mercado común en cada retorno
+        daily_vol: Volatilidad diaria de cada ticker
+        daily_drift: Deriva diaria media
+
+    Returns:
+        pandas.DataFrame: Precios de cierre indexados por fecha
+    """
+    rng = np.random.default_rng(seed)
+    n_days = int(round(years * TRADING_DAYS_PER_YEAR))
+    market = rng.normal(0, daily_vol, size=(n_days, 1))
+    idio = rng.normal(0, daily_vol, size=(n_days, n_tickers))
+    drift = rng.normal(daily_drift, daily_drift, size=n_tickers)
+    returns = drift + market_beta * market + np.sqrt(1 - market_beta ** 2) * idio
+
+    start_prices = rng.uniform(20, 500, size=n_tickers)
+    prices = start_prices * np.exp(np.cumsum(returns, axis=0))
+
+    index = pd.bdate_range(start=start, periods=n_days, name="Date")
+    columns = [f"T{i:04d}" for i in range(n_tickers)]
+    return pd.DataFrame(prices, index=index, columns=columns)
+
+def local_downloader(panel):
+    """
+    Fuente de datos local para get_data: sirve las columnas del panel con el
+    formato de yf.download (una columna 'Close' por ticker).
+    """
+    def download(ticker, period, interval):
+        return pd.DataFrame({'Close': panel[ticker]})
+    return download
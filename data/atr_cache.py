@@ -0,0 +1,122 @@
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from alpaca_trade_api.rest import TimeFrame
+from execution.trade_journal import get_trade_journal
+
+# Periodo del ATR y días naturales de histórico necesarios para calcularlo
+ATR_PERIOD = 14
+ATR_LOOKBACK_DAYS = 40
+
+# Múltiplos del ATR para los niveles de SL y TP
+ATR_SL_MULTIPLIER = 2.0
+ATR_TP_MULTIPLIER = 3.0
+
+# Caché por día: (fecha, periodo) -> {símbolo: atr}. En memoria para el
+# monitor en modo daemon y en el diario de operaciones para los procesos
+# sueltos (el monitor de cron arranca un proceso nuevo en cada ciclo)
+_atr_cache = {}
+_cache_lock = threading.Lock()
+
+def fetch_daily_bars(api, symbols, lookback_days=ATR_LOOKBACK_DAYS):
+    """
+    Descarga barras diarias de varios símbolos en una sola petición.
+
+    Se pide por fecha de inicio y no por limit, porque en las peticiones
+    multi-símbolo de Alpaca el límite es sobre el total de barras.
+
+    Args:
+        api: Cliente REST de Alpaca
+        symbols: Lista de símbolos
+        lookback_days: Días naturales de histórico
+
+    Returns:
+        pandas.DataFrame: Barras con columnas high, low, close y symbol
+    """
+    start = (datetime.now() - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+    df = api.get_bars(list(symbols), TimeFrame.Day, start=start).df
+    if 'symbol' not in df.columns and len(symbols) == 1:
+        df = df.assign(symbol=symbols[0])
+    return df
+
+def compute_atr(df, period=ATR_PERIOD):
+    """
+    ATR (media simple del true range de las últimas period barras) de cada
+    símbolo de un DataFrame de barras, en una pasada vectorizada.
+
+    Args:
+        df: Barras con columnas high, low, close y symbol, indexadas por fecha
+        period: Número de barras del ATR
+
+    Returns:
+        dict: Símbolo -> ATR (NaN si no hay suficientes barras)
+    """
+    if df.empty:
+        return {}
+    df = df.assign(_time=df.index).sort_values(['symbol', '_time'])
+    symbols, codes = np.unique(df['symbol'].to_numpy(), return_inverse=True)
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+
+    # Cierre anterior dentro del mismo símbolo (la primera barra de cada uno no tiene)
+    first = np.r_[True, codes[1:] != codes[:-1]]
+    prev_close = np.r_[np.nan, close[:-1]]
+    prev_close[first] = np.nan
+
+    with np.errstate(invalid='ignore'):
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+    # Posición de cada barra contando desde la última de su símbolo
+    counts = np.bincount(codes)
+    ends = np.cumsum(counts)
+    from_end = ends[codes] - 1 - np.arange(len(codes))
+    window = from_end < period
+
+    totals = np.bincount(codes, weights=np.where(window, tr, 0.0), minlength=len(symbols))
+    atr = np.where(counts >= period, totals / period, np.nan)
+    return dict(zip(symbols.tolist(), atr.tolist()))
+
+def get_atr(api, symbols, period=ATR_PERIOD, today=None, journal=None):
+    """
+    ATR diario de los símbolos, con caché por día en memoria y en el diario
+    de operaciones: solo se descargan (en una única petición) los que no se
+    hayan calculado ya hoy en este proceso ni en otro.
+
+    Args:
+        journal: Diario donde se guarda la caché (por defecto el compartido)
+
+    Returns:
+        dict: Símbolo -> ATR
+    """
+    key = (today or date.today(), period)
+    with _cache_lock:
+        cached = _atr_cache.setdefault(key, {})
+        # Las entradas de días anteriores ya no sirven
+        for old in [k for k in _atr_cache if k[0] != key[0]]:
+            del _atr_cache[old]
+        missing = [s for s in symbols if s not in cached]
+
+    if missing:
+        journal = journal or get_trade_journal()
+        stored = journal.cached_atr(key[0].isoformat(), period, missing)
+        missing = [s for s in missing if s not in stored]
+        if missing:
+            values = compute_atr(fetch_daily_bars(api, missing), period)
+            stored.update({s: values.get(s, np.nan) for s in missing})
+            journal.store_atr(key[0].isoformat(), period, {s: stored[s] for s in missing})
+        with _cache_lock:
+            cached.update(stored)
+    return {s: cached[s] for s in symbols}
+
+def atr_stop_pcts(atr, price, sl_multiplier=ATR_SL_MULTIPLIER, tp_multiplier=ATR_TP_MULTIPLIER):
+    """
+    Distancias de SL y TP (fracción del precio) a partir del ATR.
+
+    Returns:
+        tuple: (stop_loss_pct, take_profit_pct), o None si el ATR no es válido
+    """
+    if atr is None or price is None or not (np.isfinite(atr) and np.isfinite(price)) or atr <= 0 or price <= 0:
+        return None
+    return sl_multiplier * atr / price, tp_multiplier * atr / price
@@ -0,0 +1,315 @@
+"""
+Almacén de barras intradía OHLCV en ficheros binarios compactos.
+
+Cada símbolo tiene un fichero por mes (UTC) con registros de tamaño fijo:
+timestamp int64 (ns desde epoch, UTC) y open/high/low/close/volume float32,
+28 bytes por barra. Los ficheros solo crecen por el final, se leen con
+memmap (sin cargarlos enteros en memoria) y el remuestreo a intervalos
+mayores es vectorizado y se hace partición a partición, de modo que millones
+de barras por símbolo caben en un presupuesto de memoria pequeño.
+
+Estructura:
+    {root}/{intervalo base}/{símbolo}/{AAAA-MM}.bars
+"""
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("trading_bot")
+
+# Directorio del almacén y barras con las que se alimenta a los modelos
+BAR_STORE_DIR = "./bars"
+FEATURE_WINDOW = 120
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f4'),
+    ('high', '<f4'),
+    ('low', '<f4'),
+    ('close', '<f4'),
+    ('volume', '<f4')
+])
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+_UNITS_NS = {'m': 60 * 10 ** 9, 'h': 3600 * 10 ** 9, 'd': 86400 * 10 ** 9}
+
+def interval_ns(interval):
+    """
+    Duración en nanosegundos de un intervalo como "1m", "5m", "1h" o "1d".
+    """
+    unit = interval[-1:]
+    if unit not in _UNITS_NS or not interval[:-1].isdigit() or int(interval[:-1]) <= 0:
+        raise ValueError(f"Intervalo no soportado: {interval}")
+    return int(interval[:-1]) * _UNITS_NS[unit]
+
+def frame_to_bars(df):
+    """
+    Convierte un DataFrame OHLCV (formato yfinance o Alpaca, columnas en
+    mayúsculas o minúsculas) indexado por fecha en un array de barras.
+
+    Returns:
+        numpy.ndarray: Array con dtype BAR_DTYPE
+    """
+    columns = {str(c[0] if isinstance(c, tuple) else c).lower(): c for c in df.columns}
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+
+    def values(field):
+        column = df[columns[field]]
+        # yfinance puede devolver columnas (campo, ticker): se queda con la única columna
+        if isinstance(column, pd.DataFrame):
+            column = column.iloc[:, 0]
+        return column.to_numpy(dtype=np.float32)
+
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars['ts'] = index.values.astype('datetime64[ns]').astype(np.int64)
+    for field in PRICE_FIELDS:
+        if field in columns:
+            bars[field] = values(field)
+        else:
+            # Sin el campo (p.ej. solo cierres): el cierre, o volumen 0
+            bars[field] = 0 if field == 'volume' else values('close')
+    return bars
+
+def bars_to_frame(bars):
+    """DataFrame OHLCV indexado por fecha (UTC) a partir de un array de barras."""
+    return pd.DataFrame({field: bars[field] for field in PRICE_FIELDS},
+                        index=pd.to_datetime(bars['ts'], utc=True))
+
+def resample(bars, interval, offset=None):
+    """
+    Agrupa barras ordenadas en barras de un intervalo mayor, de forma vectorizada.
+
+    Args:
+        bars: Array con dtype BAR_DTYPE ordenado por ts
+        interval: Intervalo destino ("5m", "1h", "1d"...)
+        offset: Desplazamiento de los cortes respecto a la medianoche UTC
+                (p.ej. "30m" para horas que empiecen a y media)
+
+    Returns:
+        numpy.ndarray: Barras remuestreadas; ts es el inicio de cada intervalo
+    """
+    if len(bars) == 0:
+        return np.empty(0, dtype=BAR_DTYPE)
+    step = interval_ns(interval)
+    shift = interval_ns(offset) if offset else 0
+    buckets = (bars['ts'] - shift) // step * step + shift
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+
+    out = np.empty(len(starts), dtype=BAR_DTYPE)
+    out['ts'] = buckets[starts]
+    out['open'] = bars['open'][starts]
+    out['close'] = bars['close'][ends]
+    out['high'] = np.maximum.reduceat(bars['high'], starts)
+    out['low'] = np.minimum.reduceat(bars['low'], starts)
+    out['volume'] = np.add.reduceat(bars['volume'], starts)
+    return out
+
+def _merge_boundary(previous, current):
+    # El último intervalo de una partición puede continuar en la siguiente
+    if len(previous) and len(current) and previous['ts'][-1] == current['ts'][0]:
+        first = current[0].copy()
+        last = previous[-1]
+        first['open'] = last['open']
+        first['high'] = max(first['high'], last['high'])
+        first['low'] = min(first['low'], last['low'])
+        first['volume'] += last['volume']
+        current = current.copy()
+        current[0] = first
+        previous = previous[:-1]
+    return previous, current
+
+class BarStore:
+    """
+    Barras de un intervalo base (p.ej. "1m") de varios símbolos en disco.
+
+    Args:
+        root: Directorio del almacén
+        interval: Intervalo de las barras que se guardan
+    """
+
+    def __init__(self, root=BAR_STORE_DIR, interval="1m"):
+        self.root = root
+        self.interval = interval
+        interval_ns(interval)
+
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.root, self.interval, symbol)
+
+    def partitions(self, symbol):
+        """Rutas de las particiones mensuales de un símbolo, en orden."""
+        directory = self._symbol_dir(symbol)
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".bars")]
+
+    def _open(self, path):
+        # Un registro a medias (escritura interrumpida) se ignora
+        count = os.path.getsize(path) // BAR_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.memmap(path, dtype=BAR_DTYPE, mode='r', shape=(count,))
+
+    def last_ts(self, symbol):
+        """Timestamp (ns) de la última barra guardada, o None."""
+        for path in reversed(self.partitions(symbol)):
+            bars = self._open(path)
+            if len(bars):
+                return int(bars['ts'][-1])
+        return None
+
+    def append(self, symbol, bars):
+        """
+        Añade barras al final. Las que no son posteriores a la última guardada
+        se descartan, así que repetir una descarga solapada no duplica nada.
+
+        Args:
+            symbol: Símbolo
+            bars: Array con dtype BAR_DTYPE o DataFrame OHLCV
+
+        Returns:
+            int: Barras añadidas
+        """
+        if isinstance(bars, pd.DataFrame):
+            bars = frame_to_bars(bars)
+        bars = bars[np.argsort(bars['ts'], kind='stable')]
+        # Timestamps repetidos: se queda la última versión de la barra
+        keep = np.r_[bars['ts'][1:] != bars['ts'][:-1], True]
+        bars = bars[keep]
+        last = self.last_ts(symbol)
+        if last is not None:
+            bars = bars[bars['ts'] > last]
+        if len(bars) == 0:
+            return 0
+
+        directory = self._symbol_dir(symbol)
+        os.makedirs(directory, exist_ok=True)
+        months = bars['ts'].astype('datetime64[ns]').astype('datetime64[M]')
+        cuts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        for start, end in zip(cuts, np.r_[cuts[1:], len(bars)]):
+            path = os.path.join(directory, f"{months[start]}.bars")
+            with open(path, 'ab') as f:
+                size = f.tell()
+                if size % BAR_DTYPE.itemsize:
+                    logger.warning(f"Registro incompleto al final de {path}; se descarta")
+                    f.truncate(size - size % BAR_DTYPE.itemsize)
+                f.write(bars[start:end].tobytes())
+        return len(bars)
+
+    def read(self, symbol, start=None, end=None):
+        """
+        Barras de un símbolo en [start, end). Solo se leen las particiones y
+        el tramo de cada una que caen en el rango.
+
+        Args:
+            start, end: Límites (cualquier cosa que acepte pandas.Timestamp, en UTC)
+
+        Returns:
+            numpy.ndarray: Copia en memoria de las barras del rango
+        """
+        chunks = list(self._iter_range(symbol, start, end))
+        if not chunks:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.concatenate(chunks)
+
+    def _iter_range(self, symbol, start, end):
+        lo = _to_ns(start)
+        hi = _to_ns(end)
+        for path in self.partitions(symbol):
+            month_start = np.datetime64(os.path.basename(path)[:-5], 'M')
+            month_lo = month_start.astype('datetime64[ns]').astype(np.int64)
+            month_hi = (month_start + 1).astype('datetime64[ns]').astype(np.int64)
+            if (hi is not None and month_lo >= hi) or (lo is not None and month_hi <= lo):
+                continue
+            bars = self._open(path)
+            i = 0 if lo is None else np.searchsorted(bars['ts'], lo, side='left')
+            j = len(bars) if hi is None else np.searchsorted(bars['ts'], hi, side='left')
+            if j > i:
+                yield np.array(bars[i:j])
+
+    def iter_resampled(self, symbol, interval, start=None, end=None, offset=None):
+        """
+        Barras remuestreadas partición a partición: en memoria solo hay un mes
+        de barras base a la vez.
+
+        Yields:
+            numpy.ndarray: Barras remuestreadas de cada partición (sin repetir
+                           el intervalo que cruza de un mes al siguiente)
+        """
+        pending = np.empty(0, dtype=BAR_DTYPE)
+        for chunk in self._iter_range(symbol, start, end):
+            current = resample(chunk, interval, offset)
+            pending, current = _merge_boundary(pending, current)
+            if len(pending):
+                yield pending
+            pending = current
+        if len(pending):
+            yield pending
+
+    def window(self, symbol, bars, interval=None, end=None, offset=None):
+        """
+        Últimas barras (remuestreadas a interval) de un símbolo. Se leen las
+        particiones desde la más reciente hasta tener suficientes.
+
+        Args:
+            symbol: Símbolo
+            bars: Número de barras
+            interval: Intervalo (por defecto el base)
+            end: Solo barras anteriores a esta fecha
+
+        Returns:
+            numpy.ndarray: Hasta bars barras, la última la más reciente
+        """
+        interval = interval or self.interval
+        hi = _to_ns(end)
+        chunks = []
+        result = np.empty(0, dtype=BAR_DTYPE)
+        for path in reversed(self.partitions(symbol)):
+            data = self._open(path)
+            if hi is not None:
+                data = data[:np.searchsorted(data['ts'], hi, side='left')]
+            if len(data) == 0:
+                continue
+            chunks.insert(0, np.array(data))
+            result = resample(np.concatenate(chunks), interval, offset)
+            # Una barra de más: la primera puede estar incompleta (empieza en el mes anterior)
+            if len(result) > bars:
+                break
+        return result[-bars:]
+
+def _to_ns(value):
+    if value is None:
+        return None
+    timestamp = pd.Timestamp(value)
+    if timestamp.tz is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp.value
+
+def close_window(store, symbols, bars=FEATURE_WINDOW, interval=None, end=None, offset=None):
+    """
+    Ventana de cierres de varios símbolos alineada por fecha, con el formato
+    que esperan predict_returns y predict_lstm_returns (una columna por
+    símbolo). Solo se construye el DataFrame de la ventana, no el del histórico.
+
+    Args:
+        store: BarStore
+        symbols: Símbolos
+        bars: Barras de la ventana
+        interval: Intervalo (por defecto el base del almacén)
+        end: Solo barras anteriores a esta fecha
+
+    Returns:
+        pandas.DataFrame: Cierres indexados por fecha (UTC)
+    """
+    columns = {}
+    for symbol in symbols:
+        window = store.window(symbol, bars, interval, end, offset)
+        columns[symbol] = pd.Series(window['close'].astype(np.float64), index=pd.to_datetime(window['ts'], utc=True))
+    if not columns:
+        return pd.DataFrame()
+    # Un símbolo sin barra en un intervalo conserva el último cierre
+    return pd.DataFrame(columns).sort_index().ffill().tail(bars)
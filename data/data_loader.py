@@ -1,27 +1,138 @@
+import logging
 import yfinance as yf
+import numpy as np
 import pandas as pd
+from utils import numeric
+from utils.transport import get_session
+from utils.metrics import timed
+from data.bar_store import BarStore, close_window, FEATURE_WINDOW
+
+logger = logging.getLogger("trading_bot")
 
 TICKERS = ['SPY', 'QQQ', 'IWM', 'EFA', 'EEM', 'GLD', 'TLT', 'LQD']
 
-def get_data():
+# Las versiones recientes de yfinance solo aceptan sesiones curl_cffi: si
+# rechaza la sesión compartida se deja que use la suya el resto de la ejecución
+_yf_accepts_session = True
+
+@timed("yf_download")
+def _download(ticker, period, interval):
+    """
+    yf.download sobre la sesión HTTP compartida, o con la de yfinance si no la admite.
+    """
+    global _yf_accepts_session
+    if _yf_accepts_session:
+        try:
+            return yf.download(ticker, period=period, interval=interval, auto_adjust=True, session=get_session())
+        except Exception as e:
+            logger.info(f"yfinance no admite la sesión compartida ({e}); se usa la suya")
+            _yf_accepts_session = False
+    return yf.download(ticker, period=period, interval=interval, auto_adjust=True)
+
+def _close(df):
+    close = df['Close']
+    # yfinance puede devolver columnas (campo, ticker)
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    return close.to_numpy()
+
+def get_data(period="1y", interval="1d", tickers=None, downloader=None):
     """
     Descarga datos históricos de precios para los tickers definidos.
     
+    Args:
+        period: Periodo de histórico a descargar (formato yfinance, p.ej. "1y", "5y")
+        interval: Intervalo de las barras (formato yfinance)
+        tickers: Tickers a descargar (por defecto TICKERS)
+        downloader: Función (ticker, period, interval) -> DataFrame con columna 'Close'
+                    (por defecto yfinance; los benchmarks usan una fuente local)
+    
     Returns:
-        pandas.DataFrame: DataFrame con los precios de cierre de todos los tickers.
+        pandas.DataFrame: DataFrame con los precios de cierre de todos los tickers
+                          (en modo compacto, un único bloque float32)
     """
+    if tickers is None:
+        tickers = TICKERS
+    if downloader is None:
+        downloader = _download
+    
     # Primero, descargar datos para el primer ticker para establecer el índice
-    first_ticker = TICKERS[0]
-    all_data = yf.download(first_ticker, period="1y", interval="1d", auto_adjust=True)
+    first_ticker = tickers[0]
+    all_data = downloader(first_ticker, period, interval)
+    
+    if numeric.is_compact():
+        # Cada cierre se escribe directamente en su columna del bloque, sin
+        # pasar por una columna float64 por ticker
+        block = np.full((len(all_data), len(tickers)), np.nan, dtype=numeric.dtype())
+        block[:, 0] = _close(all_data)
+        for j, ticker in enumerate(tickers[1:], start=1):
+            block[:, j] = _close(downloader(ticker, period, interval).reindex(all_data.index))
+        return numeric.price_frame(block, all_data.index, list(tickers))
     
     # Inicializar el DataFrame con el primer ticker
     data = pd.DataFrame(index=all_data.index)
     data[first_ticker] = all_data['Close']
     
     # Añadir el resto de tickers
-    for ticker in TICKERS[1:]:
-        df = yf.download(ticker, period="1y", interval="1d", auto_adjust=True)
+    for ticker in tickers[1:]:
+        df = downloader(ticker, period, interval)
         # Usar solo los datos que coinciden con el índice existente
         data[ticker] = df['Close']
     
     return data
+
+def sync_intraday(tickers=None, interval="1m", period="7d", store=None, downloader=None):
+    """
+    Descarga las barras intradía recientes y las añade al almacén de barras.
+    Las ya guardadas se descartan, así que se puede llamar tantas veces como
+    se quiera (yfinance solo sirve 7 días de barras de 1 minuto).
+    
+    Args:
+        tickers: Tickers a actualizar (por defecto TICKERS)
+        interval: Intervalo base del almacén
+        period: Periodo a descargar
+        store: BarStore (por defecto uno del intervalo base)
+        downloader: Función (ticker, period, interval) -> DataFrame OHLCV
+    
+    Returns:
+        dict: Ticker -> barras añadidas
+    """
+    if tickers is None:
+        tickers = TICKERS
+    if store is None:
+        store = BarStore(interval=interval)
+    if downloader is None:
+        downloader = _download
+    
+    added = {}
+    for ticker in tickers:
+        try:
+            df = downloader(ticker, period, interval)
+            added[ticker] = store.append(ticker, df) if not df.empty else 0
+        except Exception as e:
+            logger.error(f"Error actualizando barras de {ticker}: {e}")
+            added[ticker] = 0
+    logger.info(f"Barras intradía añadidas: {sum(added.values())} ({len(tickers)} tickers)")
+    return added
+
+def get_intraday_data(interval="5m", bars=FEATURE_WINDOW, tickers=None, store=None, end=None):
+    """
+    Últimos cierres intradía del almacén de barras, remuestreados a interval,
+    con el mismo formato que get_data (una columna por ticker). Solo se lee la
+    ventana pedida, no el histórico completo.
+    
+    Args:
+        interval: Intervalo de las barras ("5m", "15m", "1h"...)
+        bars: Barras de la ventana
+        tickers: Tickers (por defecto TICKERS)
+        store: BarStore (por defecto el de barras de 1 minuto)
+        end: Solo barras anteriores a esta fecha
+    
+    Returns:
+        pandas.DataFrame: Cierres indexados por fecha (UTC)
+    """
+    if tickers is None:
+        tickers = TICKERS
+    if store is None:
+        store = BarStore()
+    return close_window(store, tickers, bars, interval, end)
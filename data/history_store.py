@@ -0,0 +1,290 @@
+"""
+Histórico en columnas de las decisiones de cada ejecución: predicciones por
+modelo y combinadas, resultado de los controles de riesgo (con su motivo y
+el peso objetivo), órdenes enviadas y llenados.
+
+Los registros de una ejecución se acumulan en memoria y se escriben una sola
+vez al terminar, un fichero por tabla y ejecución: nunca se reescribe un
+fichero existente. Cada fichero es un .npz sin comprimir con un array por
+columna (sin pickle), dentro de un directorio por fecha de la barra, de modo
+que una consulta solo abre las fechas de su rango y filtra con operaciones
+vectorizadas sobre columnas enteras.
+
+Estructura:
+    {root}/{tabla}/{AAAA-MM-DD}/{ejecución}.npz
+"""
+import os
+import uuid
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("trading_bot")
+
+# Directorio del histórico y estrategia de las ejecuciones de main.py
+HISTORY_DIR = "./history"
+DEFAULT_STRATEGY = "main"
+
+# Columnas comunes a todas las tablas (las rellena el registro de la ejecución)
+COMMON_COLUMNS = (('as_of', 'datetime64[ns]'), ('recorded_at', 'datetime64[ns]'), ('run_id', str),
+                  ('strategy', str))
+
+# Columnas propias de cada tabla
+TABLES = {
+    # model: rf, lstm o combined; value: retorno esperado para la siguiente sesión
+    'predictions': (('model', str), ('symbol', str), ('value', np.float64)),
+    # outcome: approved, rejected, skipped o forced (safety valve: una fila más tras su rechazo);
+    # weight: peso objetivo (0 si no opera)
+    'risk': (('symbol', str), ('signal', str), ('outcome', str), ('reason', str), ('volatility', np.float64),
+             ('weight', np.float64)),
+    # price: precio de referencia al decidir la orden; error: vacío si el broker la aceptó
+    'orders': (('symbol', str), ('side', str), ('qty', np.float64), ('price', np.float64),
+               ('client_order_id', str), ('error', str)),
+    'fills': (('symbol', str), ('side', str), ('qty', np.float64), ('price', np.float64),
+              ('client_order_id', str))
+}
+
+_default_history = None
+
+def _column(values, kind):
+    if kind is str:
+        return np.array(['' if value is None else str(value) for value in values], dtype=str)
+    if kind == 'datetime64[ns]':
+        return pd.to_datetime(pd.Series(values, dtype=object), utc=True).dt.tz_localize(None) \
+            .to_numpy(dtype='datetime64[ns]')
+    return np.array([np.nan if value is None else value for value in values], dtype=kind)
+
+def _empty(kind):
+    return np.empty(0, dtype=str if kind is str else kind)
+
+class HistoryStore:
+    """
+    Tablas del histórico en disco.
+
+    Args:
+        root: Directorio del histórico
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+
+    def write(self, table, columns, day):
+        """
+        Añade un fichero con las filas de una ejecución. Se escribe con otro
+        nombre y se renombra al final, así que una lectura nunca ve un fichero
+        a medias.
+
+        Args:
+            table: Tabla (ver TABLES)
+            columns: dict columna -> array, todos de la misma longitud
+            day: Fecha de la partición
+
+        Returns:
+            str: Ruta del fichero escrito
+        """
+        directory = os.path.join(self.root, table, pd.Timestamp(day).strftime("%Y-%m-%d"))
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.now():%H%M%S%f}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **columns)
+        path = os.path.join(directory, f"{name}.npz")
+        os.replace(tmp_path, path)
+        return path
+
+    def partitions(self, table, start=None, end=None):
+        """Ficheros de una tabla con fecha en [start, end], en orden."""
+        directory = os.path.join(self.root, table)
+        if not os.path.isdir(directory):
+            return []
+        lo = pd.Timestamp(start).strftime("%Y-%m-%d") if start is not None else None
+        hi = pd.Timestamp(end).strftime("%Y-%m-%d") if end is not None else None
+        paths = []
+        for day in sorted(os.listdir(directory)):
+            if (lo is not None and day < lo) or (hi is not None and day > hi):
+                continue
+            day_dir = os.path.join(directory, day)
+            paths.extend(os.path.join(day_dir, name) for name in sorted(os.listdir(day_dir)) if name.endswith(".npz"))
+        return paths
+
+    def read(self, table, start=None, end=None, columns=None, where=None):
+        """
+        Filas de una tabla entre dos fechas de barra (ambas incluidas).
+
+        Args:
+            table: Tabla (ver TABLES)
+            start, end: Fechas límite (por defecto todo el histórico)
+            columns: Columnas a leer (por defecto todas)
+            where: dict columna -> valor o lista de valores aceptados
+
+        Returns:
+            pandas.DataFrame: Una columna por columna de la tabla
+        """
+        schema = dict(COMMON_COLUMNS + TABLES[table])
+        columns = list(columns) if columns is not None else list(schema)
+        where = where or {}
+        needed = list(dict.fromkeys(columns + list(where)))
+
+        chunks = {name: [] for name in needed}
+        for path in self.partitions(table, start, end):
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in needed}
+            mask = None
+            for name, accepted in where.items():
+                accepted = accepted if isinstance(accepted, (list, tuple, set)) else [accepted]
+                match = np.isin(arrays[name], list(accepted))
+                mask = match if mask is None else mask & match
+            for name in needed:
+                chunks[name].append(arrays[name] if mask is None else arrays[name][mask])
+
+        return pd.DataFrame({
+            name: np.concatenate(chunks[name]) if chunks[name] else _empty(schema[name])
+            for name in columns
+        })
+
+class RunHistory:
+    """
+    Registros de una ejecución, en memoria hasta flush.
+
+    Args:
+        store: HistoryStore donde se escriben
+        strategy: Nombre de la estrategia (columna strategy)
+    """
+
+    def __init__(self, store=None, strategy=DEFAULT_STRATEGY):
+        self.store = store if store is not None else HistoryStore()
+        self.strategy = strategy
+        self.run_id = uuid.uuid4().hex[:12]
+        self.as_of = None
+        self._rows = {table: [] for table in TABLES}
+        self._lock = threading.Lock()
+
+    def bind(self, as_of):
+        """Fija la barra de la ejecución (fecha de la partición y columna as_of)."""
+        self.as_of = pd.Timestamp(as_of)
+
+    def record(self, table, rows):
+        """
+        Añade filas (dicts con las columnas de la tabla) a la ejecución.
+        Las columnas que falten quedan vacías.
+        """
+        if table not in TABLES:
+            raise ValueError(f"Tabla desconocida: {table}")
+        now = datetime.now()
+        with self._lock:
+            self._rows[table].extend(dict(row, recorded_at=now) for row in rows)
+
+    def record_predictions(self, model, predictions):
+        """Predicciones {ticker: [retorno, ...]} de un modelo (se guarda la primera)."""
+        self.record('predictions', [{'model': model, 'symbol': symbol, 'value': float(values[0])}
+                                    for symbol, values in predictions.items() if len(values)])
+
+    def flush(self):
+        """
+        Escribe los registros pendientes, un fichero por tabla con filas.
+        Un fallo al escribir se registra y no interrumpe la ejecución.
+
+        Returns:
+            int: Filas escritas
+        """
+        with self._lock:
+            pending = {table: rows for table, rows in self._rows.items() if rows}
+            self._rows = {table: [] for table in TABLES}
+        as_of = self.as_of if self.as_of is not None else pd.Timestamp(datetime.now().date())
+
+        written = 0
+        for table, rows in pending.items():
+            common = {'as_of': as_of, 'run_id': self.run_id, 'strategy': self.strategy}
+            columns = {}
+            for name, kind in COMMON_COLUMNS + TABLES[table]:
+                columns[name] = _column([row.get(name, common.get(name)) for row in rows], kind)
+            try:
+                self.store.write(table, columns, as_of)
+                written += len(rows)
+            except Exception as e:
+                logger.error(f"Error guardando el histórico de {table}: {e}")
+        if written:
+            logger.info(f"Histórico: {written} registros de la ejecución {self.run_id}")
+        return written
+
+def get_history():
+    """
+    Registro de la ejecución en curso del proceso, creado la primera vez.
+    """
+    global _default_history
+    if _default_history is None:
+        _default_history = RunHistory()
+    return _default_history
+
+def set_history(history):
+    """Sustituye el registro de la ejecución (por ejemplo, el de una estrategia)."""
+    global _default_history
+    _default_history = history
+
+def prediction_accuracy(store, prices, start=None, end=None, models=None):
+    """
+    Precisión de las predicciones guardadas frente al retorno realizado en la
+    sesión siguiente a su barra.
+
+    Args:
+        store: HistoryStore
+        prices: Cierres (DataFrame fechas x tickers) que cubren el periodo
+        start, end: Fechas de barra a evaluar
+        models: Modelos a evaluar (por defecto todos)
+
+    Returns:
+        pandas.DataFrame: Por estrategia y modelo: predicciones evaluadas,
+                          acierto de signo, error absoluto medio y correlación
+    """
+    where = {'model': list(models)} if models is not None else None
+    predictions = store.read('predictions', start, end, columns=('as_of', 'strategy', 'model', 'symbol', 'value'),
+                             where=where)
+    index = pd.DatetimeIndex(prices.index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+
+    # Fila de la barra y columna del símbolo de cada predicción, sin recorrerlas
+    rows = index.get_indexer(pd.DatetimeIndex(predictions['as_of']))
+    cols = prices.columns.get_indexer(predictions['symbol'])
+    valid = (rows >= 0) & (rows + 1 < len(index)) & (cols >= 0)
+    values = prices.to_numpy(dtype=np.float64)
+    realized = np.full(len(predictions), np.nan)
+    realized[valid] = values[rows[valid] + 1, cols[valid]] / values[rows[valid], cols[valid]] - 1
+
+    evaluated = predictions.assign(realized=realized).dropna(subset=['realized'])
+    evaluated = evaluated.assign(hit=np.sign(evaluated['value']) == np.sign(evaluated['realized']),
+                                 abs_error=(evaluated['value'] - evaluated['realized']).abs())
+    grouped = evaluated.groupby(['strategy', 'model'])
+    return pd.DataFrame({
+        'count': grouped.size(),
+        'hit_rate': grouped['hit'].mean(),
+        'mae': grouped['abs_error'].mean(),
+        'correlation': grouped[['value', 'realized']].apply(lambda g: g['value'].corr(g['realized']))
+    })
+
+def slippage(store, start=None, end=None):
+    """
+    Deslizamiento de cada orden: precio medio de sus llenados frente al precio
+    de referencia con el que se decidió. Solo hay llenados de las ejecuciones
+    con seguimiento (TRACK_FILLS).
+
+    Returns:
+        pandas.DataFrame: Una fila por orden llenada, con slippage_bps positivo
+                          cuando el llenado fue peor que la referencia
+    """
+    orders = store.read('orders', start, end, columns=('as_of', 'strategy', 'symbol', 'side', 'qty', 'price',
+                                                       'client_order_id'))
+    fills = store.read('fills', start, end, columns=('client_order_id', 'qty', 'price'))
+    orders = orders[orders['client_order_id'] != '']
+    fills = fills.assign(notional=fills['qty'] * fills['price']).groupby('client_order_id')[['qty', 'notional']].sum()
+    merged = orders.join(fills.rename(columns={'qty': 'filled_qty'}), on='client_order_id', how='inner')
+    merged = merged[merged['filled_qty'] > 0]
+    fill_price = merged['notional'] / merged['filled_qty']
+    direction = np.where(merged['side'] == 'buy', 1.0, -1.0)
+    return merged.drop(columns='notional').assign(
+        fill_price=fill_price,
+        slippage_bps=direction * (fill_price - merged['price']) / merged['price'] * 1e4
+    ).reset_index(drop=True)
@@ -0,0 +1,176 @@
+import time
+from collections import defaultdict
+from execution.concurrency import is_retryable
+
+# Espera a que el broker confirme una cancelación o el llenado de un cierre
+# antes del siguiente paso (Alpaca cancela de forma asíncrona)
+ORDER_WAIT_TIMEOUT = 30
+ORDER_POLL_INTERVAL = 0.25
+
+CANCELED_STATUSES = {'canceled', 'expired', 'replaced'}
+FAILED_STATUSES = {'canceled', 'expired', 'rejected', 'suspended', 'stopped'}
+
+def sl_tp_levels(side, price, stop_loss_pct, take_profit_pct):
+    """
+    Niveles de SL/TP para una posición abierta en 'buy' o 'sell' a price.
+    """
+    if side == 'buy':
+        return price * (1 - stop_loss_pct), price * (1 + take_profit_pct)
+    return price * (1 + stop_loss_pct), price * (1 - take_profit_pct)
+
+def bracket_order(symbol, qty, side, sl, tp):
+    """
+    Orden de entrada a mercado con sus dos salidas (SL y TP) gestionadas por el broker.
+    """
+    return {
+        'symbol': symbol,
+        'qty': qty,
+        'side': side,
+        'type': 'market',
+        'time_in_force': 'gtc',
+        'order_class': 'bracket',
+        'take_profit': {'limit_price': round(tp, 2)},
+        'stop_loss': {'stop_price': round(sl, 2)}
+    }
+
+def oco_order(symbol, qty, position_side, sl, tp):
+    """
+    Par SL/TP (uno cancela al otro) para proteger una posición ya abierta.
+
+    Args:
+        position_side: Lado de la posición ('buy' = larga, 'sell' = corta)
+    """
+    return {
+        'symbol': symbol,
+        'qty': qty,
+        'side': 'sell' if position_side == 'buy' else 'buy',
+        'type': 'limit',
+        'time_in_force': 'gtc',
+        'order_class': 'oco',
+        'take_profit': {'limit_price': round(tp, 2)},
+        'stop_loss': {'stop_price': round(sl, 2)}
+    }
+
+def market_order(symbol, qty, side):
+    return {'symbol': symbol, 'qty': qty, 'side': side, 'type': 'market', 'time_in_force': 'day'}
+
+def open_orders_by_symbol(client):
+    """
+    Órdenes abiertas agrupadas por símbolo, en una sola petición.
+    """
+    grouped = defaultdict(list)
+    for order in client.list_orders(status='open', limit=500, nested=False):
+        grouped[order.symbol].append(order)
+    return grouped
+
+def wait_for_order(client, order_id, done, failed=(), timeout=None):
+    """
+    Consulta una orden hasta que su estado esté en done.
+
+    Args:
+        done: Estados que dan la espera por terminada
+        failed: Estados que indican que ya no llegará a done
+        timeout: Segundos máximos (por defecto ORDER_WAIT_TIMEOUT)
+
+    Returns:
+        Orden con su último estado
+
+    Raises:
+        RuntimeError: Si la orden acaba en failed o se agota la espera
+    """
+    deadline = time.monotonic() + (ORDER_WAIT_TIMEOUT if timeout is None else timeout)
+    while True:
+        try:
+            order = client.get_order(order_id)
+        except Exception as e:
+            # Un fallo transitorio de la consulta no decide nada: se vuelve a consultar
+            if not is_retryable(e) or time.monotonic() >= deadline:
+                raise
+            time.sleep(ORDER_POLL_INTERVAL)
+            continue
+        if order.status in done:
+            return order
+        if order.status in failed:
+            raise RuntimeError(f"Orden {order_id} de {order.symbol} terminada como {order.status}")
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"Orden {order_id} de {order.symbol} sigue en {order.status}")
+        time.sleep(ORDER_POLL_INTERVAL)
+
+def cancel_orders(client, orders, timeout=None):
+    """
+    Cancela las órdenes dadas (p.ej. las salidas de una posición que va a
+    cambiar) y espera a que el broker confirme cada cancelación: hasta
+    entonces la cantidad que reservan no está disponible para otra orden.
+
+    Raises:
+        RuntimeError: Si una salida se llena mientras tanto (la posición ya
+                      no es la del plan) o no se confirma a tiempo
+    """
+    for order in orders:
+        client.cancel_order(order.id)
+    for order in orders:
+        wait_for_order(client, order.id, CANCELED_STATUSES, failed={'filled'}, timeout=timeout)
+
+def wait_for_fill(client, order, timeout=None):
+    """Espera al llenado completo de una orden enviada (p.ej. el cierre antes de abrir del otro lado)."""
+    return wait_for_order(client, order.id, {'filled'}, failed=FAILED_STATUSES, timeout=timeout)
+
+def replace_stops(client, orders, new_sl):
+    """
+    Mueve las órdenes stop de una posición al nuevo nivel de SL.
+
+    Returns:
+        int: Número de órdenes reemplazadas
+    """
+    replaced = 0
+    for order in orders:
+        if order.type in ('stop', 'stop_limit'):
+            client.replace_order(order.id, stop_price=str(round(new_sl, 2)))
+            replaced += 1
+    return replaced
+
+def protected_qty(orders):
+    """
+    Cantidad de la posición cubierta por órdenes stop (una por cada par SL/TP).
+    """
+    return sum(abs(float(order.qty)) for order in orders if order.type in ('stop', 'stop_limit', 'trailing_stop'))
+
+def plan_orders(symbol, old_qty, new_qty, sl, tp):
+    """
+    Traduce un cambio de posición en órdenes de modo bracket.
+
+    - Apertura desde cero: una orden bracket.
+    - Aumento en el mismo lado: bracket por la cantidad añadida.
+    - Reducción o cierre: se cancelan las salidas, orden a mercado y, si queda
+      posición, un OCO nuevo por el resto.
+    - Cambio de lado: se cancelan las salidas, se cierra y se abre con bracket.
+
+    Args:
+        old_qty: Cantidad con signo actual
+        new_qty: Cantidad con signo objetivo
+        sl: Nivel de stop-loss de la posición resultante
+        tp: Nivel de take-profit de la posición resultante
+
+    Returns:
+        tuple: (cancelar_salidas_existentes, lista de (cantidad_inicial, orden))
+    """
+    new_side = 'buy' if new_qty > 0 else 'sell'
+    if old_qty == 0:
+        return False, [(0, bracket_order(symbol, abs(new_qty), new_side, sl, tp))]
+
+    same_side = new_qty != 0 and (old_qty > 0) == (new_qty > 0)
+    if same_side and abs(new_qty) > abs(old_qty):
+        return False, [(old_qty, bracket_order(symbol, abs(new_qty) - abs(old_qty), new_side, sl, tp))]
+
+    close_side = 'sell' if old_qty > 0 else 'buy'
+    if same_side:
+        return True, [
+            (old_qty, market_order(symbol, abs(old_qty) - abs(new_qty), close_side)),
+            (None, oco_order(symbol, abs(new_qty), new_side, sl, tp))
+        ]
+    if new_qty == 0:
+        return True, [(old_qty, market_order(symbol, abs(old_qty), close_side))]
+    return True, [
+        (old_qty, market_order(symbol, abs(old_qty), close_side)),
+        (0, bracket_order(symbol, abs(new_qty), new_side, sl, tp))
+    ]
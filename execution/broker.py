@@ -1,48 +1,145 @@
-import alpaca_trade_api as tradeapi
-import os
-import json
+import uuid
+import numpy as np
 from datetime import datetime
-from utils.telegram_notifier import send_telegram_message
-from utils.environment import ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.telegram_notifier import send_telegram_message, get_notifier
+from utils.transport import rest_client
+from utils.metrics import timed
+from utils.environment import (ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL, CONCURRENT_EXECUTION, TRACK_FILLS,
+                               ORDER_MODE, STOP_MODE)
+from execution.concurrency import RateLimiter, RateLimitedAPI, retry_with_backoff
+from execution.snapshot import RebalanceSnapshot
+from execution.portfolio_diff import compute_net_orders
+from execution.order_tracker import OrderTracker
+from execution.streams import AlpacaTradeUpdatesSource
+from execution.brackets import (sl_tp_levels, plan_orders, open_orders_by_symbol, cancel_orders, market_order,
+                                wait_for_fill)
+from execution.trade_journal import get_trade_journal
+from data.history_store import get_history
+from data.atr_cache import get_atr, atr_stop_pcts
 
-# Inicializar la API con las variables importadas
-api = tradeapi.REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL, api_version='v2')
+# Inicializar la API con las variables importadas (sobre la sesión HTTP compartida)
+api = rest_client(ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL)
 
-# Archivo para almacenar información de las operaciones
-TRADE_LOG_FILE = "trade_log.json"
+# Ejecución concurrente: Alpaca permite 200 peticiones por minuto por cuenta
+BROKER_RATE_LIMIT = 200 / 60  # peticiones por segundo
+BROKER_RATE_BURST = 10
+MAX_IN_FLIGHT_ORDERS = 8
+ORDER_RETRIES = 3
 
-def load_trade_log():
-    if os.path.exists(TRADE_LOG_FILE):
-        try:
-            with open(TRADE_LOG_FILE, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-    else:
-        return {}
+# Rebalanceo neto: valor mínimo por orden (USD) y rotación máxima por rebalanceo
+# como fracción del equity (None = sin límite)
+MIN_TRADE_VALUE = 100.0
+MAX_TURNOVER = None
+
+# Seguimiento de llenados: espera máxima (segundos) a que terminen las órdenes
+FILL_TIMEOUT = 60
+_order_tracker = None
+
+# Vigencia (segundos) de la foto de posiciones y precios compartida en un rebalanceo
+SNAPSHOT_TTL = 30
+_snapshot = None
+
+def get_rebalance_snapshot(symbols):
+    """
+    Devuelve la foto de cuenta, posiciones y precios del rebalanceo en curso.
+    
+    close_positions y execute_trades la comparten: solo se vuelve a pedir al
+    broker si ha caducado o si faltan símbolos.
+    
+    Args:
+        symbols: Símbolos cuyo precio se necesita
+    
+    Returns:
+        RebalanceSnapshot
+    """
+    global _snapshot
+    if _snapshot is None or not _snapshot.is_fresh(SNAPSHOT_TTL) or not _snapshot.covers(symbols):
+        _snapshot = RebalanceSnapshot.fetch(api, symbols)
+    return _snapshot
+
+def invalidate_snapshot():
+    global _snapshot
+    _snapshot = None
+
+def get_order_tracker():
+    """
+    Devuelve el seguimiento de órdenes, conectándolo al stream de Alpaca la
+    primera vez que se usa.
+    """
+    global _order_tracker
+    if _order_tracker is None:
+        source = AlpacaTradeUpdatesSource(ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL)
+        _order_tracker = OrderTracker(source, get_trade_journal())
+        _order_tracker.start()
+    return _order_tracker
 
-def save_trade_log(trade_log):
-    with open(TRADE_LOG_FILE, 'w') as f:
-        json.dump(trade_log, f, indent=4)
+def set_order_tracker(tracker):
+    """Sustituye el seguimiento de órdenes (por ejemplo, con una fuente local)."""
+    global _order_tracker
+    _order_tracker = tracker
 
-def execute_trades(positions):
+def get_stop_pcts(symbols, prices, stop_loss_pct, take_profit_pct, stop_mode=None):
+    """
+    Distancias de SL/TP por símbolo. En modo "atr" se derivan del ATR diario
+    (una petición de barras para todos los símbolos, en caché durante el día);
+    si no hay ATR se usan los porcentajes fijos.
+    
+    Args:
+        symbols: Símbolos que necesitan niveles
+        prices: Diccionario símbolo -> precio de referencia
+        stop_mode: "pct" o "atr" (por defecto STOP_MODE)
+    
+    Returns:
+        dict: Símbolo -> (stop_loss_pct, take_profit_pct)
+    """
+    if stop_mode is None:
+        stop_mode = STOP_MODE
+    pcts = {symbol: (stop_loss_pct, take_profit_pct) for symbol in symbols}
+    if stop_mode != 'atr' or not pcts:
+        return pcts
+    try:
+        atr = get_atr(api, list(pcts))
+    except Exception as e:
+        print(f"Error calculando ATR: {e}. Se usan niveles fijos.")
+        return pcts
+    for symbol in pcts:
+        pcts[symbol] = atr_stop_pcts(atr.get(symbol), prices.get(symbol)) or pcts[symbol]
+    return pcts
+
+@timed("execute_trades")
+def execute_trades(positions, stop_loss_pct=0.03, take_profit_pct=0.05, concurrent=None, order_mode=None,
+                   stop_mode=None):
     """
     Ejecuta operaciones basadas en las posiciones calculadas.
     
     Args:
         positions: Diccionario con ticker como clave y peso como valor.
                   Peso positivo = posición larga, negativo = posición corta
+        stop_loss_pct: Distancia del stop-loss respecto al precio de entrada
+        take_profit_pct: Distancia del take-profit respecto al precio de entrada
+        concurrent: Procesar los tickers en paralelo (por defecto CONCURRENT_EXECUTION)
+        order_mode: "market" o "bracket" (SL/TP como órdenes en el broker; por defecto ORDER_MODE)
+        stop_mode: "pct" o "atr" (niveles como múltiplos del ATR; por defecto STOP_MODE)
     """
-    trade_log = load_trade_log()
+    # Los avisos por ticker (también los de los hilos de trabajo) salen en un único mensaje
+    with get_notifier().digest("📈 <b>Ejecución de operaciones</b>"):
+        _execute_trades(positions, stop_loss_pct, take_profit_pct, concurrent, order_mode, stop_mode)
+
+def _execute_trades(positions, stop_loss_pct=0.03, take_profit_pct=0.05, concurrent=None, order_mode=None,
+                    stop_mode=None):
+    journal = get_trade_journal()
+    trade_log = journal.positions()
     
     # Si no hay posiciones para ejecutar, retornamos
     if not positions:
         print("No hay nuevas posiciones para ejecutar")
         return
     
-    # Obtener el efectivo disponible en la cuenta
+    # Obtener cuenta, posiciones y precios en bloque (compartidos con close_positions)
     try:
-        account = api.get_account()
+        snapshot = get_rebalance_snapshot(list(positions))
+        account = snapshot.account
         cash = float(account.cash)
         equity = float(account.equity)
         
@@ -53,62 +150,164 @@ def execute_trades(positions):
         send_telegram_message(f"⚠️ Error obteniendo información de la cuenta: {e}")
         return
     
+    if concurrent is None:
+        concurrent = CONCURRENT_EXECUTION
+    if order_mode is None:
+        order_mode = ORDER_MODE
+    
+    # Distancias de SL/TP por ticker (fijas o por ATR)
+    stop_pcts = get_stop_pcts(list(positions), snapshot.prices, stop_loss_pct, take_profit_pct, stop_mode)
+    
+    # En modo bracket las salidas abiertas se consultan una sola vez
+    bracket = None
+    if order_mode == 'bracket':
+        try:
+            bracket = {'open_orders': open_orders_by_symbol(api), 'trade_log': trade_log}
+        except Exception as e:
+            print(f"Error obteniendo órdenes abiertas: {e}")
+            send_telegram_message(f"⚠️ Error obteniendo órdenes abiertas: {e}")
+            return
+    
     # Ejecutar operaciones para cada ticker
-    for ticker, weight in positions.items():
-        # Omitir si el peso es demasiado pequeño
-        if abs(weight) < 0.01:
-            continue
-            
+    if concurrent:
+        # Pipeline concurrente: llamadas limitadas al ritmo del broker, número
+        # acotado de tickers en vuelo y reintentos con backoff por orden
+        client = RateLimitedAPI(api, RateLimiter(BROKER_RATE_LIMIT, BROKER_RATE_BURST))
+        # Los avisos de los hilos de trabajo van al resumen de execute_trades
+        digest = get_notifier().current_digest()
+        
+        def execute_ticker(*args):
+            with get_notifier().joined(digest):
+                return _execute_ticker(*args)
+        
+        with ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT_ORDERS) as executor:
+            futures = {
+                executor.submit(execute_ticker, client, snapshot, ticker, weight, available_capital,
+                                *stop_pcts[ticker], ORDER_RETRIES, bracket): ticker
+                for ticker, weight in positions.items()
+            }
+            results = [(futures[future], future.result()) for future in as_completed(futures)]
+    else:
+        results = [
+            (ticker, _execute_ticker(api, snapshot, ticker, weight, available_capital, *stop_pcts[ticker],
+                                     bracket=bracket))
+            for ticker, weight in positions.items()
+        ]
+    
+    # Registrar las posiciones abiertas (una fila por ticker)
+    for ticker, entry in results:
+        if entry is not None:
+            previous = trade_log.get(ticker)
+            if previous is not None and previous['side'] != entry['side']:
+                journal.close_position(ticker, exit_price=entry['entry'], reason='rebalanceo')
+            journal.upsert(ticker, entry)
+    
+    # Las posiciones han cambiado: la foto ya no es válida
+    invalidate_snapshot()
+
+def _get_latest_price(client, ticker):
+    """
+    Obtiene el último precio de un ticker con los métodos alternativos de la API.
+    """
+    try:
+        last_trade = client.get_latest_trade(ticker)
+        return last_trade.price
+    except AttributeError:
+        # Intento alternativo si get_latest_trade no existe
         try:
-            # Determinar el lado de la operación
-            side = 'buy' if weight > 0 else 'sell'
-            
-            # Obtener precio actual - Actualizado para usar el método correcto en la API de Alpaca
-            try:
-                last_trade = api.get_latest_trade(ticker)
-                price = last_trade.price
-            except AttributeError:
-                # Intento alternativo si get_latest_trade no existe
-                try:
-                    last_quote = api.get_latest_quote(ticker)
-                    price = (last_quote.ask_price + last_quote.bid_price) / 2
-                except:
-                    # Último intento usando barras
-                    latest_bar = api.get_latest_bar(ticker)
-                    price = latest_bar.c
-            
-            # Calcular cantidad de acciones a comprar/vender basado en el peso asignado
-            target_position_value = available_capital * abs(weight)
-            amount = int(target_position_value // price)
-            
-            # Si la cantidad es 0, no ejecutamos
-            if amount <= 0:
-                print(f"Cantidad calculada para {ticker} es 0, omitiendo operación")
-                continue
-                
-            investment = amount * price
+            last_quote = client.get_latest_quote(ticker)
+            return (last_quote.ask_price + last_quote.bid_price) / 2
+        except:
+            # Último intento usando barras
+            latest_bar = client.get_latest_bar(ticker)
+            return latest_bar.c
+
+def _submit_order(client, retries=0, **order):
+    """
+    Envía una orden reintentando errores transitorios.
+
+    El client_order_id se fija antes del primer intento: si un intento llegó al
+    broker pero la respuesta se perdió, el reintento no duplica la orden.
+    """
+    if not retries:
+        return client.submit_order(**order)
+
+    order.setdefault('client_order_id', uuid.uuid4().hex)
+
+    def attempt():
+        try:
+            return client.submit_order(**order)
+        except Exception as e:
+            if "client_order_id must be unique" in str(e).lower():
+                return client.get_order_by_client_order_id(order['client_order_id'])
+            raise
+    return retry_with_backoff(attempt, retries=retries)
+
+def _execute_ticker(client, snapshot, ticker, weight, available_capital, stop_loss_pct, take_profit_pct,
+                    retries=0, bracket=None):
+    """
+    Ejecuta la operación de un ticker.
+    
+    Con bracket (órdenes abiertas y registro de operaciones) las órdenes llevan
+    sus salidas SL/TP en el broker en lugar de ser órdenes a mercado simples.
+    
+    Returns:
+        dict: Entrada del registro de operaciones si se abrió una posición nueva, None en otro caso
+    """
+    # Omitir si el peso es demasiado pequeño
+    if abs(weight) < 0.01:
+        return None
+        
+    try:
+        # Determinar el lado de la operación
+        side = 'buy' if weight > 0 else 'sell'
+        
+        # Obtener precio actual (de la foto; consulta individual si no vino en bloque)
+        price = snapshot.prices.get(ticker)
+        if price is None:
+            price = _get_latest_price(client, ticker)
+        
+        # Calcular cantidad de acciones a comprar/vender basado en el peso asignado
+        target_position_value = available_capital * abs(weight)
+        amount = int(target_position_value // price)
+        
+        # Si la cantidad es 0, no ejecutamos
+        if amount <= 0:
+            print(f"Cantidad calculada para {ticker} es 0, omitiendo operación")
+            return None
             
+        investment = amount * price
+        
+        if bracket is not None:
+            levels = _execute_ticker_bracket(client, snapshot, ticker, side, amount, price, bracket,
+                                             stop_loss_pct, take_profit_pct, retries)
+            if levels is None:
+                return None
+            sl, tp = levels
+        else:
             # Verificar posición actual para no duplicar órdenes
-            try:
-                current_position = api.get_position(ticker)
+            current_position = snapshot.positions.get(ticker)
+            if current_position is not None:
                 current_qty = int(float(current_position.qty))
                 current_side = current_position.side
-                
+            
                 # Si ya tenemos una posición en la misma dirección, ajustamos la cantidad
                 if (side == 'buy' and current_side == 'long') or (side == 'sell' and current_side == 'short'):
                     print(f"Ya existe posición en {ticker} en la misma dirección. Ajustando cantidad.")
                     send_telegram_message(f"ℹ️ Ya existe posición en {ticker}. Ajustando en lugar de abrir nueva.")
-                    
+                
                     # Calcular la diferencia en la cantidad
                     if side == 'buy':
                         qty_diff = amount - current_qty
                     else:
                         qty_diff = amount - abs(current_qty)
-                    
+                
                     # Si necesitamos ajustar la posición
                     if abs(qty_diff) > 0:
                         adj_side = side if qty_diff > 0 else ('sell' if side == 'buy' else 'buy')
-                        api.submit_order(
+                        _submit_order(
+                            client,
+                            retries,
                             symbol=ticker,
                             qty=abs(qty_diff),
                             side=adj_side,
@@ -118,63 +317,122 @@ def execute_trades(positions):
                         send_telegram_message(
                             f"🔄 Ajustada posición en {ticker}: {adj_side} {abs(qty_diff)} acciones."
                         )
-                    continue
-                
-                # Si tenemos una posición en dirección opuesta, la cerramos primero
-                if (side == 'buy' and current_side == 'short') or (side == 'sell' and current_side == 'long'):
-                    print(f"Cerrando posición opuesta en {ticker} antes de abrir nueva.")
-                    close_side = 'buy' if current_side == 'short' else 'sell'
-                    api.submit_order(
-                        symbol=ticker,
-                        qty=abs(current_qty),
-                        side=close_side,
-                        type='market',
-                        time_in_force='day'
-                    )
-                    send_telegram_message(f"🔄 Cerrada posición opuesta en {ticker} antes de abrir nueva.")
-                    
-            except Exception as e:
-                # Si no existe posición, continuamos normalmente
-                if "position does not exist" not in str(e).lower():
-                    print(f"Error verificando posición actual de {ticker}: {e}")
+                    return None
             
+                # Si tenemos una posición en dirección opuesta, la cerramos primero
+                print(f"Cerrando posición opuesta en {ticker} antes de abrir nueva.")
+                close_side = 'buy' if current_side == 'short' else 'sell'
+                close_order = _submit_order(
+                    client,
+                    retries,
+                    symbol=ticker,
+                    qty=abs(current_qty),
+                    side=close_side,
+                    type='market',
+                    time_in_force='day'
+                )
+                # La apertura del otro lado no se acepta mientras la posición siga abierta
+                wait_for_fill(client, close_order)
+                send_telegram_message(f"🔄 Cerrada posición opuesta en {ticker} antes de abrir nueva.")
+        
             # Ejecutamos la orden
-            api.submit_order(
+            _submit_order(
+                client,
+                retries,
                 symbol=ticker,
                 qty=amount,
                 side=side,
                 type='market',
                 time_in_force='day'
             )
-            
+        
             # Calcular niveles de SL/TP
-            sl = price * 0.97 if side == 'buy' else price * 1.03
-            tp = price * 1.05 if side == 'buy' else price * 0.95
-            
-            # Guardar en el registro de operaciones
-            trade_log[ticker] = {
-                'entry': price,
-                'qty': amount,
-                'side': side,
-                'sl': sl,
-                'tp': tp,
-                'entry_time': datetime.now().isoformat(),
-                'last_update': datetime.now().isoformat()
-            }
-            
-            # Enviar mensaje por Telegram
-            action = "comprado" if side == 'buy' else "vendido"
-            send_telegram_message(
-                f"📈 Operación realizada: {action} {amount} de {ticker} a {price:.2f} USD. "
-                f"Inversión: {investment:.2f} USD. SL: {sl:.2f}, TP: {tp:.2f}"
-            )
-        except Exception as e:
-            print(f"Error al operar {ticker}: {e}")
-            send_telegram_message(f"⚠️ Error al operar {ticker}: {e}")
+            sl = price * (1 - stop_loss_pct) if side == 'buy' else price * (1 + stop_loss_pct)
+            tp = price * (1 + take_profit_pct) if side == 'buy' else price * (1 - take_profit_pct)
+        
+        # Enviar mensaje por Telegram
+        action = "comprado" if side == 'buy' else "vendido"
+        send_telegram_message(
+            f"📈 Operación realizada: {action} {amount} de {ticker} a {price:.2f} USD. "
+            f"Inversión: {investment:.2f} USD. SL: {sl:.2f}, TP: {tp:.2f}"
+        )
+        
+        # Entrada para el registro de operaciones
+        return {
+            'entry': price,
+            'qty': amount,
+            'side': side,
+            'sl': sl,
+            'tp': tp,
+            'entry_time': datetime.now().isoformat(),
+            'last_update': datetime.now().isoformat()
+        }
+    except Exception as e:
+        print(f"Error al operar {ticker}: {e}")
+        send_telegram_message(f"⚠️ Error al operar {ticker}: {e}")
+        return None
+
+def _bracket_levels(entry, old_qty, new_qty, price, stop_loss_pct, take_profit_pct):
+    """
+    Niveles de SL/TP para la posición resultante de pasar de old_qty a new_qty.
+    
+    Si la posición sigue en el mismo lado se conservan los niveles del registro,
+    para que las salidas nuevas coincidan con las que ya están en el broker.
+    """
+    side = 'buy' if new_qty > 0 else 'sell'
+    same_side = old_qty != 0 and (old_qty > 0) == (new_qty > 0)
+    if same_side and entry is not None and entry.get('side') == side:
+        return entry['sl'], entry['tp']
+    return sl_tp_levels(side, price, stop_loss_pct, take_profit_pct)
+
+def _submit_plan(client, retries, to_cancel, steps):
+    """
+    Cancela las salidas indicadas y envía en orden los pasos de plan_orders.
+    Cada paso espera a que el broker confirme las cancelaciones y a que se
+    llene el cierre anterior, que es lo que libera la cantidad que usa.
     
-    # Guardar el registro de operaciones actualizado
-    save_trade_log(trade_log)
+    Returns:
+        Exception o None si todos los pasos fueron aceptados
+    """
+    try:
+        cancel_orders(client, to_cancel)
+        for i, (_, order) in enumerate(steps):
+            submitted = _submit_order(client, retries, **order)
+            if i + 1 < len(steps) and order['type'] == 'market' and 'order_class' not in order:
+                wait_for_fill(client, submitted)
+        return None
+    except Exception as e:
+        return e
 
+def _execute_ticker_bracket(client, snapshot, ticker, side, amount, price, bracket,
+                            stop_loss_pct, take_profit_pct, retries=0):
+    """
+    Variante bracket de _execute_ticker: lleva la posición a amount acciones en
+    el lado side con órdenes que incluyen sus salidas SL/TP.
+    
+    Returns:
+        tuple: Niveles (sl, tp) si se abrió una posición nueva, None si solo se ajustó
+    """
+    current_position = snapshot.positions.get(ticker)
+    old_qty = int(float(current_position.qty)) if current_position is not None else 0
+    new_qty = amount if side == 'buy' else -amount
+    if old_qty == new_qty:
+        return None
+    
+    sl, tp = _bracket_levels(bracket['trade_log'].get(ticker), old_qty, new_qty, price,
+                             stop_loss_pct, take_profit_pct)
+    cancel, steps = plan_orders(ticker, old_qty, new_qty, sl, tp)
+    to_cancel = bracket['open_orders'].get(ticker, []) if cancel else []
+    error = _submit_plan(client, retries, to_cancel, steps)
+    if error is not None:
+        raise error
+    
+    if old_qty != 0 and (old_qty > 0) == (new_qty > 0):
+        send_telegram_message(f"🔄 Ajustada posición en {ticker} a {amount} acciones con salidas SL/TP en el broker.")
+        return None
+    return sl, tp
+
+@timed("close_positions")
 def close_positions(target_positions):
     """
     Cierra posiciones que ya no están en la lista de posiciones objetivo.
@@ -182,22 +440,27 @@ def close_positions(target_positions):
     Args:
         target_positions: Diccionario con posiciones objetivo
     """
-    trade_log = load_trade_log()
+    journal = get_trade_journal()
     
     try:
-        current_positions = api.list_positions()
+        snapshot = get_rebalance_snapshot(list(target_positions))
+        current_positions = snapshot.positions.values()
+        # En modo bracket hay que cancelar las salidas antes de cerrar
+        open_orders = open_orders_by_symbol(api) if ORDER_MODE == 'bracket' else {}
     except Exception as e:
         print(f"Error al obtener posiciones actuales: {e}")
         return
         
     for pos in current_positions:
         symbol = pos.symbol
-        qty = int(float(pos.qty))
+        # Alpaca devuelve qty negativa para posiciones cortas
+        qty = abs(int(float(pos.qty)))
         
         # Si el símbolo no está en posiciones objetivo o tiene peso 0, cerramos
         if symbol not in target_positions or abs(target_positions.get(symbol, 0)) < 0.01:
             side = 'sell' if pos.side == 'long' else 'buy'
             try:
+                cancel_orders(api, open_orders.get(symbol, []))
                 api.submit_order(
                     symbol=symbol,
                     qty=qty,
@@ -206,15 +469,248 @@ def close_positions(target_positions):
                     time_in_force='day'
                 )
                 
-                # Eliminar del registro de operaciones
-                if symbol in trade_log:
-                    del trade_log[symbol]
+                # Pasar la posición al historial de operaciones cerradas
+                journal.close_position(symbol, exit_price=snapshot.prices.get(symbol), reason='rebalanceo')
                 
                 send_telegram_message(f"🔴 Cerrada posición en {symbol} ({'venta' if side == 'sell' else 'compra'})")
 
             except Exception as e:
                 print(f"Error al cerrar {symbol}: {e}")
                 send_telegram_message(f"⚠️ Error al cerrar {symbol}: {e}")
+
+@timed("rebalance")
+def rebalance(target_positions, stop_loss_pct=0.03, take_profit_pct=0.05, concurrent=None,
+              min_trade_value=None, max_turnover=None, track_fills=None, order_mode=None, stop_mode=None):
+    """
+    Lleva la cartera a los pesos objetivo con una única orden neta por símbolo.
+    
+    Sustituye a close_positions + execute_trades: cierres, ajustes y cambios de
+    lado salen del mismo cálculo vectorizado. Un cambio de lado se envía como
+    dos órdenes, el cierre y la apertura, y la apertura espera al llenado del
+    cierre (el broker rechaza una orden que cruce de largo a corto o al revés).
+    
+    Args:
+        target_positions: Diccionario con ticker como clave y peso como valor
+        stop_loss_pct: Distancia del stop-loss respecto al precio de entrada
+        take_profit_pct: Distancia del take-profit respecto al precio de entrada
+        concurrent: Enviar las órdenes en paralelo (por defecto CONCURRENT_EXECUTION)
+        min_trade_value: Valor mínimo por orden (por defecto MIN_TRADE_VALUE)
+        max_turnover: Rotación máxima como fracción del equity (por defecto MAX_TURNOVER)
+        track_fills: Registrar precio y cantidad reales de cada llenado a partir del
+                     stream de trade updates (por defecto TRACK_FILLS)
+        order_mode: "market" o "bracket": las posiciones abiertas llevan sus salidas
+                    SL/TP como órdenes en el broker (por defecto ORDER_MODE)
+        stop_mode: "pct" o "atr": niveles de las posiciones nuevas como múltiplos
+                   del ATR diario (por defecto STOP_MODE)
+    
+    Returns:
+        dict: Símbolo -> error de las órdenes que no se enviaron (vacío si todas se aceptaron)
+    
+    Raises:
+        Exception: Si no se pudo obtener la foto de la cuenta o las órdenes abiertas
+                   (no se envía ninguna orden)
+    """
+    # Los avisos del rebalanceo salen junto al resumen en un único mensaje
+    with get_notifier().digest():
+        return _rebalance(target_positions, stop_loss_pct, take_profit_pct, concurrent, min_trade_value,
+                   max_turnover, track_fills, order_mode, stop_mode)
+
+def _rebalance(target_positions, stop_loss_pct=0.03, take_profit_pct=0.05, concurrent=None,
+               min_trade_value=None, max_turnover=None, track_fills=None, order_mode=None, stop_mode=None):
+    if track_fills is None:
+        track_fills = TRACK_FILLS
+    if concurrent is None:
+        concurrent = CONCURRENT_EXECUTION
+    if min_trade_value is None:
+        min_trade_value = MIN_TRADE_VALUE
+    if max_turnover is None:
+        max_turnover = MAX_TURNOVER
+    if order_mode is None:
+        order_mode = ORDER_MODE
+    
+    journal = get_trade_journal()
+    trade_log = journal.positions()
+    
+    # La foto decide todo el rebalanceo: un fallo transitorio se reintenta antes de renunciar
+    try:
+        snapshot = retry_with_backoff(lambda: get_rebalance_snapshot(list(target_positions)), retries=ORDER_RETRIES)
+        equity = float(snapshot.account.equity)
+    except Exception as e:
+        print(f"Error obteniendo información de la cuenta: {e}")
+        send_telegram_message(f"⚠️ Error obteniendo información de la cuenta: {e}")
+        raise
+    
+    # Vectores alineados por símbolo: cartera actual y objetivo
+    symbols = sorted(set(target_positions) | set(snapshot.positions))
+    current_qty = np.zeros(len(symbols), dtype=np.int64)
+    for i, symbol in enumerate(symbols):
+        position = snapshot.positions.get(symbol)
+        if position is not None:
+            qty = abs(int(float(position.qty)))
+            current_qty[i] = qty if position.side == 'long' else -qty
+    
+    prices = np.full(len(symbols), np.nan)
+    for i, symbol in enumerate(symbols):
+        price = snapshot.prices.get(symbol)
+        if price is None and symbol in target_positions:
+            try:
+                price = _get_latest_price(api, symbol)
+            except Exception as e:
+                print(f"Error obteniendo precio de {symbol}: {e}")
+        if price is not None:
+            prices[i] = price
+    
+    weights = np.array([target_positions.get(symbol, 0.0) for symbol in symbols], dtype=np.float64)
+    delta = compute_net_orders(current_qty, weights, prices, equity,
+                               min_trade_value=min_trade_value, max_turnover=max_turnover)
+    
+    orders = [
+        (symbols[i], {'symbol': symbols[i], 'qty': int(abs(delta[i])), 'side': 'buy' if delta[i] > 0 else 'sell',
+                      'type': 'market', 'time_in_force': 'day'})
+        for i in np.flatnonzero(delta)
+    ]
+    index = {symbol: i for i, symbol in enumerate(symbols)}
+    print(f"Rebalanceo: {len(orders)} órdenes netas para {len(symbols)} símbolos")
+    
+    # Distancias de SL/TP de los símbolos con orden (fijas o por ATR)
+    stop_pcts = get_stop_pcts([symbol for symbol, _ in orders], {s: prices[index[s]] for s, _ in orders},
+                              stop_loss_pct, take_profit_pct, stop_mode)
+    
+    # Órdenes en varios pasos por símbolo: (salidas a cancelar, pasos, niveles SL/TP o None).
+    # Modo bracket: cada orden neta se traduce en cancelar salidas y órdenes con SL/TP.
+    # Las salidas abiertas se consultan una sola vez para todo el rebalanceo.
+    plans = {}
+    if order_mode != 'bracket':
+        # Un cambio de lado sale como cierre y apertura: Alpaca rechaza una orden
+        # mayor que la posición que cruce de largo a corto o al revés
+        for symbol, order in orders:
+            i = index[symbol]
+            old_qty, new_qty = int(current_qty[i]), int(current_qty[i] + delta[i])
+            if old_qty != 0 and new_qty != 0 and (old_qty > 0) != (new_qty > 0):
+                plans[symbol] = ([], [(old_qty, market_order(symbol, abs(old_qty), order['side'])),
+                                      (0, market_order(symbol, abs(new_qty), order['side']))], None)
+    elif orders:
+        try:
+            open_orders = retry_with_backoff(lambda: open_orders_by_symbol(api), retries=ORDER_RETRIES)
+        except Exception as e:
+            print(f"Error obteniendo órdenes abiertas: {e}")
+            send_telegram_message(f"⚠️ Error obteniendo órdenes abiertas: {e}")
+            raise
+        for symbol, order in orders:
+            i = index[symbol]
+            old_qty, new_qty = int(current_qty[i]), int(current_qty[i] + delta[i])
+            levels = _bracket_levels(trade_log.get(symbol), old_qty, new_qty, prices[i], *stop_pcts[symbol])
+            cancel, steps = plan_orders(symbol, old_qty, new_qty, *levels)
+            plans[symbol] = (open_orders.get(symbol, []) if cancel else [], steps, levels)
+    
+    # Con seguimiento, cada orden se registra antes de enviarse para no perder su llenado
+    tracker = get_order_tracker() if track_fills and orders else None
+    if tracker is not None:
+        for symbol, order in orders:
+            if symbol not in plans:
+                order['client_order_id'] = uuid.uuid4().hex
+                tracker.register(order['client_order_id'], symbol, current_qty[index[symbol]],
+                                 *stop_pcts[symbol])
+                continue
+            # Las salidas OCO de una reducción no cambian la posición al enviarse
+            _, steps, levels = plans[symbol]
+            for initial_qty, step in steps:
+                if initial_qty is not None:
+                    step['client_order_id'] = uuid.uuid4().hex
+                    tracker.register(step['client_order_id'], symbol, initial_qty,
+                                     *stop_pcts[symbol], levels=levels)
     
-    # Guardar el registro de operaciones actualizado
-    save_trade_log(trade_log)
+    # Enviar órdenes (en modo bracket, los pasos de cada símbolo van en secuencia)
+    def submit(client, retries, symbol, order):
+        if symbol in plans:
+            to_cancel, steps, _ = plans[symbol]
+            return _submit_plan(client, retries, to_cancel, steps)
+        return _try_submit(client, retries, order)
+    
+    if concurrent:
+        client = RateLimitedAPI(api, RateLimiter(BROKER_RATE_LIMIT, BROKER_RATE_BURST))
+        with ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT_ORDERS) as executor:
+            futures = {executor.submit(submit, client, ORDER_RETRIES, symbol, order): symbol
+                       for symbol, order in orders}
+            errors = {futures[future]: future.result() for future in as_completed(futures)}
+    else:
+        errors = {symbol: submit(api, 0, symbol, order) for symbol, order in orders}
+    
+    # Órdenes enviadas al histórico (en modo bracket, cada paso del plan)
+    history_rows = []
+    for symbol, order in orders:
+        error = errors.get(symbol)
+        steps = [step for _, step in plans[symbol][1]] if symbol in plans else [order]
+        history_rows.extend({
+            'symbol': symbol, 'side': step['side'], 'qty': float(step['qty']), 'price': prices[index[symbol]],
+            'client_order_id': step.get('client_order_id'), 'error': error
+        } for step in steps)
+    get_history().record('orders', history_rows)
+    
+    # Actualizar el registro de operaciones con las órdenes aceptadas
+    summary = []
+    for symbol, order in orders:
+        error = errors.get(symbol)
+        if error is not None:
+            print(f"Error al operar {symbol}: {error}")
+            summary.append(f"⚠️ {symbol}: error {error}")
+            if tracker is not None:
+                steps = plans[symbol][1] if symbol in plans else [(None, order)]
+                for _, step in steps:
+                    if 'client_order_id' in step:
+                        tracker.forget(step['client_order_id'])
+            continue
+        
+        summary.append(f"{'🟢' if order['side'] == 'buy' else '🔴'} {symbol}: {order['side']} {order['qty']}")
+        if tracker is not None:
+            # El registro lo actualiza el seguimiento con cada llenado
+            continue
+        
+        i = index[symbol]
+        old_qty, new_qty, price = current_qty[i], current_qty[i] + delta[i], prices[i]
+        
+        exit_price = None if np.isnan(price) else float(price)
+        if new_qty == 0:
+            journal.close_position(symbol, exit_price=exit_price, reason='rebalanceo')
+        elif old_qty == 0 or np.sign(old_qty) != np.sign(new_qty) or symbol not in trade_log:
+            # Un cambio de lado cierra la posición anterior en el historial
+            journal.close_position(symbol, exit_price=exit_price, reason='rebalanceo')
+            side = 'buy' if new_qty > 0 else 'sell'
+            entry_price = price if not np.isnan(price) else float(snapshot.positions[symbol].avg_entry_price)
+            # En modo bracket los niveles son los enviados al broker
+            levels = plans[symbol][2] if symbol in plans else None
+            sl, tp = levels or sl_tp_levels(side, entry_price, *stop_pcts[symbol])
+            journal.upsert(symbol, {
+                'entry': float(entry_price),
+                'qty': int(abs(new_qty)),
+                'side': side,
+                'sl': float(sl),
+                'tp': float(tp),
+                'entry_time': datetime.now().isoformat(),
+                'last_update': datetime.now().isoformat()
+            })
+        else:
+            # Mismo lado: se conserva la entrada y los niveles, cambia la cantidad
+            journal.update(symbol, qty=int(abs(new_qty)), last_update=datetime.now().isoformat())
+    
+    if tracker is not None:
+        if not tracker.wait(FILL_TIMEOUT):
+            # Órdenes sin evento (p.ej. stream conectado tarde): se consulta su estado una vez
+            tracker.resolve_pending(api)
+            if tracker.pending():
+                print(f"Órdenes sin llenado tras {FILL_TIMEOUT}s: {len(tracker.pending())}")
+    invalidate_snapshot()
+    
+    if summary:
+        send_telegram_message("🔁 <b>Rebalanceo:</b>\n" + "\n".join(summary))
+    return {symbol: error for symbol, error in errors.items() if error is not None}
+
+def _try_submit(client, retries, order):
+    """
+    Envía una orden y devuelve el error (o None si fue aceptada).
+    """
+    try:
+        _submit_order(client, retries, **order)
+        return None
+    except Exception as e:
+        return e
@@ -0,0 +1,87 @@
+import time
+import random
+import threading
+import requests
+
+class RateLimiter:
+    """
+    Limitador de peticiones tipo token bucket, seguro entre hilos.
+
+    Args:
+        rate: Peticiones por segundo permitidas de forma sostenida
+        burst: Peticiones que pueden salir de golpe antes de empezar a esperar
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class RateLimitedAPI:
+    """
+    Envoltorio de un cliente REST que pasa cada llamada por un RateLimiter.
+    """
+
+    def __init__(self, api, limiter):
+        self._api = api
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        def limited(*args, **kwargs):
+            self._limiter.acquire()
+            return attr(*args, **kwargs)
+        return limited
+
+def is_retryable(error):
+    """
+    Solo se reintentan los errores transitorios: fallos de conexión y timeouts
+    de red, 429 y 5xx. El resto (respuestas 4xx del broker, errores de
+    validación o del propio código) se propaga en el primer intento.
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = getattr(error, 'status_code', None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+def retry_with_backoff(func, retries=3, base_delay=0.5, max_delay=8.0):
+    """
+    Ejecuta func reintentando con backoff exponencial y jitter.
+
+    Args:
+        func: Función sin argumentos a ejecutar
+        retries: Número máximo de reintentos tras el primer intento
+        base_delay: Espera inicial en segundos
+        max_delay: Espera máxima entre intentos
+
+    Returns:
+        El resultado de func
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            time.sleep(random.uniform(0, delay))
+            attempt += 1
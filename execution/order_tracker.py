@@ -0,0 +1,196 @@
+import logging
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from data.history_store import get_history
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+# Eventos tras los que una orden ya no recibirá más llenados
+TERMINAL_EVENTS = {'fill', 'canceled', 'rejected', 'expired', 'done_for_day'}
+
+def _qty(value):
+    """Cantidad en valor absoluto, como entero si no es fraccionaria."""
+    value = abs(float(value))
+    return int(value) if value.is_integer() else value
+
+def _field(obj, name, default=None):
+    """Lee un campo de un dict o de una entidad de Alpaca."""
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+class OrderTracker:
+    """
+    Seguimiento de órdenes a partir del stream de trade updates.
+
+    Las órdenes se registran por client_order_id antes de enviarse. Cada
+    llenado actualiza el diario de operaciones con el precio y la cantidad
+    reales, en lugar del precio previo a la orden.
+
+    Args:
+        source: Fuente de eventos con subscribe/start/stop
+        journal: Diario de operaciones (TradeJournal)
+    """
+
+    def __init__(self, source, journal):
+        self.source = source
+        self.journal = journal
+        self._pending = {}  # client_order_id -> datos de la orden
+        self._condition = threading.Condition()
+        self.source.subscribe(self.handle_update)
+
+    def start(self):
+        self.source.start()
+
+    def stop(self):
+        self.source.stop()
+
+    def register(self, client_order_id, symbol, current_qty, stop_loss_pct, take_profit_pct, levels=None):
+        """
+        Registra una orden antes de enviarla.
+
+        Args:
+            client_order_id: Identificador asignado a la orden
+            symbol: Símbolo de la orden
+            current_qty: Cantidad con signo de la posición antes de la orden
+            stop_loss_pct: Distancia del SL para posiciones nuevas
+            take_profit_pct: Distancia del TP para posiciones nuevas
+            levels: Niveles (sl, tp) fijos, p.ej. los de una orden bracket; si se
+                    indican sustituyen a los calculados sobre el precio de llenado
+        """
+        with self._condition:
+            self._pending[client_order_id] = {
+                'symbol': symbol,
+                'position_qty': float(current_qty),
+                'filled_qty': 0.0,
+                'stop_loss_pct': stop_loss_pct,
+                'take_profit_pct': take_profit_pct,
+                'levels': levels
+            }
+
+    def forget(self, client_order_id):
+        """Descarta una orden registrada que no llegó a aceptarse."""
+        with self._condition:
+            self._pending.pop(client_order_id, None)
+            self._condition.notify_all()
+
+    def pending(self):
+        with self._condition:
+            return list(self._pending)
+
+    def handle_update(self, update):
+        """
+        Procesa un evento de trade updates (fill, partial_fill, canceled...).
+        """
+        event = _field(update, 'event')
+        order = _field(update, 'order', {})
+        client_order_id = _field(order, 'client_order_id')
+
+        with self._condition:
+            meta = self._pending.get(client_order_id)
+            if meta is None:
+                return
+
+            if event in ('fill', 'partial_fill'):
+                self._apply_fill(meta, update, order)
+
+            if event in TERMINAL_EVENTS:
+                del self._pending[client_order_id]
+                if event != 'fill':
+                    logger.warning(f"Orden {client_order_id} de {meta['symbol']} terminada sin llenado completo: {event}")
+            self._condition.notify_all()
+
+    def _apply_fill(self, meta, update, order):
+        """Actualiza la entrada del símbolo con el llenado recibido."""
+        symbol = meta['symbol']
+        side = _field(order, 'side')
+        filled_qty = float(_field(order, 'filled_qty', 0) or 0)
+        fill_price = float(_field(order, 'filled_avg_price', 0) or _field(update, 'price', 0) or 0)
+        # Precio de esta ejecución si el evento lo trae (filled_avg_price es el medio acumulado)
+        price = float(_field(update, 'price', 0) or fill_price)
+
+        # Cantidad llenada desde el último evento de esta orden
+        increment = filled_qty - meta['filled_qty']
+        meta['filled_qty'] = filled_qty
+        previous_qty = meta['position_qty']
+        signed = increment if side == 'buy' else -increment
+
+        position_qty = _field(update, 'position_qty')
+        new_qty = float(position_qty) if position_qty is not None else previous_qty + signed
+        meta['position_qty'] = new_qty
+
+        if increment > 0:
+            get_history().record('fills', [{
+                'symbol': symbol, 'side': side, 'qty': increment, 'price': price,
+                'client_order_id': _field(order, 'client_order_id')
+            }])
+
+        entry = self.journal.get(symbol)
+        now = datetime.now().isoformat()
+
+        if new_qty == 0:
+            self.journal.close_position(symbol, exit_price=fill_price, reason='llenado')
+            logger.info(f"Posición en {symbol} cerrada a {fill_price:.2f}")
+        elif entry is not None and previous_qty != 0 and (previous_qty > 0) == (new_qty > 0):
+            # Mismo lado: si la posición crece, la entrada pasa a ser el precio medio
+            # (lo añadido entra al precio de esta ejecución, no al medio acumulado de la orden)
+            if abs(new_qty) > abs(previous_qty):
+                added = abs(new_qty) - abs(previous_qty)
+                entry['entry'] = (entry['entry'] * abs(previous_qty) + price * added) / abs(new_qty)
+            self.journal.update(symbol, entry=entry['entry'], qty=_qty(new_qty), last_update=now)
+        else:
+            # Posición nueva o cambio de lado: niveles calculados sobre el precio real
+            # (salvo que estén fijados por las salidas de una orden bracket)
+            new_side = 'buy' if new_qty > 0 else 'sell'
+            sl_pct, tp_pct = meta['stop_loss_pct'], meta['take_profit_pct']
+            if meta.get('levels') is not None:
+                sl, tp = meta['levels']
+            else:
+                sl = fill_price * (1 - sl_pct) if new_side == 'buy' else fill_price * (1 + sl_pct)
+                tp = fill_price * (1 + tp_pct) if new_side == 'buy' else fill_price * (1 - tp_pct)
+            if entry is not None and entry['side'] != new_side:
+                self.journal.close_position(symbol, exit_price=fill_price, reason='llenado')
+            self.journal.upsert(symbol, {
+                'entry': fill_price,
+                'qty': _qty(new_qty),
+                'side': new_side,
+                'sl': sl,
+                'tp': tp,
+                'entry_time': entry['entry_time'] if entry is not None and entry['side'] == new_side else now,
+                'last_update': now
+            })
+            logger.info(f"Llenado {symbol}: {new_side} {_qty(new_qty)} @ {fill_price:.2f}")
+
+    def wait(self, timeout):
+        """
+        Espera a que todas las órdenes registradas terminen.
+
+        Returns:
+            bool: True si no queda ninguna pendiente
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending, timeout=timeout)
+
+    def resolve_pending(self, client):
+        """
+        Consulta una vez al broker las órdenes que siguen pendientes (por ejemplo,
+        si el stream se conectó tarde) y aplica su estado como si fuera un evento.
+        """
+        for client_order_id in self.pending():
+            try:
+                order = client.get_order_by_client_order_id(client_order_id)
+            except Exception as e:
+                logger.error(f"Error consultando la orden {client_order_id}: {e}")
+                continue
+            status = _field(order, 'status')
+            event = {'filled': 'fill', 'partially_filled': 'partial_fill'}.get(status, status)
+            if event in TERMINAL_EVENTS or event == 'partial_fill':
+                order_data = {
+                    'client_order_id': client_order_id,
+                    'side': _field(order, 'side'),
+                    'filled_qty': _field(order, 'filled_qty'),
+                    'filled_avg_price': _field(order, 'filled_avg_price')
+                }
+                self.handle_update(SimpleNamespace(event=event, order=order_data, position_qty=None))
@@ -0,0 +1,77 @@
+import numpy as np
+
+def target_quantities(target_weights, prices, equity, min_weight=0.01):
+    """
+    Convierte pesos objetivo en número de acciones con signo.
+
+    Mismo criterio que execute_trades: acciones enteras por debajo del valor
+    objetivo y pesos menores que min_weight tratados como cero.
+
+    Args:
+        target_weights: Array de pesos (positivo = largo, negativo = corto)
+        prices: Array de precios (NaN si no hay precio)
+        equity: Capital de la cuenta
+        min_weight: Peso mínimo para mantener posición
+
+    Returns:
+        numpy.ndarray: Cantidades objetivo (int64)
+    """
+    weights = np.asarray(target_weights, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    active = (np.abs(weights) >= min_weight) & (prices > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.floor(equity * np.abs(weights) / prices)
+    return np.where(active, np.sign(weights) * shares, 0).astype(np.int64)
+
+def compute_net_orders(current_qty, target_weights, prices, equity,
+                       min_weight=0.01, min_trade_value=0.0, max_turnover=None):
+    """
+    Calcula la orden neta mínima por símbolo para pasar de las posiciones
+    actuales a los pesos objetivo, en una sola pasada vectorizada.
+
+    Un cambio de largo a corto es aquí una sola cantidad neta; al enviarla,
+    rebalance la divide en dos órdenes (cierre y apertura tras el llenado del
+    cierre), porque el broker rechaza una orden que cruce cero. Las órdenes por debajo de
+    min_trade_value se descartan salvo que cierren la posición. Si el valor
+    total negociado supera max_turnover * equity, se reduce en la misma
+    proporción solo la parte de cada orden que abre o aumenta posición: los
+    cierres y reducciones (y el cierre de un cambio de lado) se envían enteros.
+
+    Args:
+        current_qty: Array de cantidades actuales con signo (negativo = corto)
+        target_weights: Array de pesos objetivo alineado con current_qty
+        prices: Array de precios alineado con current_qty
+        equity: Capital de la cuenta
+        min_weight: Peso mínimo para mantener posición
+        min_trade_value: Valor mínimo (USD) de una orden que no cierra posición
+        max_turnover: Valor negociado máximo como fracción del equity (None = sin límite)
+
+    Returns:
+        numpy.ndarray: Cantidad a negociar por símbolo (positiva = compra, negativa = venta)
+    """
+    current = np.asarray(current_qty, dtype=np.int64)
+    weights = np.asarray(target_weights, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    target = target_quantities(weights, prices, equity, min_weight)
+
+    # Sin precio no se puede dimensionar: se mantiene la posición actual
+    target = np.where(np.isnan(prices) & (np.abs(weights) >= min_weight), current, target)
+    delta = target - current
+
+    closes = (target == 0) & (current != 0)
+    notional = np.abs(delta) * np.nan_to_num(prices)
+    delta = np.where((notional < min_trade_value) & ~closes, 0, delta)
+
+    if max_turnover is not None:
+        # Parte de cada orden que lleva la posición hacia cero y parte que abre o aumenta
+        reducing = np.where(np.sign(delta) == -np.sign(current),
+                            np.sign(delta) * np.minimum(np.abs(delta), np.abs(current)), 0)
+        opening = delta - reducing
+        values = np.nan_to_num(prices)
+        budget = max_turnover * equity - (np.abs(reducing) * values).sum()
+        opening_value = (np.abs(opening) * values).sum()
+        if opening_value > max(budget, 0.0):
+            opening = np.trunc(opening * (max(budget, 0.0) / opening_value)).astype(np.int64)
+        delta = reducing + opening
+
+    return delta
@@ -0,0 +1,122 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Trailing stop: cuando el precio avanza TRAILING_TRIGGER a favor, el SL pasa a
+# asegurar TRAILING_LOCK de ganancia sobre la entrada
+TRAILING_TRIGGER = 0.03
+TRAILING_LOCK = 0.015
+
+# Minutos entre actualizaciones periódicas de una posición
+UPDATE_INTERVAL_MINUTES = 60
+
+def _timestamp(value):
+    """Fecha ISO del registro como segundos epoch (NaN si falta)."""
+    if not value:
+        return np.nan
+    return datetime.fromisoformat(value).timestamp()
+
+class PositionBook:
+    """
+    Posiciones abiertas como arrays paralelos (struct-of-arrays) indexados por símbolo.
+
+    Permite evaluar SL/TP, P&L y trailing stops de todas las posiciones (o de
+    un subconjunto) en una sola operación vectorizada por actualización de precios.
+
+    Args:
+        symbols: Lista de símbolos; la posición i de cada array corresponde a symbols[i]
+        entry, qty, sl, tp: Arrays de precio de entrada, cantidad, stop-loss y take-profit
+        sign: Array con +1 para posiciones largas y -1 para cortas
+        last_update: Array con la última actualización enviada (segundos epoch)
+    """
+
+    def __init__(self, symbols, entry, qty, sign, sl, tp, last_update):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.entry = np.asarray(entry, dtype=np.float64)
+        self.qty = np.asarray(qty, dtype=np.float64)
+        self.sign = np.asarray(sign, dtype=np.int8)
+        self.sl = np.asarray(sl, dtype=np.float64)
+        self.tp = np.asarray(tp, dtype=np.float64)
+        self.last_update = np.asarray(last_update, dtype=np.float64)
+
+    @classmethod
+    def from_trade_log(cls, trade_log):
+        """Construye el libro desde el diccionario de posiciones del diario."""
+        symbols = list(trade_log)
+        entries = [trade_log[symbol] for symbol in symbols]
+        return cls(
+            symbols,
+            [e['entry'] for e in entries],
+            [e['qty'] for e in entries],
+            [1 if e['side'] == 'buy' else -1 for e in entries],
+            [e['sl'] for e in entries],
+            [e['tp'] for e in entries],
+            [_timestamp(e.get('last_update') or e.get('entry_time')) for e in entries]
+        )
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def indices(self, symbols):
+        """Índices de los símbolos dados que están en el libro."""
+        return np.array([self.index[s] for s in symbols if s in self.index], dtype=np.int64)
+
+    def evaluate(self, prices, idx=None, now=None):
+        """
+        Evalúa las posiciones idx con sus precios en una sola pasada.
+
+        Args:
+            prices: Array de precios alineado con idx
+            idx: Índices de las posiciones (por defecto todas)
+            now: Instante de la evaluación (segundos epoch)
+
+        Returns:
+            dict: Arrays alineados con idx: idx, price, pnl_pct, sl_hit, tp_hit,
+                  new_sl, sl_moved y update_due
+        """
+        idx = np.arange(len(self.symbols)) if idx is None else np.asarray(idx, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        now = time.time() if now is None else now
+
+        sign = self.sign[idx]
+        entry = self.entry[idx]
+        sl = self.sl[idx]
+        tp = self.tp[idx]
+
+        pnl_pct = sign * (prices - entry) / entry * 100
+        sl_hit = sign * (prices - sl) <= 0
+        tp_hit = sign * (prices - tp) >= 0
+
+        # Con signo, el trailing es igual en largos y cortos: el SL solo se mueve a favor
+        lock = entry * (1 + sign * TRAILING_LOCK)
+        trailing = pnl_pct >= TRAILING_TRIGGER * 100
+        new_sl = np.where(trailing, sign * np.maximum(sign * sl, sign * lock), sl)
+        sl_moved = new_sl != sl
+
+        # NaN (sin fecha) cuenta como pendiente de actualización
+        update_due = ~(now - self.last_update[idx] < UPDATE_INTERVAL_MINUTES * 60)
+
+        return {
+            'idx': idx,
+            'price': prices,
+            'pnl_pct': pnl_pct,
+            'sl_hit': sl_hit,
+            'tp_hit': tp_hit,
+            'new_sl': new_sl,
+            'sl_moved': sl_moved,
+            'update_due': update_due
+        }
+
+    def remove(self, symbols):
+        """Quita posiciones del libro (p.ej. al cerrarse)."""
+        drop = self.indices(symbols)
+        if len(drop) == 0:
+            return
+        keep = np.ones(len(self.symbols), dtype=bool)
+        keep[drop] = False
+        self.symbols = [s for s, k in zip(self.symbols, keep) if k]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        for name in ('entry', 'qty', 'sign', 'sl', 'tp', 'last_update'):
+            setattr(self, name, getattr(self, name)[keep])
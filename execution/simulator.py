@@ -0,0 +1,392 @@
+import time
+import zlib
+import uuid
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from execution.streams import LocalEventSource
+
+class SimulatedAPIError(Exception):
+    """
+    Error devuelto por el broker simulado (equivalente a APIError de Alpaca,
+    con el código HTTP que devolvería Alpaca en status_code).
+    """
+
+    def __init__(self, message, status_code=422):
+        super().__init__(message)
+        self.status_code = status_code
+
+class SimulatedBroker:
+    """
+    Sustituto local de tradeapi.REST para pruebas y benchmarks.
+
+    Implementa las llamadas REST que usa el bot con la misma forma de respuesta
+    (atributos de Alpaca). Las órdenes de mercado se llenan al instante al último
+    precio; las stop/limit (incluidas las salidas de bracket y OCO) quedan
+    pendientes hasta que set_price las activa. Como en Alpaca, una orden a
+    mercado mayor que la posición del lado contrario se rechaza (un cambio de
+    lado son dos órdenes). Cada llamada puede añadir latencia y fallar con
+    cierta probabilidad.
+
+    Args:
+        prices: Diccionario símbolo -> último precio
+        cash: Efectivo inicial de la cuenta
+        latency: Segundos de latencia por llamada, o diccionario método -> segundos
+        jitter: Variación aleatoria máxima (en segundos) añadida a la latencia
+        error_rate: Probabilidad de error por llamada, o diccionario método -> probabilidad
+        market_open: Estado del mercado devuelto por get_clock
+        seed: Semilla para latencias, errores y barras sintéticas
+        fill_delay: Segundos entre la aceptación de una orden y su evento de llenado
+        slippage: Deslizamiento del precio de llenado (fracción, en contra de la orden)
+        cancel_delay: Segundos que una orden pasa en pending_cancel antes de quedar cancelada
+                      (Alpaca confirma las cancelaciones de forma asíncrona)
+    """
+
+    def __init__(self, prices=None, cash=100000.0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, market_open=True, seed=None, fill_delay=0.0, slippage=0.0, cancel_delay=0.0):
+        self.prices = dict(prices or {})
+        self.cash = float(cash)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.market_open = market_open
+        self.positions = {}  # símbolo -> {'qty': cantidad con signo, 'avg_entry_price': precio}
+        self.orders = []
+        self.call_counts = Counter()
+        self._siblings = {}  # id de orden -> ids de su pareja OCO
+        self.fill_delay = fill_delay
+        self.slippage = slippage
+        self.cancel_delay = cancel_delay
+        # Stream de trade updates equivalente al de Alpaca
+        self.trade_updates = LocalEventSource()
+        self._random = random.Random(seed)
+        self._seed = seed
+        self._lock = threading.Lock()
+
+    # --- Utilidades de simulación ---
+
+    def _call(self, method):
+        """Registra la llamada, aplica la latencia y, si toca, lanza un error."""
+        with self._lock:
+            self.call_counts[method] += 1
+            latency = self.latency.get(method, 0.0) if isinstance(self.latency, dict) else self.latency
+            error_rate = self.error_rate.get(method, 0.0) if isinstance(self.error_rate, dict) else self.error_rate
+            delay = latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = error_rate > 0 and self._random.random() < error_rate
+        # La espera se hace fuera del lock para que las llamadas concurrentes se solapen
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise SimulatedAPIError(f"simulated error in {method}", status_code=503)
+
+    def _price(self, symbol):
+        if symbol not in self.prices:
+            raise SimulatedAPIError(f"symbol not found: {symbol}", status_code=404)
+        return self.prices[symbol]
+
+    def set_position(self, symbol, qty, avg_entry_price=None):
+        """Crea o sustituye una posición (qty negativa = corta)."""
+        with self._lock:
+            if qty == 0:
+                self.positions.pop(symbol, None)
+            else:
+                price = avg_entry_price if avg_entry_price is not None else self.prices[symbol]
+                self.positions[symbol] = {'qty': float(qty), 'avg_entry_price': float(price)}
+
+    def total_calls(self):
+        return sum(self.call_counts.values())
+
+    def _position_entity(self, symbol, position):
+        qty = position['qty']
+        price = self.prices.get(symbol, position['avg_entry_price'])
+        return SimpleNamespace(
+            symbol=symbol,
+            qty=str(qty),
+            side='long' if qty > 0 else 'short',
+            avg_entry_price=str(position['avg_entry_price']),
+            current_price=str(price),
+            market_value=str(qty * price),
+            unrealized_pl=str((price - position['avg_entry_price']) * qty)
+        )
+
+    # --- Cuenta y mercado ---
+
+    def get_account(self):
+        self._call('get_account')
+        with self._lock:
+            market_value = sum(p['qty'] * self.prices.get(s, p['avg_entry_price'])
+                               for s, p in self.positions.items())
+            equity = self.cash + market_value
+        return SimpleNamespace(cash=str(self.cash), equity=str(equity),
+                               buying_power=str(max(equity, 0) * 2), status='ACTIVE')
+
+    def get_clock(self):
+        self._call('get_clock')
+        now = datetime.now()
+        return SimpleNamespace(is_open=self.market_open, timestamp=now,
+                               next_open=now + timedelta(hours=1), next_close=now + timedelta(hours=7))
+
+    # --- Datos de mercado ---
+
+    def get_latest_trade(self, symbol):
+        self._call('get_latest_trade')
+        return SimpleNamespace(symbol=symbol, price=self._price(symbol), size=100, timestamp=datetime.now())
+
+    def get_latest_trades(self, symbols):
+        self._call('get_latest_trades')
+        return {s: SimpleNamespace(symbol=s, price=self.prices[s], size=100, timestamp=datetime.now())
+                for s in symbols if s in self.prices}
+
+    def get_latest_quote(self, symbol):
+        self._call('get_latest_quote')
+        price = self._price(symbol)
+        return SimpleNamespace(symbol=symbol, ask_price=price * 1.0005, bid_price=price * 0.9995)
+
+    def get_latest_bar(self, symbol):
+        self._call('get_latest_bar')
+        price = self._price(symbol)
+        return SimpleNamespace(o=price, h=price, l=price, c=price, v=0)
+
+    def _synthetic_bars(self, symbol, limit):
+        """Barras diarias sintéticas que terminan en el último precio del símbolo."""
+        rng = np.random.default_rng([zlib.crc32(symbol.encode()), self._seed or 0])
+        closes = np.exp(np.cumsum(rng.normal(0, 0.01, limit)))
+        closes = closes / closes[-1] * self._price(symbol)
+        spread = np.abs(rng.normal(0, 0.005, limit)) * closes
+        index = pd.bdate_range(end=datetime.now().date(), periods=limit, tz='UTC')
+        return pd.DataFrame({
+            'open': closes, 'high': closes + spread, 'low': closes - spread,
+            'close': closes, 'volume': rng.integers(1e5, 1e6, limit)
+        }, index=index)
+
+    def get_bars(self, symbol, timeframe=None, start=None, end=None, limit=None, **kwargs):
+        self._call('get_bars')
+        limit = limit or 100
+        if isinstance(symbol, (list, tuple)):
+            frames = [self._synthetic_bars(s, limit).assign(symbol=s) for s in symbol]
+            return SimpleNamespace(df=pd.concat(frames) if frames else pd.DataFrame())
+        return SimpleNamespace(df=self._synthetic_bars(symbol, limit))
+
+    # --- Posiciones y órdenes ---
+
+    def get_position(self, symbol):
+        self._call('get_position')
+        with self._lock:
+            if symbol not in self.positions:
+                raise SimulatedAPIError("position does not exist", status_code=404)
+            return self._position_entity(symbol, self.positions[symbol])
+
+    def list_positions(self):
+        self._call('list_positions')
+        with self._lock:
+            return [self._position_entity(s, p) for s, p in self.positions.items()]
+
+    def _new_order(self, symbol, qty, side, type, time_in_force, client_order_id=None, **fields):
+        """Crea una orden pendiente y la añade al histórico (con el lock tomado)."""
+        order = SimpleNamespace(
+            id=str(uuid.uuid4()),
+            client_order_id=client_order_id or str(uuid.uuid4()),
+            symbol=symbol, qty=str(qty), side=side, type=type,
+            time_in_force=time_in_force, status='new', order_class='simple',
+            limit_price=None, stop_price=None, legs=None,
+            filled_qty='0', filled_avg_price=None,
+            submitted_at=datetime.now(), filled_at=None
+        )
+        for key, value in fields.items():
+            setattr(order, key, value)
+        self.orders.append(order)
+        return order
+
+    def _fill(self, order, price):
+        """Llena una orden al precio dado y devuelve su evento (con el lock tomado)."""
+        symbol = order.symbol
+        qty = float(order.qty)
+        signed = qty if order.side == 'buy' else -qty
+        position = self.positions.get(symbol)
+        current = position['qty'] if position else 0.0
+        new_qty = current + signed
+
+        if new_qty == 0:
+            self.positions.pop(symbol, None)
+        elif current == 0 or (current > 0) != (new_qty > 0):
+            # Posición nueva o cambio de lado: el precio medio es el de este llenado
+            self.positions[symbol] = {'qty': new_qty, 'avg_entry_price': price}
+        elif abs(new_qty) > abs(current):
+            avg = (position['avg_entry_price'] * abs(current) + price * qty) / abs(new_qty)
+            self.positions[symbol] = {'qty': new_qty, 'avg_entry_price': avg}
+        else:
+            position['qty'] = new_qty
+
+        self.cash -= signed * price
+        order.status = 'filled'
+        order.filled_qty = order.qty
+        order.filled_avg_price = str(price)
+        order.filled_at = datetime.now()
+
+        # Una salida llenada cancela a su pareja (OCO)
+        updates = [self._event('fill', order, price=price, qty=str(qty), position_qty=str(new_qty))]
+        for sibling_id in self._siblings.pop(order.id, []):
+            sibling = self._orders_by_id().get(sibling_id)
+            if sibling is not None and sibling.status == 'new':
+                sibling.status = 'canceled'
+                self._siblings.pop(sibling_id, None)
+                updates.append(self._event('canceled', sibling))
+        return updates
+
+    def _event(self, event, order, **fields):
+        return SimpleNamespace(event=event, timestamp=datetime.now(), order=dict(vars(order)), **fields)
+
+    def _publish(self, updates):
+        for update in updates:
+            if self.fill_delay > 0:
+                threading.Timer(self.fill_delay, self.trade_updates.publish, args=(update,)).start()
+            else:
+                self.trade_updates.publish(update)
+
+    def _orders_by_id(self):
+        return {order.id: order for order in self.orders}
+
+    def _link(self, *orders):
+        for order in orders:
+            self._siblings[order.id] = [other.id for other in orders if other is not order]
+
+    def submit_order(self, symbol, qty=None, side='buy', type='market', time_in_force='day',
+                     client_order_id=None, order_class=None, take_profit=None, stop_loss=None,
+                     limit_price=None, stop_price=None, **kwargs):
+        self._call('submit_order')
+        if client_order_id is not None and any(o.client_order_id == client_order_id for o in self.orders):
+            raise SimulatedAPIError("client_order_id must be unique")
+        qty = float(qty)
+        if qty <= 0:
+            raise SimulatedAPIError("qty must be > 0")
+        price = self._price(symbol) * (1 + self.slippage if side == 'buy' else 1 - self.slippage)
+
+        updates = []
+        with self._lock:
+            if type == 'market':
+                # Como Alpaca: una orden no puede cruzar de largo a corto (ni al revés) de una vez
+                position = self.positions.get(symbol)
+                current = position['qty'] if position else 0.0
+                if current != 0 and (current > 0) != (side == 'buy') and qty > abs(current):
+                    raise SimulatedAPIError(f"insufficient qty available for order "
+                                            f"(requested: {qty:g}, available: {abs(current):g})", status_code=403)
+            if order_class == 'oco':
+                # Salida limitada (TP) más stop (SL); la primera que se ejecute cancela a la otra
+                order = self._new_order(symbol, qty, side, 'limit', time_in_force, client_order_id,
+                                        order_class='oco', limit_price=str(take_profit['limit_price']))
+                stop = self._new_order(symbol, qty, side, 'stop', time_in_force,
+                                       order_class='oco', stop_price=str(stop_loss['stop_price']))
+                order.legs = [stop]
+                self._link(order, stop)
+            elif type == 'market':
+                order = self._new_order(symbol, qty, side, type, time_in_force, client_order_id,
+                                        order_class=order_class or 'simple')
+                updates = self._fill(order, price)
+                if order_class == 'bracket':
+                    exit_side = 'sell' if side == 'buy' else 'buy'
+                    take = self._new_order(symbol, qty, exit_side, 'limit', time_in_force, order_class='bracket',
+                                           limit_price=str(take_profit['limit_price']))
+                    stop = self._new_order(symbol, qty, exit_side, 'stop', time_in_force, order_class='bracket',
+                                           stop_price=str(stop_loss['stop_price']))
+                    order.legs = [take, stop]
+                    self._link(take, stop)
+            else:
+                order = self._new_order(symbol, qty, side, type, time_in_force, client_order_id,
+                                        limit_price=None if limit_price is None else str(limit_price),
+                                        stop_price=None if stop_price is None else str(stop_price))
+
+        self._publish(updates)
+        return order
+
+    def set_price(self, symbol, price):
+        """Actualiza el último precio de un símbolo y ejecuta las órdenes stop/limit que toque."""
+        updates = []
+        with self._lock:
+            self.prices[symbol] = float(price)
+            for order in list(self.orders):
+                if order.symbol != symbol or order.status != 'new':
+                    continue
+                if order.type == 'stop':
+                    stop = float(order.stop_price)
+                    triggered = price <= stop if order.side == 'sell' else price >= stop
+                elif order.type == 'limit':
+                    limit = float(order.limit_price)
+                    triggered = price >= limit if order.side == 'sell' else price <= limit
+                else:
+                    triggered = False
+                if triggered:
+                    updates.extend(self._fill(order, float(price)))
+        self._publish(updates)
+
+    def get_order(self, order_id, nested=None):
+        self._call('get_order')
+        with self._lock:
+            order = self._orders_by_id().get(order_id)
+        if order is None:
+            raise SimulatedAPIError("order not found", status_code=404)
+        return order
+
+    def get_order_by_client_order_id(self, client_order_id):
+        self._call('get_order_by_client_order_id')
+        with self._lock:
+            for order in self.orders:
+                if order.client_order_id == client_order_id:
+                    return order
+        raise SimulatedAPIError("order not found", status_code=404)
+
+    def list_orders(self, status='open', limit=None, nested=None, symbols=None, **kwargs):
+        self._call('list_orders')
+        with self._lock:
+            orders = [o for o in self.orders
+                      if (status == 'all' or (o.status == 'new') == (status == 'open'))
+                      and (symbols is None or o.symbol in symbols)]
+        return orders[:limit] if limit else orders
+
+    def cancel_order(self, order_id):
+        self._call('cancel_order')
+        with self._lock:
+            order = self._orders_by_id().get(order_id)
+            if order is None or order.status != 'new':
+                raise SimulatedAPIError("order is not cancelable")
+            if self.cancel_delay > 0:
+                order.status = 'pending_cancel'
+                threading.Timer(self.cancel_delay, self._confirm_cancel, args=(order,)).start()
+                return
+        self._confirm_cancel(order)
+
+    def _confirm_cancel(self, order):
+        with self._lock:
+            order.status = 'canceled'
+            for sibling_id in self._siblings.pop(order.id, []):
+                self._siblings[sibling_id] = [i for i in self._siblings.get(sibling_id, []) if i != order.id]
+            update = self._event('canceled', order)
+        self._publish([update])
+
+    def replace_order(self, order_id, qty=None, limit_price=None, stop_price=None, **kwargs):
+        self._call('replace_order')
+        with self._lock:
+            order = self._orders_by_id().get(order_id)
+            if order is None or order.status != 'new':
+                raise SimulatedAPIError("order is not replaceable")
+            # Como en Alpaca, el reemplazo es una orden nueva y la original queda 'replaced'
+            fields = {k: v for k, v in vars(order).items()
+                      if k not in ('id', 'client_order_id', 'symbol', 'qty', 'side', 'type', 'time_in_force')}
+            new = self._new_order(order.symbol, qty if qty is not None else order.qty, order.side,
+                                  order.type, order.time_in_force, **fields)
+            new.submitted_at = datetime.now()
+            if limit_price is not None:
+                new.limit_price = str(limit_price)
+            if stop_price is not None:
+                new.stop_price = str(stop_price)
+            order.status = 'replaced'
+            siblings = self._siblings.pop(order_id, [])
+            self._siblings[new.id] = siblings
+            for sibling_id in siblings:
+                self._siblings[sibling_id] = [new.id if i == order_id else i for i in self._siblings.get(sibling_id, [])]
+        return new
@@ -0,0 +1,57 @@
+import time
+
+# Símbolos por petición de precios en bloque (límite práctico de longitud de URL)
+SNAPSHOT_BATCH_SIZE = 200
+
+class RebalanceSnapshot:
+    """
+    Foto del estado de la cuenta antes de un rebalanceo: cuenta, posiciones
+    abiertas y último precio de cada símbolo, obtenidos en peticiones en bloque.
+
+    Args:
+        account: Entidad de cuenta de Alpaca
+        positions: Diccionario símbolo -> entidad de posición
+        prices: Diccionario símbolo -> último precio
+        symbols: Símbolos solicitados al construir la foto
+    """
+
+    def __init__(self, account, positions, prices, symbols=()):
+        self.account = account
+        self.positions = positions
+        self.prices = prices
+        self.symbols = set(symbols) | set(prices)
+        self.fetched_at = time.monotonic()
+
+    @classmethod
+    def fetch(cls, client, symbols):
+        """
+        Descarga la foto con un número de peticiones independiente del número
+        de posiciones: cuenta, lista de posiciones y precios en bloque.
+
+        Args:
+            client: Cliente REST de Alpaca
+            symbols: Símbolos cuyo precio se necesita (se añaden los de las posiciones)
+
+        Returns:
+            RebalanceSnapshot
+        """
+        account = client.get_account()
+        positions = {p.symbol: p for p in client.list_positions()}
+
+        wanted = sorted(set(symbols) | set(positions))
+        prices = {}
+        try:
+            for i in range(0, len(wanted), SNAPSHOT_BATCH_SIZE):
+                trades = client.get_latest_trades(wanted[i:i + SNAPSHOT_BATCH_SIZE])
+                prices.update({symbol: trade.price for symbol, trade in trades.items()})
+        except Exception as e:
+            # Sin precios en bloque cada ticker recurre a su consulta individual
+            print(f"Error obteniendo precios en bloque: {e}")
+
+        return cls(account, positions, prices, wanted)
+
+    def is_fresh(self, ttl):
+        return time.monotonic() - self.fetched_at <= ttl
+
+    def covers(self, symbols):
+        return set(symbols) <= self.symbols
@@ -0,0 +1,196 @@
+import time
+import logging
+import threading
+from types import SimpleNamespace
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+class LocalEventSource:
+    """
+    Fuente de eventos en memoria con la misma interfaz que los streams de Alpaca.
+
+    publish() entrega el evento a todos los suscriptores en el hilo que publica.
+    La usa el broker simulado y sirve para reproducir eventos en pruebas.
+    """
+
+    def __init__(self):
+        self._handlers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler):
+        with self._lock:
+            self._handlers.append(handler)
+
+    def publish(self, event):
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Error procesando evento local: {e}")
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class AlpacaTradeUpdatesSource:
+    """
+    Stream trade_updates de Alpaca ejecutado en un hilo en segundo plano.
+
+    Los manejadores son funciones normales: se llaman desde el hilo del stream
+    con la entidad de actualización (event, order, price, qty, position_qty...).
+    """
+
+    def __init__(self, key_id, secret_key, base_url):
+        self._key_id = key_id
+        self._secret_key = secret_key
+        self._base_url = base_url
+        self._handlers = []
+        self._stream = None
+        self._thread = None
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    async def _dispatch(self, update):
+        for handler in self._handlers:
+            try:
+                handler(update)
+            except Exception as e:
+                logger.error(f"Error procesando trade update: {e}")
+
+    def start(self):
+        import alpaca_trade_api as tradeapi
+
+        self._stream = tradeapi.Stream(self._key_id, self._secret_key, self._base_url)
+        self._stream.subscribe_trade_updates(self._dispatch)
+        # Stream.run crea su propio bucle asyncio dentro del hilo
+        self._thread = threading.Thread(target=self._stream.run, name="trade-updates", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._stream is not None:
+            try:
+                self._stream.stop()
+            except Exception as e:
+                logger.warning(f"Error deteniendo el stream de trade updates: {e}")
+
+class AlpacaPriceSource:
+    """
+    Stream de trades en tiempo real de Alpaca para los símbolos vigilados.
+
+    Cada trade llega a los manejadores como entidad con symbol, price y
+    timestamp. Los símbolos se pueden añadir o quitar con el stream en marcha.
+    """
+
+    def __init__(self, key_id, secret_key, base_url, data_feed='iex'):
+        self._key_id = key_id
+        self._secret_key = secret_key
+        self._base_url = base_url
+        self._data_feed = data_feed
+        self._handlers = []
+        self._symbols = set()
+        self._stream = None
+        self._thread = None
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def watch(self, symbols):
+        new = set(symbols) - self._symbols
+        self._symbols |= new
+        if new and self._stream is not None:
+            self._stream.subscribe_trades(self._dispatch, *sorted(new))
+
+    def unwatch(self, symbols):
+        old = set(symbols) & self._symbols
+        self._symbols -= old
+        if old and self._stream is not None:
+            self._stream.unsubscribe_trades(*sorted(old))
+
+    async def _dispatch(self, trade):
+        for handler in self._handlers:
+            try:
+                handler(trade)
+            except Exception as e:
+                logger.error(f"Error procesando trade de {getattr(trade, 'symbol', '?')}: {e}")
+
+    def start(self):
+        import alpaca_trade_api as tradeapi
+
+        self._stream = tradeapi.Stream(self._key_id, self._secret_key, self._base_url, data_feed=self._data_feed)
+        if self._symbols:
+            self._stream.subscribe_trades(self._dispatch, *sorted(self._symbols))
+        self._thread = threading.Thread(target=self._stream.run, name="price-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._stream is not None:
+            try:
+                self._stream.stop()
+            except Exception as e:
+                logger.warning(f"Error deteniendo el stream de precios: {e}")
+
+class ReplayPriceSource(LocalEventSource):
+    """
+    Reproduce una secuencia de trades con la interfaz de AlpacaPriceSource.
+
+    Sirve para probar el monitor en modo daemon sin conexión: los trades se
+    publican en orden, solo los de símbolos vigilados.
+
+    Args:
+        ticks: Iterable de (timestamp, symbol, price)
+        speed: Factor de velocidad respecto al tiempo real (0 = sin esperas)
+    """
+
+    def __init__(self, ticks, speed=0.0):
+        super().__init__()
+        self._ticks = list(ticks)
+        self._speed = speed
+        self._symbols = set()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_csv(cls, path, speed=0.0):
+        """Carga los trades de un CSV con columnas timestamp, symbol y price."""
+        import pandas as pd
+
+        df = pd.read_csv(path, parse_dates=['timestamp']).sort_values('timestamp')
+        return cls(zip(df['timestamp'], df['symbol'], df['price']), speed=speed)
+
+    def watch(self, symbols):
+        self._symbols |= set(symbols)
+
+    def unwatch(self, symbols):
+        self._symbols -= set(symbols)
+
+    def run(self):
+        """Publica todos los trades en el hilo actual."""
+        previous = None
+        for timestamp, symbol, price in self._ticks:
+            if self._stopped.is_set():
+                break
+            if self._speed > 0 and previous is not None:
+                delay = (timestamp - previous).total_seconds() / self._speed
+                if delay > 0:
+                    time.sleep(delay)
+            previous = timestamp
+            if symbol in self._symbols:
+                self.publish(SimpleNamespace(symbol=symbol, price=float(price), timestamp=timestamp))
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name="price-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
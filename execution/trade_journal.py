@@ -0,0 +1,282 @@
+import os
+import json
+import atexit
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+# Base de datos del diario de operaciones y registro JSON anterior (se migra una vez)
+TRADE_JOURNAL_FILE = "trade_journal.db"
+LEGACY_TRADE_LOG_FILE = "trade_log.json"
+
+# Campos de una posición abierta, en el mismo formato que el antiguo trade_log.json
+POSITION_FIELDS = ('entry', 'qty', 'side', 'sl', 'tp', 'entry_time', 'last_update')
+
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    symbol TEXT PRIMARY KEY,
+    entry REAL NOT NULL,
+    qty REAL NOT NULL,
+    side TEXT NOT NULL,
+    sl REAL,
+    tp REAL,
+    entry_time TEXT,
+    last_update TEXT
+);
+CREATE TABLE IF NOT EXISTS closed_trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    qty REAL NOT NULL,
+    entry REAL NOT NULL,
+    exit_price REAL,
+    pnl REAL,
+    entry_time TEXT,
+    exit_time TEXT NOT NULL,
+    reason TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_closed_trades_symbol ON closed_trades (symbol, exit_time);
+CREATE INDEX IF NOT EXISTS idx_closed_trades_exit_time ON closed_trades (exit_time);
+CREATE TABLE IF NOT EXISTS atr_cache (
+    day TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    atr REAL,
+    PRIMARY KEY (day, period, symbol)
+);
+"""
+
+_default_journal = None
+
+def _qty(value):
+    """Cantidad como entero si no es fraccionaria (como en el registro JSON)."""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+class TradeJournal:
+    """
+    Diario de operaciones en SQLite (modo WAL).
+
+    Cada posición abierta es una fila que se actualiza por separado, así que
+    una escritura cuesta lo que cambia y no lo que ocupa el registro. Las
+    posiciones cerradas pasan a closed_trades con su P&L. Varios procesos
+    (la ejecución diaria y el monitor) pueden escribir a la vez: las
+    transacciones se serializan en SQLite y esperan al bloqueo en lugar de
+    sobrescribirse.
+
+    Args:
+        path: Ruta de la base de datos
+        legacy_log: Registro JSON que se importa al crear la base de datos
+        timeout: Segundos de espera si otro proceso tiene el bloqueo de escritura
+    """
+
+    def __init__(self, path=TRADE_JOURNAL_FILE, legacy_log=LEGACY_TRADE_LOG_FILE, timeout=30.0):
+        self.path = path
+        self._lock = threading.RLock()
+        # Autocommit: las transacciones se abren explícitamente en _transaction
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate(legacy_log)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _migrate(self, legacy_log):
+        """Crea o actualiza el esquema y, la primera vez, importa el registro JSON anterior."""
+        with self._transaction() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+
+            # Solo al crear la base de datos: al subir de versión las posiciones ya están
+            if version == 0 and legacy_log and os.path.exists(legacy_log):
+                try:
+                    with open(legacy_log, 'r') as f:
+                        trade_log = json.load(f)
+                except json.JSONDecodeError:
+                    logger.error(f"Error al decodificar {legacy_log}. No se migra.")
+                    trade_log = {}
+                for symbol, entry in trade_log.items():
+                    self._upsert(conn, symbol, entry)
+                logger.info(f"Migradas {len(trade_log)} posiciones de {legacy_log} a {self.path}")
+
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    # --- Posiciones abiertas ---
+
+    @staticmethod
+    def _row_to_entry(row):
+        entry = {field: row[field] for field in POSITION_FIELDS}
+        entry['qty'] = _qty(entry['qty'])
+        return entry
+
+    def positions(self):
+        """
+        Posiciones abiertas como diccionario símbolo -> entrada (formato de trade_log.json).
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM positions ORDER BY symbol").fetchall()
+        return {row['symbol']: self._row_to_entry(row) for row in rows}
+
+    def get(self, symbol):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM positions WHERE symbol = ?", (symbol,)).fetchone()
+        return self._row_to_entry(row) if row is not None else None
+
+    @staticmethod
+    def _upsert(conn, symbol, entry):
+        values = [entry.get(field) for field in POSITION_FIELDS]
+        conn.execute(
+            f"INSERT INTO positions (symbol, {', '.join(POSITION_FIELDS)}) "
+            f"VALUES (?, {', '.join('?' * len(POSITION_FIELDS))}) "
+            f"ON CONFLICT(symbol) DO UPDATE SET "
+            + ", ".join(f"{field} = excluded.{field}" for field in POSITION_FIELDS),
+            [symbol] + values
+        )
+
+    def upsert(self, symbol, entry):
+        """Crea o sustituye la entrada de una posición abierta."""
+        with self._transaction() as conn:
+            self._upsert(conn, symbol, entry)
+
+    def update(self, symbol, **fields):
+        """
+        Modifica campos sueltos de una posición (p.ej. sl o last_update).
+
+        Returns:
+            bool: True si la posición existía
+        """
+        unknown = set(fields) - set(POSITION_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {sorted(unknown)}")
+        if not fields:
+            return False
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE positions SET {', '.join(f'{field} = ?' for field in fields)} WHERE symbol = ?",
+                list(fields.values()) + [symbol]
+            )
+        return cursor.rowcount > 0
+
+    def close_position(self, symbol, exit_price=None, reason=None):
+        """
+        Cierra una posición: la elimina de las abiertas y la guarda en el historial.
+
+        Args:
+            symbol: Símbolo de la posición
+            exit_price: Precio de salida (None si no se conoce, p.ej. cerrada fuera del bot)
+            reason: Motivo del cierre (stop-loss, take-profit, rebalanceo...)
+
+        Returns:
+            dict: Entrada cerrada o None si no había posición
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM positions WHERE symbol = ?", (symbol,)).fetchone()
+            if row is None:
+                return None
+            entry = self._row_to_entry(row)
+            pnl = None
+            if exit_price is not None:
+                pnl = (exit_price - entry['entry']) * entry['qty']
+                if entry['side'] == 'sell':
+                    pnl = -pnl
+            conn.execute(
+                "INSERT INTO closed_trades (symbol, side, qty, entry, exit_price, pnl, entry_time, exit_time, reason) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (symbol, entry['side'], entry['qty'], entry['entry'], exit_price, pnl,
+                 entry['entry_time'], datetime.now().isoformat(), reason)
+            )
+            conn.execute("DELETE FROM positions WHERE symbol = ?", (symbol,))
+        return entry
+
+    # --- ATR diario ---
+
+    def cached_atr(self, day, period, symbols):
+        """
+        ATR guardado de los símbolos para un día (los que no estén no aparecen).
+
+        Returns:
+            dict: Símbolo -> ATR (NaN si se calculó sin barras suficientes)
+        """
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT symbol, atr FROM atr_cache WHERE day = ? AND period = ? "
+                f"AND symbol IN ({', '.join('?' * len(symbols))})",
+                [str(day), period] + symbols
+            ).fetchall()
+        return {row['symbol']: float('nan') if row['atr'] is None else row['atr'] for row in rows}
+
+    def store_atr(self, day, period, values):
+        """Guarda el ATR del día de varios símbolos y borra el de días anteriores."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM atr_cache WHERE day < ?", (str(day),))
+            conn.executemany(
+                "INSERT OR REPLACE INTO atr_cache (day, period, symbol, atr) VALUES (?, ?, ?, ?)",
+                [(str(day), period, symbol, None if atr != atr else atr) for symbol, atr in values.items()]
+            )
+
+    # --- Historial ---
+
+    def closed_trades(self, symbol=None, since=None):
+        """
+        Operaciones cerradas, de la más antigua a la más reciente.
+
+        Args:
+            symbol: Filtrar por símbolo
+            since: Filtrar por fecha de salida (ISO) a partir de esta
+        """
+        query = "SELECT * FROM closed_trades WHERE 1 = 1"
+        params = []
+        if symbol is not None:
+            query += " AND symbol = ?"
+            params.append(symbol)
+        if since is not None:
+            query += " AND exit_time >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY exit_time, id", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """Cierra la conexión (y vuelca el WAL en el fichero principal)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def get_trade_journal():
+    """
+    Diario compartido por el proceso, abierto la primera vez que se usa.
+    """
+    global _default_journal
+    if _default_journal is None:
+        _default_journal = TradeJournal()
+        atexit.register(_default_journal.close)
+    return _default_journal
+
+def set_trade_journal(journal):
+    """Sustituye el diario compartido (por ejemplo, por uno en otra ruta)."""
+    global _default_journal
+    _default_journal = journal
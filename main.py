@@ -17,134 +17,329 @@ logging.basicConfig(
 logger = logging.getLogger("trading_bot")
 
 # Importar módulos del bot
-from data.data_loader import get_data
-from model.predictor import predict_returns
-from model.lstm_model import predict_lstm_returns
+from data.data_loader import get_data, TICKERS
 from strategy.risk_manager import generate_signals, apply_risk_controls
-from utils.scheduler import schedule_training, combine_predictions
+from model.prediction_client import PredictionClient
+from utils.environment import PREDICTION_SERVICE_URL
 from utils.telegram_notifier import send_telegram_message
+from utils.transport import log_transport_stats
+from utils.metrics import timed, log_memory_report
+from utils import numeric
+from utils import market_calendar
+from utils.dag import Stage, DagAbort, run_dag
+from utils.run_cache import RunCache
+from data.history_store import get_history
 # Importar módulo de ejecución de operaciones
-from execution.broker import execute_trades, close_positions
+from execution.broker import rebalance, get_rebalance_snapshot
 
-def main():
+# Etapas que se ejecutan a la vez como máximo
+MAX_PARALLEL_STAGES = 4
+
+# Parámetros de la estrategia (también forman parte de la clave de la caché de ejecución)
+SIGNAL_THRESHOLD = 0.005  # 0.5% mínimo de retorno esperado
+# En un caso real, obtendríamos el capital de la cuenta desde la API del broker
+# Por ahora usamos un valor simulado
+ACCOUNT_EQUITY = 10000
+RISK_PARAMS = {
+    'max_drawdown_allowed': 0.20,
+    'max_volatility': 0.05,
+    'trend_tolerance': 0.01
+}
+
+# Etapas cuyo resultado depende de los modelos: en la caché se invalidan si cambian
+MODEL_STAGES = ('predictions', 'signals', 'filtered_signals', 'execution')
+
+# Caché de la ejecución del día (la fija main; sin ella no se guarda nada)
+run_cache = None
+
+def _load_price_data():
+    # Cargar datos históricos
+    logger.info("Cargando datos históricos...")
+    price_data = get_data()
+    if price_data.empty:
+        raise DagAbort("No se pudieron obtener datos históricos. Abortando ejecución.")
+    logger.info(f"Datos cargados correctamente: {len(price_data)} filas, {price_data.columns.size} columnas")
+    if run_cache is not None:
+        # La última barra fija la clave: el resto de etapas se guardan bajo ella
+        run_cache.bind(price_data.index[-1])
+    get_history().bind(price_data.index[-1])
+    return price_data
+
+# Los módulos de los modelos (TensorFlow, sklearn) se importan dentro de las
+# etapas locales: con el servicio de predicción activo no se cargan nunca
+
+def _preload_models():
+    # Si no toca reentrenar, los modelos se cargan mientras se descargan los datos
+    from utils.scheduler import load_current_models
+    return load_current_models(TICKERS)
+
+def _manage_models(price_data, preloaded_models):
+    # Entrenar o cargar modelos según programación
+    from utils.scheduler import schedule_training
+    logger.info("Gestionando modelos...")
+    rf_model, lstm_model = preloaded_models if preloaded_models is not None else schedule_training(price_data)
+    if rf_model is None:
+        logger.warning("No se pudo cargar/entrenar el modelo RandomForest")
+    if not lstm_model:
+        logger.warning("No se pudieron cargar/entrenar los modelos LSTM")
+    return rf_model, lstm_model
+
+def _predict_rf(price_data, models):
+    # Obtener predicciones del modelo RandomForest
+    rf_model = models[0]
+    if rf_model is None:
+        return {}
+    from model.predictor import predict_returns
+    logger.info("Generando predicciones con RandomForest...")
+    rf_predictions = predict_returns(rf_model, price_data)
+    logger.info(f"Predicciones RandomForest generadas para {len(rf_predictions)} activos")
+    return rf_predictions
+
+def _predict_lstm(price_data, models):
+    # Obtener predicciones del modelo LSTM
+    lstm_model = models[1]
+    if not lstm_model:
+        return {}
+    from model.lstm_model import predict_lstm_returns
+    logger.info("Generando predicciones con LSTM...")
+    lstm_predictions = predict_lstm_returns(lstm_model, price_data)
+    logger.info(f"Predicciones LSTM generadas para {len(lstm_predictions)} activos")
+    return lstm_predictions
+
+def _fetch_snapshot():
+    # Cuenta, posiciones y precios del broker mientras se calculan las predicciones
+    # (rebalance la reutiliza si sigue vigente y la vuelve a pedir si no)
+    return get_rebalance_snapshot(TICKERS)
+
+def _combine(price_data, rf_predictions, lstm_predictions):
+    # Combinar predicciones
+    logger.info("Combinando predicciones...")
+    
+    # Verificar si tenemos suficientes predicciones
+    if not rf_predictions and not lstm_predictions:
+        raise DagAbort("No se pudo generar ninguna predicción. Abortando.")
+    
+    from utils.scheduler import combine_predictions
+    predictions = combine_predictions(price_data, rf_predictions, lstm_predictions)
+    logger.info(f"Predicciones combinadas para {len(predictions)} activos")
+    _record_predictions(rf_predictions, lstm_predictions, predictions)
+    return predictions
+
+def _record_predictions(rf_predictions, lstm_predictions, predictions):
+    # Predicciones de cada modelo y combinadas en el histórico de la ejecución
+    history = get_history()
+    history.record_predictions('rf', rf_predictions)
+    history.record_predictions('lstm', lstm_predictions)
+    history.record_predictions('combined', predictions)
+
+def _predict_locally(price_data):
+    # Mismo camino que las etapas locales, en secuencia (si el servicio falla a mitad)
     try:
-        logger.info("=== INICIANDO TRADING BOT ===")
-        
-        # Cargar datos históricos
-        logger.info("Cargando datos históricos...")
-        try:
-            price_data = get_data()
-            if price_data.empty:
-                logger.error("No se pudieron obtener datos históricos. Abortando ejecución.")
-                return
-            logger.info(f"Datos cargados correctamente: {len(price_data)} filas, {price_data.columns.size} columnas")
-        except Exception as e:
-            logger.error(f"Error fatal cargando datos: {e}")
-            return
-            
-        # Calcular retornos históricos para análisis de riesgo
+        preloaded = _preload_models()
+    except Exception as e:
+        logger.error(f"Error cargando modelos: {e}")
+        preloaded = None
+    try:
+        models = _manage_models(price_data, preloaded)
+    except Exception as e:
+        logger.error(f"Error gestionando modelos: {e}")
+        models = (None, {})
+    rf_predictions, lstm_predictions = {}, {}
+    try:
+        rf_predictions = _predict_rf(price_data, models)
+    except Exception as e:
+        logger.error(f"Error generando predicciones RandomForest: {e}")
+    try:
+        lstm_predictions = _predict_lstm(price_data, models)
+    except Exception as e:
+        logger.error(f"Error generando predicciones LSTM: {e}")
+    return _combine(price_data, rf_predictions, lstm_predictions)
+
+def _predict_with_service(client, price_data):
+    # Predicciones del servicio con los modelos ya cargados; si falla, en local
+    try:
+        result = client.predict(price_data)
+    except Exception as e:
+        logger.warning(f"Error en el servicio de predicción ({e}). Se calculan las predicciones en local.")
+        return _predict_locally(price_data)
+    
+    logger.info(f"Predicciones del servicio (modelos {result['version']}, barra {result['as_of']}): "
+                f"RF {len(result['rf'])}, LSTM {len(result['lstm'])}, {result.get('elapsed_ms')} ms")
+    if not result['predictions']:
+        raise DagAbort("No se pudo generar ninguna predicción. Abortando.")
+    _record_predictions(result['rf'], result['lstm'], result['predictions'])
+    return result['predictions']
+
+def get_prediction_client(url=PREDICTION_SERVICE_URL):
+    """
+    Cliente del servicio de predicción si está disponible y sus modelos están
+    al día (si toca reentrenar, el entrenamiento se hace en local).
+    
+    Returns:
+        PredictionClient o None
+    """
+    if not url:
+        return None
+    client = PredictionClient(url)
+    health = client.health()
+    if health is None:
+        logger.info("Servicio de predicción no disponible. Se usan los modelos en local.")
+        return None
+    if health.get('training_required'):
+        logger.info("Toca reentrenar: se usan los modelos en local.")
+        return None
+    logger.info(f"Usando el servicio de predicción en {url} (modelos {health['version']})")
+    return client
+
+def _generate_signals(price_data, predictions, threshold=SIGNAL_THRESHOLD):
+    # Generar señales
+    signals = generate_signals(price_data, predictions, threshold)
+    logger.info(f"Señales generadas: {signals}")
+    return signals
+
+def _apply_risk(price_data, predictions, signals, account_equity=ACCOUNT_EQUITY, risk_params=RISK_PARAMS):
+    # Aplicar controles de riesgo
+    # Calcular retornos históricos para análisis de riesgo
+    if numeric.is_compact():
+        # Array float32 sobre el bloque de precios, sin DataFrame intermedio
+        historical_returns = numeric.simple_returns(numeric.price_block(price_data))
+    else:
         historical_returns = price_data.pct_change().dropna()
+    
+    outcomes = []
+    filtered_signals = apply_risk_controls(signals, price_data, account_equity, historical_returns, predictions,
+                                           outcomes=outcomes, **risk_params)
+    get_history().record('risk', outcomes)
+    
+    if not filtered_signals:
+        logger.warning("No hay señales después de filtros de riesgo")
+        send_telegram_message("⚠️ No hay operaciones para hoy según los filtros de riesgo.")
+        raise DagAbort("No hay señales después de filtros de riesgo")
+    
+    logger.info(f"Señales después de filtros de riesgo: {filtered_signals}")
+    return filtered_signals
+
+def _execute(price_data, predictions, filtered_signals, snapshot):
+    # Ejecutar las operaciones utilizando el broker
+    try:
+        logger.info("Rebalanceando cartera hacia las posiciones objetivo...")
+        errors = rebalance(filtered_signals)
+        if errors:
+            # Con órdenes sin enviar la etapa no se da por hecha: el reintento recalcula
+            # las órdenes netas desde las posiciones reales y solo envía lo que falta
+            raise RuntimeError(f"{len(errors)} órdenes con error: {', '.join(sorted(errors))}")
         
-        # Entrenar o cargar modelos según programación
-        try:
-            logger.info("Gestionando modelos...")
-            rf_model, lstm_model = schedule_training(price_data)
-            if rf_model is None:
-                logger.warning("No se pudo cargar/entrenar el modelo RandomForest")
-            if not lstm_model:
-                logger.warning("No se pudieron cargar/entrenar los modelos LSTM")
-        except Exception as e:
-            logger.error(f"Error gestionando modelos: {e}")
-            rf_model = None
-            lstm_model = {}
-        
-        # Obtener predicciones de modelos
-        rf_predictions = {}
-        lstm_predictions = {}
-        
-        try:
-            # Obtener predicciones del modelo RandomForest
-            if rf_model is not None:
-                logger.info("Generando predicciones con RandomForest...")
-                rf_predictions = predict_returns(rf_model, price_data)
-                logger.info(f"Predicciones RandomForest generadas para {len(rf_predictions)} activos")
-        except Exception as e:
-            logger.error(f"Error generando predicciones RandomForest: {e}")
-        
-        try:
-            # Obtener predicciones del modelo LSTM
-            if lstm_model:
-                logger.info("Generando predicciones con LSTM...")
-                lstm_predictions = predict_lstm_returns(lstm_model, price_data)
-                logger.info(f"Predicciones LSTM generadas para {len(lstm_predictions)} activos")
-        except Exception as e:
-            logger.error(f"Error generando predicciones LSTM: {e}")
+        # Construir mensaje de notificación
+        message = "🤖 <b>Operaciones para hoy:</b>\n\n"
         
-        # Combinar predicciones
-        try:
-            logger.info("Combinando predicciones...")
-            
-            # Verificar si tenemos suficientes predicciones
-            if not rf_predictions and not lstm_predictions:
-                logger.error("No se pudo generar ninguna predicción. Abortando.")
-                return
-                
-            predictions = combine_predictions(price_data, rf_predictions, lstm_predictions)
-            logger.info(f"Predicciones combinadas para {len(predictions)} activos")
+        for ticker, weight in filtered_signals.items():
+            direction = "COMPRA" if weight > 0 else "VENTA"
+            target_price = price_data[ticker].iloc[-1] * (1 + predictions.get(ticker, [0])[0])
+            message += f"✅ <b>{ticker}</b>: {direction} - Objetivo: ${target_price:.2f} ({abs(weight)*100:.1f}% del capital)\n"
             
-            # Generar señales
-            threshold = 0.005  # 0.5% mínimo de retorno esperado
-            signals = generate_signals(price_data, predictions, threshold)
-            logger.info(f"Señales generadas: {signals}")
-        except Exception as e:
-            logger.error(f"Error combinando predicciones o generando señales: {e}")
+        # Enviar notificación
+        logger.info("Enviando notificación...")
+        send_telegram_message(message)
+    except Exception as e:
+        logger.error(f"Error ejecutando operaciones: {e}")
+        send_telegram_message(f"❌ Error ejecutando operaciones: {e}")
+        # Se relanza para que la ejecución no quede guardada como hecha y un reintento la repita
+        raise
+    return True
+
+def build_stages(prediction_client=None):
+    """
+    Grafo de etapas de la ejecución diaria.
+    
+    La carga de modelos y la foto de la cuenta no esperan a los datos, y las
+    predicciones RandomForest y LSTM se calculan a la vez. Una etapa con
+    fallback que falla no detiene la ejecución (p.ej. sin LSTM se sigue solo
+    con RandomForest); sin fallback, las etapas que dependen de ella no se
+    ejecutan. Las etapas cached se guardan en la caché de ejecución del día,
+    de modo que un reintento retoma desde la última completada.
+    
+    Args:
+        prediction_client: Si se indica, las predicciones se piden al servicio
+                           en lugar de cargar los modelos en este proceso
+    
+    Returns:
+        list: Etapas para run_dag
+    """
+    if prediction_client is not None:
+        prediction_stages = [
+            Stage('predictions', lambda price_data: _predict_with_service(prediction_client, price_data),
+                  deps=('price_data',), label='prediction_service', cached=True)
+        ]
+    else:
+        prediction_stages = _local_prediction_stages()
+    
+    return [
+        Stage('price_data', _load_price_data, label='get_data', cached=True),
+        Stage('snapshot', _fetch_snapshot, fallback=None, label='account_snapshot'),
+        *prediction_stages,
+        Stage('signals', _generate_signals, deps=('price_data', 'predictions'), label='generate_signals',
+              cached=True),
+        Stage('filtered_signals', _apply_risk, deps=('price_data', 'predictions', 'signals'),
+              label='apply_risk_controls', cached=True),
+        Stage('execution', _execute, deps=('price_data', 'predictions', 'filtered_signals', 'snapshot'),
+              label='execution', cached=True)
+    ]
+
+def _local_prediction_stages():
+    return [
+        Stage('preloaded_models', _preload_models, fallback=None, label='load_models'),
+        Stage('models', _manage_models, deps=('price_data', 'preloaded_models'), fallback=(None, {}),
+              label='schedule_training'),
+        Stage('rf_predictions', _predict_rf, deps=('price_data', 'models'), fallback={}, label='predict_returns'),
+        Stage('lstm_predictions', _predict_lstm, deps=('price_data', 'models'), fallback={},
+              label='predict_lstm_returns'),
+        Stage('predictions', _combine, deps=('price_data', 'rf_predictions', 'lstm_predictions'),
+              label='combine_predictions', cached=True)
+    ]
+
+def strategy_params():
+    """Parámetros que cambian el resultado de la ejecución (clave de la caché)."""
+    return {
+        'tickers': TICKERS,
+        'signal_threshold': SIGNAL_THRESHOLD,
+        'account_equity': ACCOUNT_EQUITY,
+        'risk': RISK_PARAMS
+    }
+
+@timed("main")
+def main():
+    global run_cache
+    try:
+        logger.info("=== INICIANDO TRADING BOT ===")
+        
+        # Sin sesión hoy (festivo o fin de semana) no se descarga, entrena ni opera
+        if not market_calendar.is_trading_day():
+            logger.info("Hoy no hay sesión en la bolsa. Nada que hacer.")
             return
         
-        # Aplicar controles de riesgo
-        try:
-            # En un caso real, obtendríamos el capital de la cuenta desde la API del broker
-            # Por ahora usamos un valor simulado
-            account_equity = 10000  # Simulación de capital
-            filtered_signals = apply_risk_controls(signals, price_data, account_equity, historical_returns, predictions)
-            
-            if not filtered_signals:
-                logger.warning("No hay señales después de filtros de riesgo")
-                send_telegram_message("⚠️ No hay operaciones para hoy según los filtros de riesgo.")
-                return
-                
-            logger.info(f"Señales después de filtros de riesgo: {filtered_signals}")
-        except Exception as e:
-            logger.error(f"Error aplicando controles de riesgo: {e}")
+        run_cache = RunCache(strategy_params(), model_stages=MODEL_STAGES)
+        if run_cache.as_of is not None:
+            # Un reintento puede tomar price_data de la caché sin ejecutar _load_price_data:
+            # el histórico se fija con la barra guardada para no partirse por fechas
+            get_history().bind(run_cache.as_of)
+        if run_cache.get('execution')[0]:
+            # Reintento de una ejecución ya completada: no se descarga ni se opera de nuevo
+            logger.info("La ejecución de hoy ya se completó para la última barra. Nada que hacer.")
             return
-            
-        # Ejecutar las operaciones utilizando el broker
-        try:
-            logger.info("Cerrando posiciones que ya no son relevantes...")
-            close_positions(filtered_signals)
-            
-            logger.info("Ejecutando nuevas operaciones...")
-            execute_trades(filtered_signals)
-            
-            # Construir mensaje de notificación
-            message = "🤖 <b>Operaciones para hoy:</b>\n\n"
-            
-            for ticker, weight in filtered_signals.items():
-                direction = "COMPRA" if weight > 0 else "VENTA"
-                target_price = price_data[ticker].iloc[-1] * (1 + predictions.get(ticker, [0])[0])
-                message += f"✅ <b>{ticker}</b>: {direction} - Objetivo: ${target_price:.2f} ({abs(weight)*100:.1f}% del capital)\n"
-                
-            # Enviar notificación
-            logger.info("Enviando notificación...")
-            send_telegram_message(message)
-        except Exception as e:
-            logger.error(f"Error ejecutando operaciones: {e}")
-            send_telegram_message(f"❌ Error ejecutando operaciones: {e}")
         
-        logger.info("=== EJECUCIÓN COMPLETADA ===")
+        outcome = run_dag(build_stages(get_prediction_client()), max_workers=MAX_PARALLEL_STAGES, cache=run_cache)
+        if 'execution' in outcome.results:
+            logger.info("=== EJECUCIÓN COMPLETADA ===")
+        run_cache.prune()
+        log_transport_stats()
+        log_memory_report()
         
     except Exception as e:
         logger.critical(f"Error no controlado: {e}")
         send_telegram_message(f"❌ Error crítico en el sistema: {e}")
+    finally:
+        # Lo registrado se guarda aunque la ejecución no llegue al final
+        get_history().flush()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,25 @@
+import os
+import hashlib
+
+# Directorio de los modelos entrenados (el mismo que usan scheduler y lstm_model)
+MODEL_DIR = "./models"
+
+def artifact_version(model_dir=MODEL_DIR):
+    """
+    Huella de los artefactos de los modelos: cambia si se reentrena o se
+    sustituye cualquier fichero. Solo hace stat de los ficheros, sin leerlos,
+    y no importa TensorFlow ni sklearn.
+    
+    Args:
+        model_dir: Directorio de los modelos
+    
+    Returns:
+        str: Huella hexadecimal
+    """
+    digest = hashlib.sha1()
+    if os.path.isdir(model_dir):
+        for entry in sorted(os.scandir(model_dir), key=lambda e: e.name):
+            if entry.is_file() and entry.name.endswith(('.pkl', '.keras', '.txt')):
+                stat = entry.stat()
+                digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
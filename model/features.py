@@ -0,0 +1,174 @@
+"""
+Banco de características técnicas sobre ventanas móviles, para todos los
+tickers a la vez.
+
+Las medias y desviaciones de cualquier ventana salen de sumas acumuladas
+compartidas (de retornos, de precios y de sus cuadrados, de subidas y
+bajadas y del true range): cada ventana cuesta una resta entre dos filas de
+esos arrays, así que el coste total es O(barras x tickers) por
+característica pedida, sin recorrer la ventana.
+
+Características (kind):
+    ret_mean, ret_std   Media y desviación de los retornos simples (con el
+                        primer retorno a 0, como pct_change().fillna(0))
+    sma                 Media móvil del precio
+    momentum            Retorno acumulado de la ventana (p_t / p_{t-w} - 1)
+    zscore              (precio - sma) / desviación del precio en la ventana
+    rsi                 RSI de Cutler (medias simples de subidas y bajadas)
+    atr                 Media del true range (solo con high y low)
+
+La fila t de cada resultado usa solo datos hasta t; las filas sin ventana
+completa (o con algún precio ausente en ella) son NaN.
+"""
+import numpy as np
+import pandas as pd
+from utils import numeric
+
+FEATURE_KINDS = ('ret_mean', 'ret_std', 'sma', 'momentum', 'zscore', 'rsi', 'atr')
+
+# Características del RandomForest, en el orden de sus columnas. Cambiarlas
+# obliga a reentrenar: el modelo guardado espera exactamente estas
+RF_FEATURES = (('ret_mean', 5), ('ret_std', 5), ('ret_mean', 10), ('ret_std', 10))
+
+# Ventanas de los controles de riesgo: volatilidad de 14 retornos y media de 50 sesiones
+VOLATILITY_WINDOW = 14
+TREND_WINDOW = 50
+
+def _as_array(values):
+    if isinstance(values, (pd.DataFrame, pd.Series)):
+        values = values.to_numpy()
+    values = np.asarray(values, dtype=np.float64)
+    return values.reshape(-1, 1) if values.ndim == 1 else values
+
+def _cumsum(values):
+    """Suma acumulada con una fila de ceros delante: la suma de (t-w, t] es S[t+1] - S[t+1-w]."""
+    out = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(values, axis=0, out=out[1:])
+    return out
+
+def _window_sum(cumsum, window):
+    out = np.full((len(cumsum) - 1, cumsum.shape[1]), np.nan)
+    if window <= len(out):
+        out[window - 1:] = cumsum[window:] - cumsum[:-window]
+    return out
+
+class _Sums:
+    """Sumas acumuladas de una serie 2D (NaN cuenta como ausente), calculadas una vez."""
+
+    def __init__(self, values):
+        missing = np.isnan(values)
+        # Centrar cada columna reduce la cancelación al restar sumas de cuadrados grandes
+        first = values[np.argmax(~missing, axis=0), np.arange(values.shape[1])]
+        centered = np.where(missing, 0.0, values - np.nan_to_num(first))
+        self.shift = np.nan_to_num(first)
+        self.s1 = _cumsum(centered)
+        self.s2 = _cumsum(centered * centered)
+        self.missing = _cumsum(missing.astype(np.float64)) if missing.any() else None
+
+    def _mask(self, result, window):
+        if self.missing is not None:
+            result[_window_sum(self.missing, window) > 0] = np.nan
+        return result
+
+    def mean(self, window):
+        return self._mask(_window_sum(self.s1, window) / window + self.shift, window)
+
+    def std(self, window, ddof=0):
+        s1 = _window_sum(self.s1, window)
+        s2 = _window_sum(self.s2, window)
+        variance = (s2 - s1 * s1 / window) / (window - ddof)
+        return self._mask(np.sqrt(np.maximum(variance, 0.0)), window)
+
+def compute_features(close, spec, high=None, low=None, ddof=0):
+    """
+    Calcula las características pedidas para todos los tickers en una pasada.
+
+    Args:
+        close: Cierres (DataFrame, Series o array 2D filas x tickers)
+        spec: Características a calcular: dict kind -> ventanas, o lista de (kind, ventana)
+        high, low: Máximos y mínimos con la misma forma que close (para atr)
+        ddof: Grados de libertad de las desviaciones (0 como np.std, 1 como pandas)
+
+    Returns:
+        dict: (kind, ventana) -> array (filas x tickers) del tipo numérico del modo actual
+    """
+    pairs = [(kind, w) for kind, windows in spec.items() for w in windows] if isinstance(spec, dict) else list(spec)
+    unknown = {kind for kind, _ in pairs} - set(FEATURE_KINDS)
+    if unknown:
+        raise ValueError(f"Características desconocidas: {sorted(unknown)}")
+
+    prices = _as_array(close)
+    kinds = {kind for kind, _ in pairs}
+    previous = np.vstack([prices[:1], prices[:-1]])
+
+    # Cada familia de sumas se calcula solo si alguna característica la usa
+    sums = {}
+    if kinds & {'ret_mean', 'ret_std'}:
+        returns = np.nan_to_num(prices / previous - 1, nan=0.0, posinf=0.0, neginf=0.0)
+        sums['returns'] = _Sums(returns)
+    if kinds & {'sma', 'zscore'}:
+        sums['prices'] = _Sums(prices)
+    if 'rsi' in kinds:
+        change = np.nan_to_num(prices - previous)
+        sums['gains'] = _Sums(np.maximum(change, 0.0))
+        sums['losses'] = _Sums(np.maximum(-change, 0.0))
+    if 'atr' in kinds:
+        if high is None or low is None:
+            raise ValueError("atr necesita high y low")
+        high, low = _as_array(high), _as_array(low)
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+        sums['true_range'] = _Sums(true_range)
+
+    features = {}
+    for kind, window in pairs:
+        if kind == 'ret_mean':
+            result = sums['returns'].mean(window)
+        elif kind == 'ret_std':
+            result = sums['returns'].std(window, ddof)
+        elif kind == 'sma':
+            result = sums['prices'].mean(window)
+        elif kind == 'momentum':
+            result = np.full(prices.shape, np.nan)
+            result[window:] = prices[window:] / prices[:-window] - 1
+        elif kind == 'zscore':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = (prices - sums['prices'].mean(window)) / sums['prices'].std(window, ddof)
+        elif kind == 'rsi':
+            gains, losses = sums['gains'].mean(window), sums['losses'].mean(window)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = np.where(losses > 0, 100 - 100 / (1 + gains / losses), 100.0)
+            result[np.isnan(gains)] = np.nan
+        else:
+            result = sums['true_range'].mean(window)
+        features[(kind, window)] = result.astype(numeric.dtype(), copy=False)
+    return features
+
+def stack_features(features, keys, rows=None):
+    """
+    Matriz de muestras para un modelo: una fila por (ticker, fila) y una
+    columna por característica, ordenada por ticker y después por fecha.
+
+    Args:
+        features: Resultado de compute_features
+        keys: (kind, ventana) en el orden de las columnas
+        rows: Filas a usar (por defecto todas)
+
+    Returns:
+        numpy.ndarray: (tickers * filas) x len(keys)
+    """
+    columns = [features[key] if rows is None else features[key][rows] for key in keys]
+    return np.stack(columns, axis=-1).transpose(1, 0, 2).reshape(-1, len(keys))
+
+def risk_features(close):
+    """
+    Volatilidad (desviación con ddof=1 de los últimos 14 retornos) y MA50 de
+    cada fecha y ticker, como las calculan apply_risk_controls y el barrido.
+
+    Returns:
+        tuple: (volatilidad, ma_50), arrays filas x tickers
+    """
+    features = compute_features(close, {'ret_std': (VOLATILITY_WINDOW,), 'sma': (TREND_WINDOW,)}, ddof=1)
+    volatility = features[('ret_std', VOLATILITY_WINDOW)]
+    # Sin retorno en la primera fila (pct_change sin rellenar), la primera ventana completa termina en la 14
+    volatility[:VOLATILITY_WINDOW] = np.nan
+    return volatility, features[('sma', TREND_WINDOW)]
@@ -7,6 +7,7 @@ import logging
 from keras.models import Sequential, load_model
 from keras.layers import LSTM, Dense, Dropout
 from sklearn.preprocessing import MinMaxScaler
+from utils import numeric
 
 # Configuración de logging
 logger = logging.getLogger("trading_bot")
@@ -20,16 +21,20 @@ models = {}
 scalers = {}
 
 def create_sequences(data, seq_length=60):
-    X, y = [], []
-    for i in range(len(data) - seq_length - 1):
-        X.append(data[i:(i + seq_length)])
-        y.append(data[i + seq_length])
-    return np.array(X), np.array(y)
+    n = len(data) - seq_length - 1
+    if n <= 0:
+        return np.array([]), np.array([])
+    # Windows are built as a strided view and copied once (keeps the dtype of data)
+    data = np.asarray(data)
+    X = np.lib.stride_tricks.sliding_window_view(data, seq_length)[:n].copy()
+    y = data[seq_length:seq_length + n].copy()
+    return X, y
 
-def train_lstm_model(data):
+def train_lstm_model(data, model_dir=MODEL_DIR, epochs=10, batch_size=32, units=64):
     global models, scalers
     models = {}
     scalers = {}
+    os.makedirs(model_dir, exist_ok=True)
     
     for ticker in data.columns:
         try:
@@ -39,7 +44,7 @@ def train_lstm_model(data):
                 continue
                 
             scaler = MinMaxScaler()
-            scaled_series = scaler.fit_transform(series.values.reshape(-1,1)).flatten()
+            scaled_series = scaler.fit_transform(series.values.reshape(-1,1)).ravel().astype(numeric.dtype(), copy=False)
             scalers[ticker] = scaler
             
             X, y = create_sequences(scaled_series, sequence_length)
@@ -50,20 +55,20 @@ def train_lstm_model(data):
             X = X.reshape((X.shape[0], X.shape[1], 1))
 
             model = Sequential()
-            model.add(LSTM(64, return_sequences=True, input_shape=(X.shape[1], 1)))
+            model.add(LSTM(units, return_sequences=True, input_shape=(X.shape[1], 1)))
             model.add(Dropout(0.2))
-            model.add(LSTM(64, return_sequences=False))
+            model.add(LSTM(units, return_sequences=False))
             model.add(Dropout(0.2))
             model.add(Dense(1))
 
             model.compile(optimizer='adam', loss='mean_squared_error')
-            model.fit(X, y, epochs=10, batch_size=32, verbose=0)
+            model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0)
 
             models[ticker] = model
             
             # Save individual model and scaler
-            model_path = os.path.join(MODEL_DIR, f"lstm_{ticker}_model.keras")
-            scaler_path = os.path.join(MODEL_DIR, f"lstm_{ticker}_scaler.pkl")
+            model_path = os.path.join(model_dir, f"lstm_{ticker}_model.keras")
+            scaler_path = os.path.join(model_dir, f"lstm_{ticker}_scaler.pkl")
             
             model.save(model_path)
             with open(scaler_path, 'wb') as f:
@@ -74,7 +79,7 @@ def train_lstm_model(data):
             logger.error(f"Error training LSTM for {ticker}: {e}")
     
     # Save the scalers dictionary separately as well for safety
-    all_scalers_path = os.path.join(MODEL_DIR, "lstm_all_scalers.pkl")
+    all_scalers_path = os.path.join(model_dir, "lstm_all_scalers.pkl")
     try:
         with open(all_scalers_path, 'wb') as f:
             pickle.dump(scalers, f)
@@ -84,7 +89,7 @@ def train_lstm_model(data):
             
     return models
 
-def load_lstm_models(tickers):
+def load_lstm_models(tickers, model_dir=MODEL_DIR):
     """
     Load saved LSTM models and scalers for the given tickers.
     """
@@ -93,7 +98,7 @@ def load_lstm_models(tickers):
     scalers = {}
     
     # First try to load all scalers from the combined file
-    all_scalers_path = os.path.join(MODEL_DIR, "lstm_all_scalers.pkl")
+    all_scalers_path = os.path.join(model_dir, "lstm_all_scalers.pkl")
     if os.path.exists(all_scalers_path):
         try:
             with open(all_scalers_path, 'rb') as f:
@@ -104,8 +109,8 @@ def load_lstm_models(tickers):
     
     # Load individual models and scalers
     for ticker in tickers:
-        model_path = os.path.join(MODEL_DIR, f"lstm_{ticker}_model.keras")
-        scaler_path = os.path.join(MODEL_DIR, f"lstm_{ticker}_scaler.pkl")
+        model_path = os.path.join(model_dir, f"lstm_{ticker}_model.keras")
+        scaler_path = os.path.join(model_dir, f"lstm_{ticker}_scaler.pkl")
         
         try:
             # Load model if exists
@@ -152,9 +157,8 @@ def predict_lstm_returns(models, data):
                 continue
                 
             scaler = scalers[ticker]
-            scaled_series = scaler.transform(series.values.reshape(-1,1)).flatten()
-            
-            X_test = scaled_series[-sequence_length:]
+            # The scaler is element-wise: only the last window needs scaling
+            X_test = scaler.transform(series.values[-sequence_length:].reshape(-1,1)).astype(numeric.dtype(), copy=False)
             X_test = X_test.reshape((1, sequence_length, 1))
             
             model = models[ticker]
@@ -181,3 +185,37 @@ def predict_lstm_returns(models, data):
             predictions[ticker] = [0.0]
     
     return predictions
+
+def predict_lstm_history(models, scalers, data):
+    """
+    Batch version of predict_lstm_returns over the whole history.
+
+    Row t holds the expected return for t+1 computed from the sequence ending at t.
+    All windows of a ticker go through the model in a single predict call.
+    """
+    history = pd.DataFrame(np.nan, index=data.index, columns=data.columns)
+    for ticker in data.columns:
+        if ticker not in models or ticker not in scalers:
+            continue
+        try:
+            series = data[ticker].dropna()
+            if len(series) < sequence_length:
+                continue
+
+            scaler = scalers[ticker]
+            scaled_series = scaler.transform(series.values.reshape(-1,1)).ravel().astype(numeric.dtype(), copy=False)
+            windows = np.lib.stride_tricks.sliding_window_view(scaled_series, sequence_length)
+
+            pred_scaled = models[ticker].predict(windows.reshape((-1, sequence_length, 1)), verbose=0)
+            pred_scaled = np.clip(pred_scaled.reshape(-1, 1), 0, 1)
+            pred_price = scaler.inverse_transform(pred_scaled).flatten()
+            last_price = series.values[sequence_length - 1:]
+
+            # Same sanity check as predict_lstm_returns
+            unrealistic = (pred_price <= 0) | (pred_price > last_price * 1.2)
+            returns = np.where(unrealistic, 0.0, (pred_price - last_price) / last_price)
+            history.loc[series.index[sequence_length - 1:], ticker] = returns
+        except Exception as e:
+            logger.error(f"Error predicting LSTM history for {ticker}: {e}")
+
+    return history
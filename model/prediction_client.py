@@ -0,0 +1,71 @@
+"""
+Cliente ligero del servicio de predicción (model.prediction_service).
+
+No importa TensorFlow ni sklearn: el proceso que lo usa solo necesita los
+precios y recibe las predicciones ya combinadas.
+"""
+import json
+import math
+import logging
+from utils.transport import PooledSession
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+# Filas de precios que se envían: bastan para la secuencia del LSTM (60) y las
+# medias del RandomForest (10), con margen
+PRICE_WINDOW = 120
+
+# El servicio es local: si no responde enseguida es que no está
+HEALTH_TIMEOUT = 0.5
+PREDICT_TIMEOUT = 30
+
+class PredictionClient:
+    """
+    Args:
+        url: URL base del servicio (p.ej. http://127.0.0.1:8765)
+        session: Sesión HTTP (por defecto una propia, sin reintentos)
+    """
+
+    def __init__(self, url, session=None):
+        self.url = url.rstrip("/")
+        self.session = session if session is not None else PooledSession(retries=0)
+
+    def health(self):
+        """
+        Returns:
+            dict: Estado del servicio, o None si no está disponible
+        """
+        try:
+            response = self.session.get(f"{self.url}/health", timeout=HEALTH_TIMEOUT)
+            if response.status_code == 200:
+                return response.json()
+        except Exception as e:
+            logger.debug(f"Servicio de predicción no disponible: {e}")
+        return None
+
+    def predict(self, price_data):
+        """
+        Predicciones para la última barra de price_data.
+
+        Args:
+            price_data: DataFrame de precios de cierre (se envían las últimas PRICE_WINDOW filas)
+
+        Returns:
+            dict: version, as_of, rf, lstm y predictions (combinadas, ticker -> [retorno])
+        """
+        window = price_data.iloc[-PRICE_WINDOW:]
+        payload = {
+            'as_of': window.index[-1].isoformat(),
+            'prices': {
+                'index': [ts.isoformat() for ts in window.index],
+                'columns': list(window.columns),
+                # NaN no es JSON estándar: se envía como null
+                'data': [[None if math.isnan(v) else float(v) for v in row] for row in window.to_numpy()]
+            }
+        }
+        response = self.session.post(f"{self.url}/predict", data=json.dumps(payload),
+                                     headers={'Content-Type': 'application/json'}, timeout=PREDICT_TIMEOUT)
+        if response.status_code != 200:
+            raise RuntimeError(f"Servicio de predicción: HTTP {response.status_code} {response.text[:200]}")
+        return response.json()
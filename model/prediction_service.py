@@ -0,0 +1,212 @@
+"""
+Servicio local de predicción con los modelos residentes en memoria.
+
+Carga una vez el RandomForest, los modelos LSTM y sus escaladores y responde
+por HTTP en localhost. Antes de cada petición comprueba la versión de los
+artefactos de MODEL_DIR (nombres, tamaños y fechas de modificación) y solo
+vuelve a cargar los modelos si ha cambiado, p.ej. tras un reentrenamiento.
+
+Endpoints:
+    GET  /health   -> versión de los artefactos y si toca reentrenar
+    POST /predict  -> {"as_of", "prices": {"index", "columns", "data"}} ->
+                      predicciones RandomForest, LSTM y combinadas
+
+Uso:
+    python -m model.prediction_service --port 8765
+"""
+import os
+import json
+import time
+import pickle
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from model import lstm_model
+from model.predictor import predict_returns
+from model.artifacts import artifact_version
+from utils.scheduler import MODEL_DIR, combine_predictions, is_training_due
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Respuestas recordadas (por versión de modelos, barra y tickers)
+PREDICTION_CACHE_SIZE = 32
+
+def _lstm_ticker(filename):
+    """Ticker de un fichero lstm_{ticker}_model.keras (None si es otro fichero)."""
+    prefix, suffix = "lstm_", "_model.keras"
+    if filename.startswith(prefix) and filename.endswith(suffix):
+        return filename[len(prefix):-len(suffix)]
+    return None
+
+class PredictionService:
+    """
+    Modelos, escaladores y última ventana de precios residentes en memoria.
+
+    Args:
+        model_dir: Directorio de los artefactos (el mismo que usa el entrenamiento)
+    """
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self.version = None
+        self.rf_model = None
+        self.lstm_models = {}
+        self.loaded_at = None
+        self._window = None  # (as_of, DataFrame) de la última petición con precios
+        self._cache = OrderedDict()
+        # Los modelos (sobre todo keras) no se usan desde varios hilos a la vez
+        self._lock = threading.Lock()
+
+    def _load(self, version):
+        rf_path = os.path.join(self.model_dir, "rf_model.pkl")
+        rf_model = None
+        if os.path.exists(rf_path):
+            with open(rf_path, 'rb') as f:
+                rf_model = pickle.load(f)
+
+        files = os.listdir(self.model_dir) if os.path.isdir(self.model_dir) else []
+        tickers = [t for t in map(_lstm_ticker, files) if t]
+        lstm_models, _ = lstm_model.load_lstm_models(tickers, model_dir=self.model_dir)
+
+        self.rf_model, self.lstm_models = rf_model, lstm_models
+        self.version = version
+        self.loaded_at = time.time()
+        self._cache.clear()
+        logger.info(f"Modelos cargados (versión {version}): RF={'sí' if rf_model is not None else 'no'}, "
+                    f"LSTM={len(lstm_models)}")
+
+    def ensure_loaded(self):
+        """Carga los modelos si es la primera vez o si los artefactos han cambiado."""
+        version = artifact_version(self.model_dir)
+        if version != self.version:
+            self._load(version)
+        return self.version
+
+    def health(self):
+        with self._lock:
+            version = self.ensure_loaded()
+            return {
+                'version': version,
+                'rf_model': self.rf_model is not None,
+                'lstm_models': sorted(self.lstm_models),
+                'training_required': is_training_due(),
+                'window_as_of': self._window[0] if self._window else None
+            }
+
+    def predict(self, as_of, prices=None):
+        """
+        Predicciones para la barra as_of.
+
+        Args:
+            as_of: Fecha (ISO) de la última barra de la ventana
+            prices: Ventana reciente de precios (DataFrame); si falta se usa la
+                    guardada, que debe ser de la misma barra
+
+        Returns:
+            dict: version, as_of, rf, lstm y predictions (combinadas)
+        """
+        with self._lock:
+            version = self.ensure_loaded()
+            if prices is not None:
+                self._window = (as_of, prices)
+            elif self._window is None or self._window[0] != as_of:
+                raise ValueError(f"No hay ventana de precios para {as_of}")
+            prices = self._window[1]
+
+            key = (version, as_of, tuple(prices.columns))
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+            rf_predictions = predict_returns(self.rf_model, prices) if self.rf_model is not None else {}
+            lstm_predictions = lstm_model.predict_lstm_returns(self.lstm_models, prices) if self.lstm_models else {}
+            result = {
+                'version': version,
+                'as_of': as_of,
+                'rf': rf_predictions,
+                'lstm': lstm_predictions,
+                'predictions': combine_predictions(prices, rf_predictions, lstm_predictions)
+            }
+            self._cache[key] = result
+            while len(self._cache) > PREDICTION_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return result
+
+def _frame_from_payload(payload):
+    return pd.DataFrame(payload['data'], index=pd.to_datetime(payload['index']), columns=payload['columns'],
+                        dtype=float)
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Cabeceras y cuerpo salen en escrituras separadas: sin Nagle no se espera al ACK retardado
+        disable_nagle_algorithm = True
+
+        def _reply(self, status, body):
+            # default=float: las predicciones pueden venir como escalares de numpy
+            data = json.dumps(body, default=float).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != "/health":
+                return self._reply(404, {'error': 'no encontrado'})
+            try:
+                self._reply(200, service.health())
+            except Exception as e:
+                logger.error(f"Error en /health: {e}")
+                self._reply(500, {'error': str(e)})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                return self._reply(404, {'error': 'no encontrado'})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                prices = _frame_from_payload(request['prices']) if request.get('prices') else None
+                start = time.perf_counter()
+                result = service.predict(request['as_of'], prices)
+                self._reply(200, dict(result, elapsed_ms=round((time.perf_counter() - start) * 1000, 3)))
+            except (KeyError, ValueError) as e:
+                self._reply(400, {'error': str(e)})
+            except Exception as e:
+                logger.error(f"Error en /predict: {e}")
+                self._reply(500, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, model_dir=MODEL_DIR):
+    """Arranca el servicio (bloquea hasta Ctrl+C)."""
+    service = PredictionService(model_dir)
+    service.ensure_loaded()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    logger.info(f"Servicio de predicción escuchando en http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Servicio local de predicción")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.model_dir)
@@ -1,37 +1,49 @@
-# === /model/predictor.py ===
 from sklearn.ensemble import RandomForestRegressor
 import numpy as np
+import pandas as pd
+from utils import numeric
+from model.features import RF_FEATURES, compute_features, stack_features
 
 model = None
 
-def train_model(data):
+def train_model(data, n_estimators=100):
     global model
-    X, y = [], []
-    for ticker in data.columns:
-        series = data[ticker].pct_change().fillna(0)
-        for i in range(20, len(series) - 1):
-            features = [
-                np.mean(series[i-5:i]),
-                np.std(series[i-5:i]),
-                np.mean(series[i-10:i]),
-                np.std(series[i-10:i])
-            ]
-            X.append(features)
-            y.append(series[i+1])
-    model = RandomForestRegressor(n_estimators=100)
+    features = compute_features(data, RF_FEATURES)
+    returns = np.nan_to_num(numeric.simple_returns(numeric.price_block(data), dropna=False))
+    # La muestra i usa las barras i-10..i-1 (ventana que termina en i-1) y su
+    # objetivo es el retorno de i+1 (fila i de returns), para i desde 20
+    rows = np.arange(20, len(data) - 1)
+    X = stack_features(features, RF_FEATURES, rows - 1)
+    y = returns[rows].T.ravel()
+    model = RandomForestRegressor(n_estimators=n_estimators)
     model.fit(X, y)
     return model
 
 def predict_returns(model, data):
-    predictions = {}
-    for ticker in data.columns:
-        series = data[ticker].pct_change().fillna(0)
-        features = [
-            np.mean(series[-5:]),
-            np.std(series[-5:]),
-            np.mean(series[-10:]),
-            np.std(series[-10:])
-        ]
-        prediction = model.predict([features])[0]
-        predictions[ticker] = [prediction]
-    return predictions
\ No newline at end of file
+    # Características de la última fila de todos los tickers y una sola llamada al modelo
+    features = compute_features(data, RF_FEATURES)
+    X = stack_features(features, RF_FEATURES, slice(-1, None))
+    predictions = model.predict(X)
+    return {ticker: [prediction] for ticker, prediction in zip(data.columns, predictions)}
+
+def predict_returns_history(model, data):
+    """
+    Genera la predicción que predict_returns habría hecho en cada fecha del histórico.
+
+    La fila t contiene el retorno esperado para t+1 usando solo datos hasta t.
+    Todas las fechas de todos los tickers se predicen en una única llamada al modelo.
+
+    Args:
+        model: Modelo RandomForest entrenado
+        data: DataFrame con los precios de cierre
+
+    Returns:
+        pandas.DataFrame: Predicciones con el mismo índice y columnas que data
+    """
+    X = stack_features(compute_features(data, RF_FEATURES), RF_FEATURES)
+    valid = ~np.isnan(X).any(axis=1)
+    predictions = np.full(len(X), np.nan)
+    if valid.any():
+        predictions[valid] = model.predict(X[valid])
+    # Las muestras van ordenadas por ticker y después por fecha
+    return pd.DataFrame(predictions.reshape(len(data.columns), len(data)).T, index=data.index, columns=data.columns)
@@ -0,0 +1,239 @@
+import os
+import json
+import hashlib
+import pickle
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+# Directorio de artefactos por fold y fichero de resultados
+CACHE_DIR = "./walk_forward_cache"
+RESULTS_FILE = "walk_forward_results.csv"
+
+DEFAULT_HYPERPARAMS = {
+    'rf_n_estimators': 100,
+    'lstm_epochs': 10,
+    'lstm_batch_size': 32,
+    'lstm_units': 64,
+    'rf_weight': 0.6
+}
+
+def make_folds(index, train_size=252, test_size=21, step=None):
+    """
+    Divide el histórico en folds rodantes de entrenamiento/test.
+
+    Args:
+        index: Índice de fechas del histórico
+        train_size: Número de barras de entrenamiento por fold
+        test_size: Número de barras fuera de muestra por fold
+        step: Desplazamiento entre folds (por defecto test_size)
+
+    Returns:
+        list: Lista de tuplas (inicio_train, inicio_test, fin_test) en posiciones
+              del índice; el test cubre [inicio_test, fin_test)
+    """
+    step = step or test_size
+    folds = []
+    start = 0
+    while start + train_size + test_size <= len(index):
+        folds.append((start, start + train_size, start + train_size + test_size))
+        start += step
+    return folds
+
+def fold_key(index, fold, tickers, hyperparams):
+    """
+    Clave de caché de un fold: rango de fechas, tickers e hiperparámetros.
+    """
+    train_start, test_start, test_end = fold
+    payload = {
+        'train_start': str(index[train_start]),
+        'test_start': str(index[test_start]),
+        'test_end': str(index[test_end - 1]),
+        'tickers': sorted(tickers),
+        'hyperparams': hyperparams
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+def _score(predicted, realized):
+    """
+    Métricas fuera de muestra para un par de series alineadas.
+    """
+    mask = ~(np.isnan(predicted) | np.isnan(realized))
+    predicted, realized = predicted[mask], realized[mask]
+    if len(predicted) == 0:
+        return None
+    errors = predicted - realized
+    ic = np.corrcoef(predicted, realized)[0, 1] if len(predicted) > 1 and predicted.std() > 0 and realized.std() > 0 else np.nan
+    return {
+        'n': int(len(predicted)),
+        'mae': float(np.mean(np.abs(errors))),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'hit_rate': float(np.mean(np.sign(predicted) == np.sign(realized))),
+        'ic': float(ic)
+    }
+
+def _run_fold(fold_data, test_start, hyperparams, fold_dir):
+    """
+    Entrena RF y LSTM sobre la parte de entrenamiento del fold y evalúa el test.
+    Se ejecuta en un proceso del pool; los artefactos quedan en fold_dir.
+
+    Args:
+        fold_data: DataFrame con precios desde el inicio del train hasta el fin del test
+        test_start: Posición (dentro de fold_data) de la primera barra de test
+        hyperparams: Diccionario de hiperparámetros
+        fold_dir: Directorio donde guardar los artefactos del fold
+
+    Returns:
+        list: Filas de métricas (una por ticker y modelo)
+    """
+    # Importaciones dentro del worker para no cargar TensorFlow en el proceso padre
+    from model.predictor import train_model, predict_returns_history
+    from model import lstm_model
+
+    os.makedirs(fold_dir, exist_ok=True)
+    train_data = fold_data.iloc[:test_start]
+
+    rf_model = train_model(train_data, n_estimators=hyperparams['rf_n_estimators'])
+    with open(os.path.join(fold_dir, "rf_model.pkl"), 'wb') as f:
+        pickle.dump(rf_model, f)
+
+    lstm_models = lstm_model.train_lstm_model(
+        train_data,
+        model_dir=fold_dir,
+        epochs=hyperparams['lstm_epochs'],
+        batch_size=hyperparams['lstm_batch_size'],
+        units=hyperparams['lstm_units']
+    )
+
+    # La predicción hecha en t corresponde al retorno realizado en t+1
+    realized = fold_data.pct_change()
+    rf_pred = predict_returns_history(rf_model, fold_data).shift(1)
+    lstm_pred = lstm_model.predict_lstm_history(lstm_models, lstm_model.scalers, fold_data).shift(1)
+    rf_weight = hyperparams['rf_weight']
+    ensemble_pred = (rf_weight * rf_pred + (1 - rf_weight) * lstm_pred).fillna(rf_pred).fillna(lstm_pred)
+
+    rows = []
+    for ticker in fold_data.columns:
+        actual = realized[ticker].values[test_start:]
+        for name, pred in (('rf', rf_pred), ('lstm', lstm_pred), ('ensemble', ensemble_pred)):
+            metrics = _score(pred[ticker].values[test_start:], actual)
+            if metrics is not None:
+                rows.append({'ticker': ticker, 'model': name, **metrics})
+    return rows
+
+def run_walk_forward(data, train_size=252, test_size=21, step=None, hyperparams=None,
+                     max_workers=None, cache_dir=CACHE_DIR, results_file=RESULTS_FILE):
+    """
+    Validación walk-forward del ensemble RF/LSTM.
+
+    Cada fold se entrena en un proceso independiente. Los folds ya calculados
+    (misma ventana e hiperparámetros) se leen de caché y no se reentrenan.
+
+    Args:
+        data: DataFrame con los precios de cierre
+        train_size: Barras de entrenamiento por fold
+        test_size: Barras de test por fold
+        step: Desplazamiento entre folds
+        hyperparams: Hiperparámetros (se completan con DEFAULT_HYPERPARAMS)
+        max_workers: Número de procesos del pool
+        cache_dir: Directorio de caché de artefactos por fold
+        results_file: Fichero CSV con las métricas por fold, ticker y modelo
+
+    Returns:
+        pandas.DataFrame: Métricas fuera de muestra
+    """
+    hyperparams = {**DEFAULT_HYPERPARAMS, **(hyperparams or {})}
+    folds = make_folds(data.index, train_size, test_size, step)
+    if not folds:
+        logger.warning("Histórico insuficiente para generar folds walk-forward")
+        return pd.DataFrame()
+
+    logger.info(f"Walk-forward: {len(folds)} folds ({train_size} train / {test_size} test)")
+    results = {}
+    pending = {}
+
+    for number, fold in enumerate(folds):
+        key = fold_key(data.index, fold, data.columns, hyperparams)
+        fold_dir = os.path.join(cache_dir, key)
+        meta_path = os.path.join(fold_dir, "fold.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                results[number] = json.load(f)['metrics']
+            logger.info(f"Fold {number} en caché ({key})")
+        else:
+            pending[number] = (fold, key, fold_dir)
+
+    if pending:
+        logger.info(f"Entrenando {len(pending)} folds nuevos...")
+        # spawn evita heredar el estado de TensorFlow de otros procesos
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            futures = {}
+            for number, (fold, key, fold_dir) in pending.items():
+                train_start, test_start, test_end = fold
+                fold_data = data.iloc[train_start:test_end]
+                future = executor.submit(_run_fold, fold_data, test_start - train_start, hyperparams, fold_dir)
+                futures[future] = number
+
+            for future in as_completed(futures):
+                number = futures[future]
+                fold, key, fold_dir = pending[number]
+                try:
+                    metrics = future.result()
+                except Exception as e:
+                    logger.error(f"Error en el fold {number}: {e}")
+                    continue
+                # fold.json se escribe al final: marca el fold como completo
+                with open(os.path.join(fold_dir, "fold.json"), 'w') as f:
+                    json.dump({
+                        'train_start': str(data.index[fold[0]]),
+                        'test_start': str(data.index[fold[1]]),
+                        'test_end': str(data.index[fold[2] - 1]),
+                        'hyperparams': hyperparams,
+                        'metrics': metrics
+                    }, f)
+                results[number] = metrics
+                logger.info(f"Fold {number} completado")
+
+    rows = []
+    for number in sorted(results):
+        train_start, test_start, test_end = folds[number]
+        for row in results[number]:
+            rows.append({
+                'fold': number,
+                'test_start': data.index[test_start].strftime('%Y-%m-%d'),
+                'test_end': data.index[test_end - 1].strftime('%Y-%m-%d'),
+                **row
+            })
+
+    report = pd.DataFrame(rows)
+    if not report.empty:
+        report.to_csv(results_file, index=False, float_format='%.6g')
+        logger.info(f"Resultados walk-forward guardados en {results_file}")
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from data.data_loader import get_data
+
+    parser = argparse.ArgumentParser(description="Validación walk-forward del ensemble RF/LSTM")
+    parser.add_argument("--period", default="5y", help="Histórico a descargar (formato yfinance)")
+    parser.add_argument("--train-size", type=int, default=252)
+    parser.add_argument("--test-size", type=int, default=21)
+    parser.add_argument("--step", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    prices = get_data(period=args.period)
+    report = run_walk_forward(prices, args.train_size, args.test_size, args.step,
+                              max_workers=args.workers, results_file=args.output)
+    if not report.empty:
+        print(report.groupby(['model', 'ticker'])[['mae', 'hit_rate', 'ic']].mean().round(4))
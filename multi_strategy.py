@@ -0,0 +1,203 @@
+# === /multi_strategy.py ===
+"""
+Varias variantes del bot (umbral, rf_weight, límites de riesgo) sobre sus
+propias cuentas de Alpaca, compartiendo datos y modelos.
+
+Los precios se descargan y las predicciones RandomForest y LSTM se calculan
+una sola vez (en local o con el servicio de predicción); después cada
+estrategia combina, genera señales, aplica sus controles de riesgo y
+rebalancea su cuenta en un proceso propio, a la vez que las demás. El broker
+y el diario de operaciones son estado global de su módulo, así que cada
+proceso configura los suyos sin afectar a los otros.
+
+Las estrategias se definen en un JSON (STRATEGIES_FILE) con una lista de
+objetos; las claves de la cuenta se leen de las variables de entorno que
+indique cada estrategia, nunca del fichero:
+
+    [
+        {"name": "conservadora", "api_key_env": "ALPACA_API_KEY_CONS",
+         "secret_key_env": "ALPACA_SECRET_KEY_CONS", "risk": {"max_volatility": 0.03}},
+        {"name": "agresiva", "signal_threshold": 0.002, "rf_weight": 0.4,
+         "api_key_env": "ALPACA_API_KEY_AGR", "secret_key_env": "ALPACA_SECRET_KEY_AGR"}
+    ]
+
+Uso:
+    python multi_strategy.py
+"""
+import os
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+from utils.environment import STRATEGIES_FILE, BASE_URL
+from utils.telegram_notifier import send_telegram_message, get_notifier
+from utils.transport import log_transport_stats
+from utils.metrics import timed
+from utils.dag import Stage, DagAbort, run_dag
+from utils import market_calendar
+
+logger = logging.getLogger("trading_bot")
+
+# Valores de una estrategia que no los indique (los de main.py)
+DEFAULT_STRATEGY = {
+    'signal_threshold': main.SIGNAL_THRESHOLD,
+    'rf_weight': 0.6,
+    'account_equity': main.ACCOUNT_EQUITY,
+    'risk': main.RISK_PARAMS,
+    'api_key_env': "ALPACA_API_KEY",
+    'secret_key_env': "ALPACA_SECRET_KEY",
+    'base_url': BASE_URL,
+    'journal': None  # por defecto trade_journal_{name}.db
+}
+
+def load_strategies(path=STRATEGIES_FILE):
+    """
+    Lee las estrategias y completa los valores que falten con DEFAULT_STRATEGY.
+
+    Returns:
+        list: Estrategias (dict)
+    """
+    with open(path, 'r') as f:
+        entries = json.load(f)
+
+    strategies = []
+    for entry in entries:
+        if 'name' not in entry:
+            raise ValueError(f"Estrategia sin nombre en {path}: {entry}")
+        strategy = dict(DEFAULT_STRATEGY, **entry)
+        strategy['risk'] = dict(main.RISK_PARAMS, **entry.get('risk', {}))
+        strategy['journal'] = strategy['journal'] or f"trade_journal_{strategy['name']}.db"
+        strategies.append(strategy)
+
+    names = [strategy['name'] for strategy in strategies]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Nombres de estrategia repetidos en {path}")
+    return strategies
+
+def _shared_predictions(price_data, prediction_client):
+    # Predicciones por modelo (sin combinar): cada estrategia usa su rf_weight
+    if prediction_client is not None:
+        try:
+            result = prediction_client.predict(price_data)
+            logger.info(f"Predicciones del servicio (modelos {result['version']}): "
+                        f"RF {len(result['rf'])}, LSTM {len(result['lstm'])}")
+            return result['rf'], result['lstm']
+        except Exception as e:
+            logger.warning(f"Error en el servicio de predicción ({e}). Se calculan las predicciones en local.")
+
+    outcome = run_dag([
+        Stage('price_data', lambda: price_data),
+        *[stage for stage in main._local_prediction_stages() if stage.name != 'predictions']
+    ], max_workers=main.MAX_PARALLEL_STAGES)
+    return outcome.results.get('rf_predictions', {}), outcome.results.get('lstm_predictions', {})
+
+def run_strategy(strategy, price_data, rf_predictions, lstm_predictions):
+    """
+    Señales, controles de riesgo y rebalanceo de una estrategia en su cuenta.
+    Se ejecuta en un proceso propio.
+
+    Returns:
+        dict: name, targets (pesos objetivo, vacío si no opera) y error (o None)
+    """
+    from execution import broker
+    from execution.trade_journal import TradeJournal, set_trade_journal
+    from utils.transport import rest_client
+    from utils.scheduler import combine_predictions
+    from data.history_store import RunHistory, set_history
+
+    name = strategy['name']
+    api_key = os.environ.get(strategy['api_key_env'])
+    secret_key = os.environ.get(strategy['secret_key_env'])
+    if not api_key or not secret_key:
+        return {'name': name, 'targets': {}, 'error': f"Faltan {strategy['api_key_env']}/{strategy['secret_key_env']}"}
+
+    broker.api = rest_client(api_key, secret_key, strategy['base_url'])
+    broker.invalidate_snapshot()
+    journal = TradeJournal(strategy['journal'])
+    set_trade_journal(journal)
+    history = RunHistory(strategy=name)
+    history.bind(price_data.index[-1])
+    set_history(history)
+
+    result = {'name': name, 'targets': {}, 'error': None}
+    try:
+        # Todos los mensajes de la estrategia salen en uno, con su nombre
+        with get_notifier().digest(f"🧩 <b>Estrategia {name}</b>"):
+            predictions = combine_predictions(price_data, rf_predictions, lstm_predictions, strategy['rf_weight'])
+            if not predictions:
+                raise DagAbort("No se pudo generar ninguna predicción")
+            main._record_predictions(rf_predictions, lstm_predictions, predictions)
+            signals = main._generate_signals(price_data, predictions, strategy['signal_threshold'])
+            filtered_signals = main._apply_risk(price_data, predictions, signals, strategy['account_equity'],
+                                                strategy['risk'])
+            main._execute(price_data, predictions, filtered_signals, None)
+            result['targets'] = filtered_signals
+    except DagAbort as e:
+        logger.info(f"[{name}] {e}")
+    except Exception as e:
+        logger.error(f"[{name}] Error: {e}")
+        result['error'] = str(e)
+    finally:
+        get_notifier().flush(30)
+        history.flush()
+        journal.close()
+    return result
+
+@timed("multi_strategy")
+def run_all(strategies, max_workers=None):
+    """
+    Descarga los datos y calcula las predicciones una vez y ejecuta las
+    estrategias en paralelo, cada una en su proceso.
+
+    Args:
+        strategies: Estrategias (ver load_strategies)
+        max_workers: Procesos a la vez (por defecto uno por estrategia)
+
+    Returns:
+        list: Resultado de run_strategy de cada estrategia
+    """
+    price_data = main._load_price_data()
+    rf_predictions, lstm_predictions = _shared_predictions(price_data, main.get_prediction_client())
+    if not rf_predictions and not lstm_predictions:
+        raise DagAbort("No se pudo generar ninguna predicción. Abortando.")
+
+    # spawn: los procesos no heredan hilos ni el estado de TensorFlow del proceso principal
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers or len(strategies), mp_context=context) as executor:
+        futures = [executor.submit(run_strategy, strategy, price_data, rf_predictions, lstm_predictions)
+                   for strategy in strategies]
+        results = []
+        for strategy, future in zip(strategies, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({'name': strategy['name'], 'targets': {}, 'error': str(e)})
+    return results
+
+def run():
+    try:
+        logger.info("=== INICIANDO TRADING BOT (MULTIESTRATEGIA) ===")
+        if not market_calendar.is_trading_day():
+            logger.info("Hoy no hay sesión en la bolsa. Nada que hacer.")
+            return
+        strategies = load_strategies()
+        logger.info(f"Estrategias: {', '.join(strategy['name'] for strategy in strategies)}")
+
+        results = run_all(strategies)
+        for result in results:
+            if result['error']:
+                logger.error(f"Estrategia {result['name']}: {result['error']}")
+            else:
+                logger.info(f"Estrategia {result['name']}: {len(result['targets'])} posiciones objetivo")
+        logger.info("=== EJECUCIÓN COMPLETADA ===")
+        log_transport_stats()
+    except DagAbort as e:
+        logger.warning(str(e))
+    except Exception as e:
+        logger.critical(f"Error no controlado: {e}")
+        send_telegram_message(f"❌ Error crítico en el sistema (multiestrategia): {e}")
+
+if __name__ == "__main__":
+    run()
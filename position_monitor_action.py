@@ -1,11 +1,19 @@
-import os
-import json
-import pandas as pd
-import alpaca_trade_api as tradeapi
+import time
+import argparse
+import threading
+import numpy as np
 import logging
 from datetime import datetime
-import requests
-from utils.environment import ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL, TELEGRAM_API_TOKEN, TELEGRAM_CHAT_ID
+from utils.environment import ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL, ORDER_MODE, STOP_MODE
+from execution.brackets import oco_order, open_orders_by_symbol, replace_stops, protected_qty
+from execution.trade_journal import get_trade_journal
+from execution.position_book import PositionBook
+from data.atr_cache import get_atr, atr_stop_pcts
+from execution.streams import AlpacaPriceSource, ReplayPriceSource
+from utils.telegram_notifier import send_telegram_message, get_notifier
+from utils.transport import rest_client, log_transport_stats
+from utils.metrics import timed
+from utils import market_calendar
 
 # Configuración de logging
 logging.basicConfig(
@@ -16,238 +24,318 @@ logger = logging.getLogger("position_monitor")
 
 # Configuración de Alpaca - Usando las variables importadas del módulo environment
 
-# Archivo para almacenar información de las operaciones
-TRADE_LOG_FILE = "trade_log.json"
-
-# Función para enviar mensajes a Telegram
-def send_telegram_message(message):
-    """Envía un mensaje a través de Telegram."""
-    try:
-        if not TELEGRAM_API_TOKEN or not TELEGRAM_CHAT_ID:
-            logger.warning("Telegram API token o chat ID no configurados")
-            return False
-        
-        url = f"https://api.telegram.org/bot{TELEGRAM_API_TOKEN}/sendMessage"
-        data = {
-            "chat_id": TELEGRAM_CHAT_ID,
-            "text": message,
-            "parse_mode": "HTML"
-        }
-        response = requests.post(url, data=data)
-        return response.status_code == 200
-    except Exception as e:
-        logger.error(f"Error enviando mensaje a Telegram: {e}")
-        return False
-
-# Función para cargar el registro de operaciones
-def load_trade_log():
-    if os.path.exists(TRADE_LOG_FILE):
-        try:
-            with open(TRADE_LOG_FILE, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            logger.error(f"Error al decodificar {TRADE_LOG_FILE}. Creando nuevo registro.")
-            return {}
-    else:
-        return {}
-
-# Función para guardar el registro de operaciones
-def save_trade_log(trade_log):
-    with open(TRADE_LOG_FILE, 'w') as f:
-        json.dump(trade_log, f, indent=4)
-
 # Función para actualizar registro desde posiciones actuales en Alpaca
-def update_trade_log_from_positions(api, trade_log):
+def update_trade_log_from_positions(api, trade_log, stop_mode=None):
+    """
+    Añade al registro las posiciones de Alpaca que no están en él y elimina
+    las que ya no existen.
+    
+    Los niveles de las posiciones encontradas son fijos (3%/5%) o, con
+    stop_mode "atr", múltiplos del ATR diario. Las barras de todas ellas se
+    piden en una sola petición y el ATR queda en caché hasta el día siguiente.
+    
+    Args:
+        api: Cliente REST de Alpaca
+        trade_log: Posiciones del diario (se actualiza)
+        stop_mode: "pct" o "atr" (por defecto STOP_MODE)
+    """
+    if stop_mode is None:
+        stop_mode = STOP_MODE
+    journal = get_trade_journal()
     try:
         positions = api.list_positions()
-        for position in positions:
+        found = [position for position in positions if position.symbol not in trade_log]
+        
+        # Volatilidad reciente de todas las posiciones nuevas en una petición
+        atr = {}
+        if found and stop_mode == 'atr':
+            try:
+                atr = get_atr(api, [position.symbol for position in found])
+            except Exception as e:
+                logger.error(f"Error calculando ATR: {e}. Se usan niveles fijos.")
+        
+        for position in found:
             symbol = position.symbol
-            if symbol not in trade_log:
-                # Si la posición existe en Alpaca pero no en nuestro log, la añadimos
-                entry_price = float(position.avg_entry_price)
-                side = 'buy' if position.side == 'long' else 'sell'
-                qty = abs(float(position.qty))
-                
-                # Calcular SL y TP basados en la volatilidad reciente
-                df = api.get_bars(symbol, tradeapi.TimeFrame.Day, limit=20).df
-                atr = calculate_atr(df)
-                
-                # Configurar SL y TP basados en ATR
-                sl = entry_price * (0.97 if side == 'buy' else 1.03)
-                tp = entry_price * (1.05 if side == 'buy' else 0.95)
-                
-                trade_log[symbol] = {
-                    'entry': entry_price,
-                    'qty': qty,
-                    'side': side,
-                    'sl': sl,
-                    'tp': tp,
-                    'entry_time': datetime.now().isoformat(),
-                    'last_update': datetime.now().isoformat()
-                }
-                
-                logger.info(f"Añadida posición encontrada en {symbol}: {side} {qty} @ {entry_price}")
-                send_telegram_message(
-                    f"🔍 Encontrada posición activa en {symbol}: {side} {qty} @ {entry_price}. "
-                    f"SL: {sl:.2f}, TP: {tp:.2f}"
-                )
+            # Si la posición existe en Alpaca pero no en nuestro log, la añadimos
+            entry_price = float(position.avg_entry_price)
+            side = 'buy' if position.side == 'long' else 'sell'
+            qty = abs(float(position.qty))
+            
+            # Configurar SL y TP basados en ATR, o fijos si no hay ATR
+            sl_pct, tp_pct = atr_stop_pcts(atr.get(symbol), entry_price) or (0.03, 0.05)
+            sl = entry_price * (1 - sl_pct if side == 'buy' else 1 + sl_pct)
+            tp = entry_price * (1 + tp_pct if side == 'buy' else 1 - tp_pct)
+            
+            trade_log[symbol] = {
+                'entry': entry_price,
+                'qty': qty,
+                'side': side,
+                'sl': sl,
+                'tp': tp,
+                'entry_time': datetime.now().isoformat(),
+                'last_update': datetime.now().isoformat()
+            }
+            journal.upsert(symbol, trade_log[symbol])
+            
+            logger.info(f"Añadida posición encontrada en {symbol}: {side} {qty} @ {entry_price}")
+            send_telegram_message(
+                f"🔍 Encontrada posición activa en {symbol}: {side} {qty} @ {entry_price}. "
+                f"SL: {sl:.2f}, TP: {tp:.2f}"
+            )
         
         # Eliminar del log posiciones que ya no existen en Alpaca
-        alpaca_symbols = [p.symbol for p in positions]
+        alpaca_symbols = {p.symbol for p in positions}
         for symbol in list(trade_log.keys()):
             if symbol not in alpaca_symbols:
                 logger.info(f"Eliminando {symbol} del registro porque ya no existe la posición")
                 del trade_log[symbol]
+                journal.close_position(symbol, reason='cerrada en el broker')
                 
     except Exception as e:
         logger.error(f"Error al actualizar trade_log desde posiciones: {e}")
     
     return trade_log
 
-# Calcular ATR para determinar volatilidad
-def calculate_atr(df, period=14):
-    high = df['high']
-    low = df['low']
-    close = df['close'].shift(1)
+# Función principal de monitoreo
+@timed("monitor_positions")
+def monitor_positions(api=None, order_mode=None, check_calendar=True):
+    """
+    Revisa las posiciones abiertas: reconcilia el registro con Alpaca, aplica
+    SL/TP y ajusta los trailing stops. Fuera de sesión según el calendario
+    local termina sin llamar a la API ni tocar el diario.
     
-    tr1 = high - low
-    tr2 = abs(high - close)
-    tr3 = abs(low - close)
+    Los precios se piden en bloque y todas las posiciones se evalúan a la vez
+    con un PositionBook; solo las que tienen algo que hacer pasan por la API.
     
-    tr = pd.DataFrame({'tr1': tr1, 'tr2': tr2, 'tr3': tr3}).max(axis=1)
-    atr = tr.rolling(window=period).mean().iloc[-1]
-    return atr
-
-# Función principal de monitoreo
-def monitor_positions():
-    try:
-        api = tradeapi.REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL, api_version='v2')
+    En modo bracket el SL/TP ya está en el broker como órdenes, así que solo se
+    reconcilia: se protegen las posiciones sin salidas y los trailing stops se
+    aplican reemplazando la orden stop.
+    
+    Args:
+        api: Cliente REST de Alpaca (por defecto se crea uno)
+        order_mode: "market" o "bracket" (por defecto ORDER_MODE)
+        check_calendar: Consultar el calendario local antes de nada (False en
+                        benchmarks con un broker simulado, que decide con su reloj)
+    """
+    if order_mode is None:
+        order_mode = ORDER_MODE
+    trade_log = {}
+    if check_calendar and not market_calendar.is_open():
+        logger.info("Mercado cerrado según el calendario. Posiciones no monitorizadas.")
+        return trade_log
+    # Los avisos de todas las posiciones del ciclo salen en un único mensaje
+    with get_notifier().digest("📊 <b>Monitor de posiciones</b>"):
+        try:
+            if api is None:
+                api = rest_client(ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL)
+        
+            # Cargar posiciones abiertas del diario de operaciones
+            journal = get_trade_journal()
+            trade_log = journal.positions()
         
-        # Cargar registro de operaciones
-        trade_log = load_trade_log()
+            # Actualizar registro con posiciones actuales en Alpaca
+            trade_log = update_trade_log_from_positions(api, trade_log)
         
-        # Actualizar registro con posiciones actuales en Alpaca
-        trade_log = update_trade_log_from_positions(api, trade_log)
+            # Verificar el estado del mercado (cierres no programados que el calendario no conoce)
+            clock = api.get_clock()
+            market_open = clock.is_open
         
-        # Verificar el estado del mercado
-        clock = api.get_clock()
-        market_open = clock.is_open
+            if not market_open:
+                logger.info("Mercado cerrado. Posiciones no monitorizadas.")
+                return trade_log
+        
+            if order_mode == 'bracket':
+                reconcile_bracket_positions(api, trade_log)
+                return trade_log
+        
+            # Evaluar todas las posiciones en una pasada
+            prices = get_latest_prices(api, list(trade_log.keys()))
+            book = PositionBook.from_trade_log(trade_log)
+            idx = book.indices(prices)
+            evaluation = book.evaluate([prices[book.symbols[i]] for i in idx], idx)
+            apply_evaluation(api, trade_log, book, evaluation)
         
-        if not market_open:
-            logger.info("Mercado cerrado. Posiciones no monitorizadas.")
             return trade_log
         
-        # Monitorizar cada posición
-        for symbol in list(trade_log.keys()):
+        except Exception as e:
+            logger.error(f"Error en monitor_positions: {e}")
+            return trade_log
+
+def get_latest_prices(api, symbols):
+    """
+    Último precio de cada símbolo con una petición en bloque. Los que no
+    vengan en ella se consultan uno a uno con los métodos alternativos.
+    """
+    prices = {}
+    if not symbols:
+        return prices
+    try:
+        prices = {symbol: trade.price for symbol, trade in api.get_latest_trades(symbols).items()}
+    except Exception as e:
+        logger.error(f"Error obteniendo precios en bloque: {e}")
+    
+    for symbol in symbols:
+        if symbol in prices:
+            continue
+        try:
             try:
-                # Obtener precio actual - Actualizado para usar el método correcto
+                prices[symbol] = api.get_latest_trade(symbol).price
+            except AttributeError:
+                # Intento alternativo si get_latest_trade no existe
                 try:
-                    last_trade = api.get_latest_trade(symbol)
-                    price = last_trade.price
-                except AttributeError:
-                    # Intento alternativo si get_latest_trade no existe
-                    try:
-                        last_quote = api.get_latest_quote(symbol)
-                        price = (last_quote.ask_price + last_quote.bid_price) / 2
-                    except:
-                        # Último intento usando barras
-                        latest_bar = api.get_latest_bar(symbol)
-                        price = latest_bar.c
-                
-                position_data = trade_log[symbol]
-                side = position_data['side']
-                sl = position_data['sl']
-                tp = position_data['tp']
-                qty = position_data['qty']
-                entry = position_data['entry']
-                
-                # Calcular ganancias/pérdidas actuales
-                pnl_pct = ((price - entry) / entry) * 100
-                if side == 'sell':
-                    pnl_pct = -pnl_pct
-                
-                # Verificar si se ha activado SL o TP
-                sl_triggered = (side == 'buy' and price <= sl) or (side == 'sell' and price >= sl)
-                tp_triggered = (side == 'buy' and price >= tp) or (side == 'sell' and price <= tp)
-                
-                if sl_triggered or tp_triggered:
-                    close_side = 'sell' if side == 'buy' else 'buy'
-                    logger.info(f"Ejecutando orden de cierre para {symbol} - {'SL' if sl_triggered else 'TP'} activado")
-                    
-                    try:
-                        # Enviar orden de cierre
-                        api.submit_order(
-                            symbol=symbol,
-                            qty=qty,
-                            side=close_side,
-                            type='market',
-                            time_in_force='day'
-                        )
-                        
-                        action = 'stop-loss' if sl_triggered else 'take-profit'
-                        
-                        # Mensaje detallado de P&L
-                        pnl = (price - entry) * qty
-                        if side == 'sell':
-                            pnl = -pnl
-                        
-                        send_telegram_message(
-                            f"{'🔴' if sl_triggered else '🟢'} Cierre automático de {symbol} por {action}\n"
-                            f"Precio entrada: {entry:.2f}, Precio salida: {price:.2f}\n"
-                            f"P&L: {pnl:.2f} USD ({pnl_pct:.2f}%)"
-                        )
-                        
-                        # Eliminar del registro
-                        del trade_log[symbol]
-                        
-                    except Exception as e:
-                        logger.error(f"Error cerrando posición en {symbol}: {e}")
-                        send_telegram_message(f"⚠️ Error al cerrar {symbol}: {e}")
-                
-                # Actualizar trailing stops
-                adjust_stop_level(trade_log, symbol, side, price, entry)
-                
-                # Enviar actualizaciones periódicas
-                send_position_updates(trade_log, symbol, position_data, price, pnl_pct)
-                
-            except Exception as e:
-                logger.error(f"Error monitoreando {symbol}: {e}")
+                    last_quote = api.get_latest_quote(symbol)
+                    prices[symbol] = (last_quote.ask_price + last_quote.bid_price) / 2
+                except:
+                    # Último intento usando barras
+                    prices[symbol] = api.get_latest_bar(symbol).c
+        except Exception as e:
+            logger.error(f"Error obteniendo precio de {symbol}: {e}")
+    return prices
+
+# Acciones derivadas de la evaluación vectorizada: cierres, trailing stops y avisos
+def apply_evaluation(api, trade_log, book, evaluation, orders=None):
+    """
+    Ejecuta las acciones de PositionBook.evaluate. Solo se recorren las
+    posiciones que tienen algo que hacer.
+    
+    Args:
+        api: Cliente REST de Alpaca
+        trade_log: Posiciones abiertas (se actualiza en memoria)
+        book: PositionBook evaluado (se actualiza con los nuevos SL)
+        evaluation: Resultado de book.evaluate
+        orders: Órdenes abiertas por símbolo en modo bracket. Con ellas no se
+                envían cierres (los ejecuta el broker) y los trailing stops
+                reemplazan las órdenes stop
+    
+    Returns:
+        list: Símbolos que han tocado SL o TP (cerrados, o salida ejecutada por el broker)
+    """
+    idx = evaluation['idx']
+    triggered = evaluation['sl_hit'] | evaluation['tp_hit']
+    
+    closed = []
+    for j in np.flatnonzero(triggered):
+        symbol = book.symbols[idx[j]]
+        if orders is not None:
+            # La salida ya está en el broker: la reconciliación confirmará el cierre
+            trade_log.pop(symbol, None)
+            closed.append(symbol)
+        elif close_position(api, trade_log, symbol, evaluation['price'][j], evaluation['pnl_pct'][j],
+                            'stop-loss' if evaluation['sl_hit'][j] else 'take-profit'):
+            closed.append(symbol)
+    
+    # Trailing stops de las posiciones que siguen abiertas
+    for j in np.flatnonzero(evaluation['sl_moved'] & ~triggered):
+        i = idx[j]
+        symbol = book.symbols[i]
+        new_sl = float(evaluation['new_sl'][j])
+        try:
+            if orders is not None and orders.get(symbol):
+                replace_stops(api, orders[symbol], new_sl)
+            book.sl[i] = new_sl
+            trade_log[symbol]['sl'] = new_sl
+            get_trade_journal().update(symbol, sl=new_sl)
+            logger.info(f"Trailing stop ajustado para {symbol}: nuevo SL {new_sl:.2f}")
+            send_telegram_message(f"🔄 Trailing stop ajustado para {symbol}: nuevo SL {new_sl:.2f}")
+        except Exception as e:
+            logger.error(f"Error ajustando stops para {symbol}: {e}")
+    
+    # Enviar actualizaciones periódicas
+    for j in np.flatnonzero(evaluation['update_due'] & ~triggered):
+        i = idx[j]
+        symbol = book.symbols[i]
+        if send_position_updates(trade_log, symbol, trade_log[symbol], evaluation['price'][j],
+                                 evaluation['pnl_pct'][j]):
+            book.last_update[i] = time.time()
+    
+    book.remove(closed)
+    return closed
+
+def close_position(api, trade_log, symbol, price, pnl_pct, action):
+    """
+    Cierra a mercado una posición que ha tocado su SL o TP.
+    
+    Returns:
+        bool: True si la orden de cierre fue aceptada
+    """
+    position_data = trade_log[symbol]
+    side = position_data['side']
+    qty = position_data['qty']
+    entry = position_data['entry']
+    close_side = 'sell' if side == 'buy' else 'buy'
+    logger.info(f"Ejecutando orden de cierre para {symbol} - {'SL' if action == 'stop-loss' else 'TP'} activado")
+    
+    try:
+        # Enviar orden de cierre
+        api.submit_order(
+            symbol=symbol,
+            qty=qty,
+            side=close_side,
+            type='market',
+            time_in_force='day'
+        )
         
-        # Guardar el registro actualizado
-        save_trade_log(trade_log)
-        return trade_log
+        # Mensaje detallado de P&L
+        pnl = (price - entry) * qty
+        if side == 'sell':
+            pnl = -pnl
+        
+        send_telegram_message(
+            f"{'🔴' if action == 'stop-loss' else '🟢'} Cierre automático de {symbol} por {action}\n"
+            f"Precio entrada: {entry:.2f}, Precio salida: {price:.2f}\n"
+            f"P&L: {pnl:.2f} USD ({pnl_pct:.2f}%)"
+        )
+        
+        # Pasar al historial de operaciones cerradas
+        del trade_log[symbol]
+        get_trade_journal().close_position(symbol, exit_price=float(price), reason=action)
+        return True
         
     except Exception as e:
-        logger.error(f"Error en monitor_positions: {e}")
-        return trade_log
+        logger.error(f"Error cerrando posición en {symbol}: {e}")
+        send_telegram_message(f"⚠️ Error al cerrar {symbol}: {e}")
+        return False
 
-# Función para ajustar dinámicamente SL basado en movimiento del precio
-def adjust_stop_level(trade_log, symbol, side, price, entry):
-    try:
-        position_data = trade_log[symbol]
-        # Trailing stop: Si el precio ha avanzado a nuestro favor más de 3%, 
-        # mover el SL para asegurar al menos 1.5% de ganancia
-        if side == 'buy':
-            if price >= entry * 1.03:  # Si avanzó más de 3% a favor
-                new_sl = max(position_data['sl'], entry * 1.015)  # Asegurar al menos 1.5% de ganancia
-                if new_sl > position_data['sl']:
-                    position_data['sl'] = new_sl
-                    logger.info(f"Trailing stop ajustado para {symbol}: nuevo SL {new_sl:.2f}")
-                    send_telegram_message(f"🔄 Trailing stop ajustado para {symbol}: nuevo SL {new_sl:.2f}")
-        else:  # side == 'sell'
-            if price <= entry * 0.97:  # Si avanzó más de 3% a favor (para venta)
-                new_sl = min(position_data['sl'], entry * 0.985)  # Asegurar al menos 1.5% de ganancia
-                if new_sl < position_data['sl']:
-                    position_data['sl'] = new_sl
-                    logger.info(f"Trailing stop ajustado para {symbol}: nuevo SL {new_sl:.2f}")
-                    send_telegram_message(f"🔄 Trailing stop ajustado para {symbol}: nuevo SL {new_sl:.2f}")
-                    
-        trade_log[symbol] = position_data
-    except Exception as e:
-        logger.error(f"Error ajustando stops para {symbol}: {e}")
+# Reconciliación en modo bracket: el broker ejecuta SL/TP, aquí solo se vigila
+def reconcile_bracket_positions(api, trade_log):
+    """
+    Comprueba que cada posición tenga sus salidas en el broker y mueve los
+    trailing stops, con una petición de órdenes y una de precios por ciclo.
+    """
+    open_orders = open_orders_by_symbol(api)
+    symbols = list(trade_log.keys())
+    
+    for symbol in symbols:
+        try:
+            position_data = trade_log[symbol]
+            orders = open_orders.get(symbol, [])
+            
+            # Parte de la posición sin salidas (p.ej. abierta en modo market): se protege con un OCO
+            uncovered = abs(float(position_data['qty'])) - protected_qty(orders)
+            if uncovered > 0:
+                api.submit_order(**oco_order(symbol, uncovered, position_data['side'],
+                                             position_data['sl'], position_data['tp']))
+                logger.info(f"Añadidas salidas SL/TP para {uncovered} acciones de {symbol}")
+                send_telegram_message(
+                    f"🛡️ Añadidas salidas a {symbol} ({uncovered} acciones): "
+                    f"SL {position_data['sl']:.2f}, TP {position_data['tp']:.2f}"
+                )
+        except Exception as e:
+            logger.error(f"Error reconciliando {symbol}: {e}")
+    
+    # Trailing stops como reemplazo de las órdenes stop del broker
+    prices = {symbol: trade.price for symbol, trade in api.get_latest_trades(symbols).items()} if symbols else {}
+    book = PositionBook.from_trade_log(trade_log)
+    idx = book.indices(prices)
+    evaluation = book.evaluate([prices[book.symbols[i]] for i in idx], idx)
+    apply_evaluation(api, trade_log, book, evaluation, orders=open_orders)
 
 # Función para enviar actualizaciones periódicas sobre posiciones
 def send_position_updates(trade_log, symbol, position_data, price, pnl_pct):
+    """
+    Returns:
+        bool: True si se envió la actualización
+    """
     try:
         # Añadir log cada hora en GitHub Actions para posiciones abiertas
         current_time = datetime.now()
@@ -269,16 +357,134 @@ def send_position_updates(trade_log, symbol, position_data, price, pnl_pct):
                 f"SL: {sl:.2f}, TP: {tp:.2f}"
             )
             trade_log[symbol]['last_update'] = current_time.isoformat()
+            get_trade_journal().update(symbol, last_update=current_time.isoformat())
+            return True
     except Exception as e:
         logger.error(f"Error enviando actualización para {symbol}: {e}")
+    return False
 
-if __name__ == "__main__":
-    logger.info("Iniciando monitorización de posiciones (GitHub Actions)")
+# Monitor en modo daemon: precios en tiempo real en lugar de consultas periódicas
+class StreamingPositionMonitor:
+    """
+    Mantiene las posiciones y sus niveles SL/TP en memoria (PositionBook) y
+    evalúa la lógica de stop con cada trade del stream de precios, sin esperar
+    al siguiente ciclo.
+    
+    Cada resync_interval segundos se reconcilia con Alpaca (posiciones abiertas
+    por la ejecución diaria, cerradas fuera del bot, estado del mercado).
+    
+    Args:
+        api: Cliente REST de Alpaca
+        source: Fuente de precios con subscribe/watch/unwatch/start/stop
+                (AlpacaPriceSource o ReplayPriceSource)
+        order_mode: "market" o "bracket" (por defecto ORDER_MODE)
+        resync_interval: Segundos entre reconciliaciones con el broker
+    """
+    
+    def __init__(self, api, source, order_mode=None, resync_interval=300):
+        self.api = api
+        self.source = source
+        self.order_mode = order_mode or ORDER_MODE
+        self.resync_interval = resync_interval
+        self.trade_log = {}
+        self.book = PositionBook.from_trade_log({})
+        self.open_orders = {}
+        self.market_open = False
+        self.ticks = 0
+        self._wait = resync_interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.source.subscribe(self.on_trade)
+    
+    def resync(self):
+        """Reconcilia las posiciones en memoria con el diario y con Alpaca."""
+        trade_log = update_trade_log_from_positions(self.api, get_trade_journal().positions())
+        clock = self.api.get_clock()
+        
+        open_orders = {}
+        if clock.is_open and self.order_mode == 'bracket':
+            reconcile_bracket_positions(self.api, trade_log)
+            open_orders = open_orders_by_symbol(self.api)
         
-    # Ejecutar monitoreo
-    trade_log = monitor_positions()
+        with self._lock:
+            removed = set(self.trade_log) - set(trade_log)
+            self.trade_log = trade_log
+            self.book = PositionBook.from_trade_log(trade_log)
+            self.open_orders = open_orders
+            self.market_open = clock.is_open
+        self.source.unwatch(removed)
+        self.source.watch(trade_log.keys())
+        
+        # Con el mercado cerrado no hace falta reconciliar hasta la apertura
+        if clock.is_open:
+            self._wait = self.resync_interval
+        else:
+            self._wait = max(1.0, (clock.next_open - clock.timestamp).total_seconds())
+            logger.info("Mercado cerrado. Siguiente reconciliación en la apertura.")
+        logger.info(f"Reconciliación completada: {len(trade_log)} posiciones vigiladas")
+    
+    def on_trade(self, trade):
+        """Evalúa la posición del símbolo con el precio de un trade."""
+        symbol = trade.symbol
+        with self._lock:
+            i = self.book.index.get(symbol) if self.market_open else None
+            if i is None:
+                return
+            self.ticks += 1
+            
+            # En modo bracket SL/TP los ejecuta el broker: solo se mueve el trailing stop
+            orders = self.open_orders if self.order_mode == 'bracket' else None
+            evaluation = self.book.evaluate([float(trade.price)], [i])
+            closed = apply_evaluation(self.api, self.trade_log, self.book, evaluation, orders=orders)
+            if orders is not None and evaluation['sl_moved'][0] and not closed:
+                # El reemplazo crea órdenes nuevas: se refrescan las del símbolo
+                self.open_orders[symbol] = self.api.list_orders(status='open', symbols=[symbol])
+        if closed:
+            self.source.unwatch(closed)
+    
+    def run_forever(self):
+        """Arranca el stream y reconcilia periódicamente hasta que se llame a stop()."""
+        self.resync()
+        self.source.start()
+        try:
+            while not self._stopped.wait(self._wait):
+                try:
+                    self.resync()
+                except Exception as e:
+                    logger.error(f"Error en la reconciliación: {e}")
+        finally:
+            self.source.stop()
     
-    # Guardar registro actualizado
-    save_trade_log(trade_log)
+    def stop(self):
+        self._stopped.set()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitorización de posiciones")
+    parser.add_argument("--daemon", action='store_true', help="Proceso continuo con stream de precios en tiempo real")
+    parser.add_argument("--replay", default=None, help="CSV (timestamp, symbol, price) a reproducir en lugar del stream")
+    parser.add_argument("--speed", type=float, default=0.0, help="Velocidad de la reproducción (0 = sin esperas)")
+    parser.add_argument("--resync", type=float, default=300, help="Segundos entre reconciliaciones con Alpaca")
+    args = parser.parse_args()
     
-    logger.info("Monitorización completada")
+    if args.daemon:
+        logger.info("Iniciando monitorización de posiciones (daemon)")
+        api = rest_client(ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL)
+        if args.replay:
+            source = ReplayPriceSource.from_csv(args.replay, speed=args.speed)
+        else:
+            source = AlpacaPriceSource(ALPACA_API_KEY, ALPACA_SECRET_KEY, BASE_URL)
+        monitor = StreamingPositionMonitor(api, source, resync_interval=args.resync)
+        try:
+            monitor.run_forever()
+        except KeyboardInterrupt:
+            monitor.stop()
+        logger.info("Monitorización detenida")
+        log_transport_stats()
+    else:
+        logger.info("Iniciando monitorización de posiciones (GitHub Actions)")
+        
+        # Ejecutar monitoreo (cada cambio se guarda en el diario al producirse)
+        trade_log = monitor_positions()
+        
+        logger.info("Monitorización completada")
+        log_transport_stats()
@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 import logging
+from utils.numeric import current_drawdowns
+from model.features import risk_features, TREND_WINDOW
 
 # Configuración de logging
 logger = logging.getLogger("trading_bot")
@@ -23,7 +25,8 @@ def generate_signals(data, predictions, threshold=0.005):
         signals[ticker] = "BUY" if pred[0] > threshold else "SELL" if pred[0] < -threshold else "HOLD"
     return signals
 
-def apply_risk_controls(signals, data, account_equity, historical_returns, predictions):
+def apply_risk_controls(signals, data, account_equity, historical_returns, predictions,
+                        max_drawdown_allowed=0.20, max_volatility=0.05, trend_tolerance=0.01, outcomes=None):
     """
     Aplica controles de riesgo y genera pesos de posición.
     
@@ -31,33 +34,41 @@ def apply_risk_controls(signals, data, account_equity, historical_returns, predi
         signals: Diccionario con ticker como clave y señal como valor ('BUY', 'SELL', 'HOLD')
         data: DataFrame con los datos históricos
         account_equity: Capital total disponible en la cuenta
-        historical_returns: DataFrame con retornos históricos
+        historical_returns: DataFrame (o array 2D) con retornos históricos
         predictions: Diccionario con predicciones para cada ticker
+        max_drawdown_allowed: Drawdown máximo permitido antes de dejar de operar
+        max_volatility: Volatilidad diaria máxima (14 días) para aceptar un activo
+        trend_tolerance: Margen de tolerancia respecto a la MA50 en el filtro de tendencia
+        outcomes: Lista a la que se añade el resultado de cada señal (dict con symbol,
+                  signal, outcome, reason, volatility y weight), p.ej. para el histórico
     
     Returns:
         dict: Diccionario con ticker como clave y peso como valor.
               Peso positivo = posición larga, negativo = posición corta
     """
     filtered = {}
-    max_drawdown_allowed = 0.20
+    
+    def outcome(ticker, result, reason, volatility=np.nan, weight=0.0):
+        if outcomes is not None:
+            outcomes.append({'symbol': ticker, 'signal': signals.get(ticker), 'outcome': result, 'reason': reason,
+                             'volatility': float(volatility), 'weight': float(weight)})
     
     # Log para depuración
     logger.info(f"Aplicando control de riesgo a {len(signals)} señales")
 
     # Calcular drawdown actual
     try:
-        cumulative_returns = (1 + historical_returns).cumprod()
-        rolling_max = cumulative_returns.cummax()
-        drawdown = (rolling_max - cumulative_returns) / rolling_max
-        
-        # Obtener el máximo drawdown actual (por ticker)
-        if not drawdown.empty:
-            current_drawdown = drawdown.iloc[-1].max()
+        # Obtener el máximo drawdown actual (por ticker), sin los DataFrames
+        # de retorno acumulado y drawdown de todo el histórico
+        if len(historical_returns):
+            current_drawdown = np.nanmax(current_drawdowns(historical_returns))
             logger.info(f"Drawdown actual: {current_drawdown:.4f}, límite: {max_drawdown_allowed}")
             
             # Verificar si el drawdown excede nuestro límite
             if current_drawdown > max_drawdown_allowed:
                 logger.warning(f"⚠️ Drawdown demasiado alto ({current_drawdown:.4f}). No se ejecutarán nuevas operaciones.")
+                for ticker in signals:
+                    outcome(ticker, 'rejected', f"drawdown {current_drawdown:.4f} > {max_drawdown_allowed}")
                 return filtered  # No operar
     except Exception as e:
         logger.warning(f"Error calculando drawdown: {e}. Continuando con el proceso.")
@@ -67,17 +78,23 @@ def apply_risk_controls(signals, data, account_equity, historical_returns, predi
         logger.warning("No hay señales para filtrar")
         return filtered
 
+    # Volatilidad y MA50 de todos los tickers en una pasada (solo se usa la última fila)
+    volatilities, moving_averages = risk_features(data)
+    column_of = {ticker: j for j, ticker in enumerate(data.columns)}
+
     # Procesamos cada señal
     for ticker, signal in signals.items():
         logger.info(f"Evaluando {ticker}: señal {signal}")
         
         if signal == "HOLD":
             logger.info(f"{ticker}: Señal HOLD, omitiendo")
+            outcome(ticker, 'skipped', "hold")
             continue
             
         # Verificar que el ticker esté en los datos
         if ticker not in data.columns:
             logger.warning(f"{ticker} no encontrado en los datos")
+            outcome(ticker, 'skipped', "sin datos")
             continue
 
         # Obtenemos los precios de cierre
@@ -85,28 +102,31 @@ def apply_risk_controls(signals, data, account_equity, historical_returns, predi
         
         # Para el cálculo de ATR necesitamos más datos que solo el cierre
         # Como solo tenemos precios de cierre, usamos un cálculo simplificado de volatilidad
-        volatility = closes.pct_change().rolling(window=14).std().iloc[-1]
+        volatility = volatilities[-1, column_of[ticker]]
         atr_estimate = volatility * closes.iloc[-1]  # Estimación simple del ATR
         
         logger.info(f"{ticker}: Volatilidad {volatility:.4f}, ATR estimado {atr_estimate:.2f}")
         
         # Filtro de volatilidad (evitar activos extremadamente volátiles)
-        if volatility > 0.05:  # Más del 5% de volatilidad diaria
-            logger.info(f"{ticker}: Rechazado por alta volatilidad ({volatility:.4f} > 0.05)")
+        if volatility > max_volatility:  # Por defecto, más del 5% de volatilidad diaria
+            logger.info(f"{ticker}: Rechazado por alta volatilidad ({volatility:.4f} > {max_volatility})")
+            outcome(ticker, 'rejected', f"volatilidad {volatility:.4f} > {max_volatility}", volatility)
             continue
 
         # Filtro de tendencia: solo operar en dirección de la media móvil de 50 días
         trend_check_passed = True
-        if len(closes) >= 50:
-            ma_50 = closes.rolling(window=50).mean().iloc[-1]
+        if len(closes) >= TREND_WINDOW:
+            ma_50 = moving_averages[-1, column_of[ticker]]
             price = closes.iloc[-1]
             
-            # Añadimos un margen de tolerancia del 1%
-            if signal == "BUY" and price < ma_50 * 0.99:
+            # Añadimos un margen de tolerancia (1% por defecto)
+            if signal == "BUY" and price < ma_50 * (1 - trend_tolerance):
                 logger.info(f"{ticker}: Rechazado por tendencia (precio {price:.2f} < MA50 {ma_50:.2f})")
+                outcome(ticker, 'rejected', f"tendencia: precio {price:.2f} < MA50 {ma_50:.2f}", volatility)
                 trend_check_passed = False
-            if signal == "SELL" and price > ma_50 * 1.01:
+            if signal == "SELL" and price > ma_50 * (1 + trend_tolerance):
                 logger.info(f"{ticker}: Rechazado por tendencia (precio {price:.2f} > MA50 {ma_50:.2f})")
+                outcome(ticker, 'rejected', f"tendencia: precio {price:.2f} > MA50 {ma_50:.2f}", volatility)
                 trend_check_passed = False
                 
         # Si no pasa el filtro de tendencia, continuamos
@@ -128,6 +148,9 @@ def apply_risk_controls(signals, data, account_equity, historical_returns, predi
             position_value = max_position_weight if signal == "BUY" else -max_position_weight
             filtered[ticker] = position_value
             logger.info(f"{ticker}: Señal aprobada con peso {position_value:.4f}")
+            outcome(ticker, 'approved', "filtros superados", volatility, position_value)
+        else:
+            outcome(ticker, 'rejected', "sin estimación de ATR", volatility)
 
     if not filtered:
         # Si después de todos los filtros aún no tenemos señales, permitimos la señal más fuerte
@@ -148,6 +171,7 @@ def apply_risk_controls(signals, data, account_equity, historical_returns, predi
             position_value = 0.1 if signal == "BUY" else -0.1  # Posición más pequeña (10% del equity)
             filtered[strongest_signal] = position_value
             logger.info(f"Forzando señal en {strongest_signal} con peso {position_value} (safety valve)")
+            outcome(strongest_signal, 'forced', "safety valve: señal más fuerte", weight=position_value)
 
     logger.info(f"Señales filtradas finales: {filtered}")
     return filtered
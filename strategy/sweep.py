@@ -0,0 +1,270 @@
+import os
+import logging
+import argparse
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+RESULTS_FILE = "sweep_results.csv"
+
+# Parámetros barridos, en el orden en que se codifican en cada fila de configuración
+PARAMS = ['threshold', 'rf_weight', 'max_drawdown_allowed', 'max_volatility',
+          'trend_tolerance', 'stop_loss_pct', 'take_profit_pct']
+
+DEFAULT_GRID = {
+    'threshold': [0.0025, 0.005, 0.0075, 0.01],
+    'rf_weight': [0.0, 0.2, 0.4, 0.6, 0.8, 1.0],
+    'max_drawdown_allowed': [0.10, 0.15, 0.20, 0.30],
+    'max_volatility': [0.02, 0.03, 0.05],
+    'trend_tolerance': [0.0, 0.01, 0.02],
+    'stop_loss_pct': [0.02, 0.03, 0.05],
+    'take_profit_pct': [0.03, 0.05, 0.08]
+}
+
+# Series precalculadas que se comparten entre procesos, en el orden del bloque de memoria
+FEATURES = ['rf', 'lstm', 'volatility', 'ma_50', 'price', 'forward_return']
+
+# Métricas devueltas por evaluate_configs
+METRICS = ['total_return', 'sharpe', 'max_drawdown', 'positions_per_day', 'hit_rate']
+
+TRADING_DAYS = 252
+DRAWDOWN_LOOKBACK = 252  # main.py calcula el drawdown sobre 1 año de datos
+
+# Vistas a la memoria compartida dentro de cada worker
+_shared = {}
+
+def build_grid(grid=None):
+    """
+    Genera todas las combinaciones de una rejilla de parámetros.
+
+    Args:
+        grid: Diccionario parámetro -> lista de valores (por defecto DEFAULT_GRID)
+
+    Returns:
+        numpy.ndarray: Matriz (combinaciones x parámetros) en el orden de PARAMS
+    """
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    return np.array(list(itertools.product(*(grid[p] for p in PARAMS))), dtype=np.float64)
+
+def sample_random(n, space=None, seed=None):
+    """
+    Muestrea configuraciones aleatorias dentro de los rangos de la rejilla.
+
+    Args:
+        n: Número de configuraciones
+        space: Diccionario parámetro -> lista de valores; se muestrea uniformemente
+               entre su mínimo y su máximo (por defecto DEFAULT_GRID)
+        seed: Semilla del generador aleatorio
+
+    Returns:
+        numpy.ndarray: Matriz (n x parámetros) en el orden de PARAMS
+    """
+    space = {**DEFAULT_GRID, **(space or {})}
+    rng = np.random.default_rng(seed)
+    columns = [rng.uniform(min(space[p]), max(space[p]), n) for p in PARAMS]
+    return np.column_stack(columns)
+
+def precompute_features(price_data, rf_model, lstm_models, lstm_scalers):
+    """
+    Calcula una sola vez las predicciones de ambos modelos y las series rodantes
+    que usa apply_risk_controls para cada fecha del histórico.
+
+    Args:
+        price_data: DataFrame con precios de cierre
+        rf_model: Modelo RandomForest (o None)
+        lstm_models: Diccionario de modelos LSTM por ticker
+        lstm_scalers: Diccionario de escaladores LSTM por ticker
+
+    Returns:
+        tuple: (array (features x fechas x tickers) en el orden de FEATURES,
+                drawdown máximo entre tickers por fecha, índice de fechas)
+    """
+    from model.predictor import predict_returns_history
+    from model.lstm_model import predict_lstm_history
+    from model.features import risk_features
+
+    nan_frame = pd.DataFrame(np.nan, index=price_data.index, columns=price_data.columns)
+    rf = predict_returns_history(rf_model, price_data) if rf_model is not None else nan_frame
+    lstm = predict_lstm_history(lstm_models, lstm_scalers, price_data) if lstm_models else nan_frame
+
+    volatility, ma_50 = (pd.DataFrame(values, index=price_data.index, columns=price_data.columns)
+                         for values in risk_features(price_data))
+    forward_return = price_data.shift(-1) / price_data - 1
+
+    # Drawdown de la curva acumulada de cada ticker sobre el último año
+    rolling_max = price_data.rolling(window=DRAWDOWN_LOOKBACK, min_periods=1).max()
+    drawdown = ((rolling_max - price_data) / rolling_max).max(axis=1)
+
+    # Solo fechas con al menos una predicción y retorno siguiente conocido
+    valid = (rf.notna() | lstm.notna()).any(axis=1) & forward_return.notna().all(axis=1)
+    frames = [rf, lstm, volatility, ma_50, price_data, forward_return]
+    features = np.stack([frame[valid].to_numpy(dtype=np.float64) for frame in frames])
+    return features, drawdown[valid].to_numpy(dtype=np.float64), price_data.index[valid]
+
+def evaluate_configs(configs, features, drawdown):
+    """
+    Simula la estrategia diaria para un bloque de configuraciones a la vez.
+
+    Replica generate_signals + apply_risk_controls (incluida la válvula de
+    seguridad) y aproxima el SL/TP recortando el retorno del día siguiente,
+    ya que solo disponemos de precios de cierre.
+
+    Args:
+        configs: Matriz (configuraciones x parámetros) en el orden de PARAMS
+        features: Array (features x fechas x tickers) en el orden de FEATURES
+        drawdown: Drawdown máximo por fecha
+
+    Returns:
+        numpy.ndarray: Matriz (configuraciones x métricas) en el orden de METRICS
+    """
+    rf, lstm, volatility, ma_50, price, forward_return = features
+    # Dimensiones: configuración (k) x fecha (t) x ticker (n)
+    c = {p: configs[:, i][:, None, None] for i, p in enumerate(PARAMS)}
+
+    has_rf = ~np.isnan(rf)
+    has_lstm = ~np.isnan(lstm)
+    combined = np.where(has_rf & has_lstm,
+                        c['rf_weight'] * np.nan_to_num(rf) + (1 - c['rf_weight']) * np.nan_to_num(lstm),
+                        np.where(has_rf, np.nan_to_num(rf), np.nan_to_num(lstm)))
+
+    direction = np.where(combined > c['threshold'], 1.0, np.where(combined < -c['threshold'], -1.0, 0.0))
+
+    # Filtros de volatilidad y tendencia (la MA50 solo se aplica con 50 barras)
+    vol_ok = volatility <= c['max_volatility']
+    no_ma = np.isnan(ma_50)
+    trend_ok = no_ma | np.where(direction > 0, price >= ma_50 * (1 - c['trend_tolerance']),
+                                price <= ma_50 * (1 + c['trend_tolerance']))
+    approved = (direction != 0) & vol_ok & trend_ok & (volatility > 0)
+
+    # Peso = riesgo del 2% / ATR estimado, limitado al 25% del capital
+    with np.errstate(divide='ignore', invalid='ignore'):
+        size = np.minimum(0.25, 0.02 / volatility)
+    weights = np.where(approved, direction * size, 0.0)
+
+    # Válvula de seguridad: sin señales aprobadas, se opera la más fuerte al 10%
+    none_approved = ~approved.any(axis=2)
+    strength = np.where(direction != 0, np.abs(combined), -np.inf)
+    strongest = strength.argmax(axis=2)
+    has_signal = np.isfinite(strength.max(axis=2))
+    valve = np.zeros_like(weights)
+    k_idx, t_idx = np.nonzero(none_approved & has_signal)
+    valve[k_idx, t_idx, strongest[k_idx, t_idx]] = 0.1 * direction[k_idx, t_idx, strongest[k_idx, t_idx]]
+    weights = np.where(none_approved[..., None], valve, weights)
+
+    # Con drawdown por encima del límite no se abre nada ese día
+    weights = np.where((drawdown[None, :] > c['max_drawdown_allowed'][:, :, 0])[..., None], 0.0, weights)
+
+    # SL/TP aproximados sobre el retorno a favor de la posición
+    directed = np.sign(weights) * forward_return
+    directed = np.clip(directed, -c['stop_loss_pct'], c['take_profit_pct'])
+    daily = (np.abs(weights) * directed).sum(axis=2)
+
+    equity = np.cumprod(1 + daily, axis=1)
+    running_max = np.maximum.accumulate(equity, axis=1)
+    max_drawdown = ((running_max - equity) / running_max).max(axis=1)
+    std = daily.std(axis=1)
+    sharpe = np.where(std > 0, daily.mean(axis=1) / np.where(std > 0, std, 1) * np.sqrt(TRADING_DAYS), 0.0)
+    active = np.abs(weights) > 0
+    trades = active.sum(axis=(1, 2))
+    wins = (active & (directed > 0)).sum(axis=(1, 2))
+    hit_rate = np.where(trades > 0, wins / np.maximum(trades, 1), np.nan)
+
+    return np.column_stack([equity[:, -1] - 1, sharpe, max_drawdown, trades / daily.shape[1], hit_rate])
+
+def _attach_shared(names, shapes):
+    """
+    Inicializador de los workers: se conecta a los bloques de memoria compartida.
+    """
+    for key, name in names.items():
+        block = shared_memory.SharedMemory(name=name)
+        _shared[key] = (block, np.ndarray(shapes[key], dtype=np.float64, buffer=block.buf))
+
+def _evaluate_chunk(configs):
+    """
+    Evalúa un bloque de configuraciones sobre las features compartidas.
+    """
+    return evaluate_configs(configs, _shared['features'][1], _shared['drawdown'][1])
+
+def run_sweep(features, drawdown, configs, max_workers=None, chunk_size=64):
+    """
+    Evalúa todas las configuraciones en paralelo compartiendo las features.
+
+    Las features se copian una única vez a memoria compartida; cada worker
+    trabaja sobre vistas de esa memoria y solo recibe sus filas de configuración.
+
+    Args:
+        features: Array (features x fechas x tickers) de precompute_features
+        drawdown: Drawdown por fecha de precompute_features
+        configs: Matriz (configuraciones x parámetros)
+        max_workers: Número de procesos
+        chunk_size: Configuraciones evaluadas por tarea
+
+    Returns:
+        pandas.DataFrame: Parámetros y métricas por configuración, ordenado por Sharpe
+    """
+    arrays = {'features': features, 'drawdown': drawdown}
+    blocks = {}
+    try:
+        for key, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=np.float64, buffer=block.buf)[...] = array
+            blocks[key] = block
+
+        names = {key: block.name for key, block in blocks.items()}
+        shapes = {key: array.shape for key, array in arrays.items()}
+        chunks = [configs[i:i + chunk_size] for i in range(0, len(configs), chunk_size)]
+
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_attach_shared,
+                                 initargs=(names, shapes)) as executor:
+            results = list(executor.map(_evaluate_chunk, chunks))
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+    report = pd.DataFrame(np.hstack([configs, np.vstack(results)]), columns=PARAMS + METRICS)
+    return report.sort_values('sharpe', ascending=False).reset_index(drop=True)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    import pickle
+    from data.data_loader import get_data
+    from utils.scheduler import RF_MODEL_FILE
+    from model.lstm_model import load_lstm_models
+
+    parser = argparse.ArgumentParser(description="Barrido de parámetros de señal, riesgo y SL/TP")
+    parser.add_argument("--period", default="2y", help="Histórico a descargar (formato yfinance)")
+    parser.add_argument("--mode", choices=['grid', 'random'], default='grid')
+    parser.add_argument("--samples", type=int, default=5000, help="Configuraciones en modo random")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    prices = get_data(period=args.period)
+
+    # Se usan los modelos ya guardados: el barrido no debe reentrenar ni sobrescribir nada
+    rf_model = None
+    if os.path.exists(RF_MODEL_FILE):
+        with open(RF_MODEL_FILE, 'rb') as f:
+            rf_model = pickle.load(f)
+    lstm_models, lstm_scalers = load_lstm_models(prices.columns)
+
+    features, drawdown, dates = precompute_features(prices, rf_model, lstm_models, lstm_scalers)
+    logger.info(f"Features precalculadas: {len(dates)} fechas, {prices.columns.size} tickers")
+
+    configs = build_grid() if args.mode == 'grid' else sample_random(args.samples, seed=args.seed)
+    logger.info(f"Evaluando {len(configs)} configuraciones con {args.workers} procesos...")
+    report = run_sweep(features, drawdown, configs, max_workers=args.workers)
+    report.to_csv(args.output, index=False, float_format='%.6g')
+    logger.info(f"Resultados del barrido guardados en {args.output}")
+    print(report.head(10).round(4))
@@ -0,0 +1,147 @@
+import os
+import sys
+
+import pytest
+
+# El módulo broker crea el cliente REST al importarse: basta con credenciales ficticias
+os.environ.setdefault("ALPACA_API_KEY", "test")
+os.environ.setdefault("ALPACA_SECRET_KEY", "test")
+os.environ["TELEGRAM_API_TOKEN"] = ""
+os.environ["TELEGRAM_CHAT_ID"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.history_store import HistoryStore, RunHistory, set_history
+from execution import brackets, broker
+from execution.brackets import (plan_orders, open_orders_by_symbol, cancel_orders, replace_stops, wait_for_order,
+                                wait_for_fill)
+from execution.simulator import SimulatedBroker, SimulatedAPIError
+from execution.trade_journal import TradeJournal, set_trade_journal
+
+class FlakyBroker(SimulatedBroker):
+    """Broker simulado cuyas primeras consultas de orden fallan con un 503."""
+
+    def __init__(self, *args, get_order_failures=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.get_order_failures = get_order_failures
+
+    def get_order(self, order_id, nested=None):
+        if self.get_order_failures > 0:
+            self.get_order_failures -= 1
+            raise SimulatedAPIError("service unavailable", status_code=503)
+        return super().get_order(order_id, nested)
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(brackets, 'ORDER_POLL_INTERVAL', 0.01)
+
+def _open_bracket(sim, qty=10, sl=97.0, tp=105.0):
+    cancel, steps = plan_orders("AAPL", 0, qty, sl, tp)
+    assert not cancel
+    assert broker._submit_plan(sim, 0, [], steps) is None
+    return open_orders_by_symbol(sim)["AAPL"]
+
+def _position(sim):
+    position = sim.positions.get("AAPL")
+    return position['qty'] if position else 0
+
+def test_bracket_entry():
+    sim = SimulatedBroker({'AAPL': 100.0})
+    exits = _open_bracket(sim)
+
+    assert _position(sim) == 10
+    assert sorted((o.type, o.side, float(o.qty)) for o in exits) == [('limit', 'sell', 10), ('stop', 'sell', 10)]
+    assert {o.type: float(o.stop_price or o.limit_price) for o in exits} == {'limit': 105.0, 'stop': 97.0}
+
+    # El SL se ejecuta y cancela al TP
+    sim.set_price("AAPL", 96.0)
+    assert _position(sim) == 0
+    assert open_orders_by_symbol(sim) == {}
+
+def test_trailing_replace():
+    sim = SimulatedBroker({'AAPL': 100.0})
+    exits = _open_bracket(sim)
+
+    assert replace_stops(sim, exits, 101.0) == 1
+    assert [o.status for o in exits if o.type == 'stop'] == ['replaced']
+    stops = [o for o in open_orders_by_symbol(sim)["AAPL"] if o.type == 'stop']
+    assert [float(o.stop_price) for o in stops] == [101.0]
+
+    # El stop nuevo sigue enlazado al TP
+    sim.set_price("AAPL", 100.5)
+    assert _position(sim) == 0
+    assert open_orders_by_symbol(sim) == {}
+
+def test_cancel_then_resubmit_waits_for_confirmation():
+    sim = SimulatedBroker({'AAPL': 100.0}, cancel_delay=0.1)
+    exits = _open_bracket(sim)
+
+    # Cada orden nueva debe salir con las salidas anteriores ya canceladas
+    seen = []
+    submit_order = sim.submit_order
+
+    def checked_submit(**order):
+        seen.append({o.status for o in exits})
+        return submit_order(**order)
+    sim.submit_order = checked_submit
+
+    cancel, steps = plan_orders("AAPL", 10, 4, 97.0, 105.0)
+    assert cancel
+    assert broker._submit_plan(sim, 0, exits, steps) is None
+    assert seen == [{'canceled'}, {'canceled'}]
+    assert _position(sim) == 4
+    assert sorted((o.type, float(o.qty)) for o in open_orders_by_symbol(sim)["AAPL"]) == [('limit', 4), ('stop', 4)]
+
+def test_cancel_not_confirmed_stops_the_plan():
+    sim = SimulatedBroker({'AAPL': 100.0}, cancel_delay=5)
+    exits = _open_bracket(sim)
+
+    with pytest.raises(RuntimeError):
+        cancel_orders(sim, exits, timeout=0.05)
+    assert {o.status for o in exits} == {'pending_cancel'}
+
+def test_flip_is_split_in_close_and_open():
+    sim = SimulatedBroker({'AAPL': 100.0})
+    exits = _open_bracket(sim)
+
+    # Una sola orden que cruce de largo a corto se rechaza
+    with pytest.raises(SimulatedAPIError) as error:
+        sim.submit_order("AAPL", qty=15, side='sell')
+    assert error.value.status_code == 403
+
+    cancel, steps = plan_orders("AAPL", 10, -5, 103.0, 95.0)
+    assert cancel and [order['qty'] for _, order in steps] == [10, 5]
+    assert broker._submit_plan(sim, 0, exits, steps) is None
+    assert _position(sim) == -5
+    assert sorted((o.type, o.side) for o in open_orders_by_symbol(sim)["AAPL"]) == [('limit', 'buy'), ('stop', 'buy')]
+
+def test_market_rebalance_flip(tmp_path, monkeypatch):
+    sim = SimulatedBroker({'AAPL': 100.0})
+    sim.set_position("AAPL", 10)
+    journal = TradeJournal(str(tmp_path / "trade_journal.db"), legacy_log=None)
+    set_trade_journal(journal)
+    set_history(RunHistory(HistoryStore(str(tmp_path / "history"))))
+    monkeypatch.setattr(broker, 'api', sim)
+    broker.invalidate_snapshot()
+    try:
+        errors = broker.rebalance({'AAPL': -0.05}, concurrent=False, track_fills=False, order_mode='market',
+                                  stop_mode='pct')
+    finally:
+        set_history(None)
+        set_trade_journal(None)
+        journal.close()
+
+    assert errors == {}
+    assert [(o.side, float(o.qty)) for o in sim.orders] == [('sell', 10), ('sell', 50)]
+    assert _position(sim) == -50
+
+def test_wait_for_order_survives_transient_error():
+    sim = FlakyBroker({'AAPL': 100.0}, get_order_failures=2)
+    order = sim.submit_order("AAPL", qty=1, side='buy')
+
+    assert wait_for_fill(sim, order, timeout=5).status == 'filled'
+    assert sim.call_counts['get_order'] == 1
+
+    # Un error que no es transitorio se propaga sin esperar
+    with pytest.raises(SimulatedAPIError):
+        wait_for_order(sim, "missing", {'filled'}, timeout=5)
@@ -0,0 +1,41 @@
+import os
+import sys
+from datetime import date, datetime, time, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import market_calendar
+
+def test_juneteenth_observed():
+    # 2027: 19 de junio en sábado, se cierra el viernes 18
+    assert date(2027, 6, 18) in market_calendar.holidays(2027)
+    assert not market_calendar.is_trading_day(date(2027, 6, 18))
+    # 2022: en domingo, se cierra el lunes 20
+    assert date(2022, 6, 20) in market_calendar.holidays(2022)
+    # Antes de 2022 no era festivo
+    assert market_calendar.is_trading_day(date(2021, 6, 18))
+
+def test_july_3_early_close():
+    opens, closes = market_calendar.session(date(2024, 7, 3))
+    assert closes == datetime(2024, 7, 3, 17, 0, tzinfo=timezone.utc)
+    assert opens == datetime(2024, 7, 3, 13, 30, tzinfo=timezone.utc)
+    # 2026: 4 de julio en sábado, el viernes 3 es el festivo y no un cierre anticipado
+    assert date(2026, 7, 3) not in market_calendar.early_closes(2026)
+    assert market_calendar.session(date(2026, 7, 3)) is None
+
+def test_adhoc_closure_2025_01_09():
+    assert not market_calendar.is_trading_day(date(2025, 1, 9))
+    assert market_calendar.session(date(2025, 1, 9)) is None
+    assert market_calendar.next_session(datetime(2025, 1, 9, 15, 0, tzinfo=timezone.utc))[0].date() == date(2025, 1, 10)
+
+def test_new_year_on_saturday_not_observed():
+    # 2022-01-01 en sábado: el viernes 31 de diciembre de 2021 hubo sesión normal
+    assert date(2021, 12, 31) not in market_calendar.holidays(2021)
+    assert date(2021, 12, 31) not in market_calendar.holidays(2022)
+    opens, closes = market_calendar.session(date(2021, 12, 31))
+    assert closes.astimezone(market_calendar.EXCHANGE_TZ).time() == time(16, 0)
+
+def test_is_open_regular_hours():
+    assert market_calendar.is_open(datetime(2026, 10, 19, 14, 0, tzinfo=timezone.utc))
+    assert not market_calendar.is_open(datetime(2026, 10, 19, 13, 29, tzinfo=timezone.utc))
+    assert not market_calendar.is_open(datetime(2026, 10, 18, 15, 0, tzinfo=timezone.utc))
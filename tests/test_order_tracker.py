@@ -0,0 +1,97 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.history_store import HistoryStore, RunHistory, set_history
+from execution.order_tracker import OrderTracker
+from execution.simulator import SimulatedBroker
+from execution.streams import LocalEventSource
+from execution.trade_journal import TradeJournal
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = TradeJournal(str(tmp_path / "trade_journal.db"), legacy_log=None)
+    set_history(RunHistory(HistoryStore(str(tmp_path / "history"))))
+    yield journal
+    journal.close()
+    set_history(None)
+
+def _update(event, client_order_id, filled_qty=0, avg_price=None, price=None, position_qty=None, side='buy'):
+    order = {'client_order_id': client_order_id, 'side': side, 'filled_qty': str(filled_qty),
+             'filled_avg_price': None if avg_price is None else str(avg_price)}
+    return SimpleNamespace(event=event, order=order, price=price,
+                           position_qty=None if position_qty is None else str(position_qty))
+
+def test_fills_update_journal_with_real_price(journal):
+    source = LocalEventSource()
+    tracker = OrderTracker(source, journal)
+    tracker.register("o1", "AAPL", 0, 0.03, 0.05)
+
+    source.publish(_update('new', "o1"))
+    assert journal.get("AAPL") is None
+    source.publish(_update('partial_fill', "o1", 4, 10.0, 10.0, 4))
+    assert journal.get("AAPL")['qty'] == 4
+    source.publish(_update('fill', "o1", 10, 10.3, 10.5, 10))
+
+    entry = journal.get("AAPL")
+    assert entry['qty'] == 10 and entry['side'] == 'buy'
+    # Precio medio real de los dos llenados: (4 * 10.0 + 6 * 10.5) / 10
+    assert entry['entry'] == pytest.approx(10.3)
+    assert entry['sl'] == pytest.approx(10.0 * 0.97)
+    assert tracker.pending() == [] and tracker.wait(0)
+
+def test_canceled_order_leaves_journal_untouched(journal):
+    source = LocalEventSource()
+    tracker = OrderTracker(source, journal)
+    tracker.register("o1", "MSFT", 0, 0.03, 0.05)
+
+    source.publish(_update('new', "o1"))
+    source.publish(_update('canceled', "o1"))
+    assert journal.get("MSFT") is None
+    assert tracker.wait(0)
+
+def test_fill_closes_position(journal):
+    source = LocalEventSource()
+    tracker = OrderTracker(source, journal)
+    journal.upsert("AAPL", {'entry': 100.0, 'qty': 5, 'side': 'buy', 'sl': 97.0, 'tp': 105.0,
+                            'entry_time': "2024-01-02T10:00:00", 'last_update': "2024-01-02T10:00:00"})
+    tracker.register("o1", "AAPL", 5, 0.03, 0.05)
+
+    source.publish(_update('fill', "o1", 5, 110.0, 110.0, 0, side='sell'))
+    assert journal.get("AAPL") is None
+    closed = journal.closed_trades("AAPL")
+    assert len(closed) == 1 and closed[0]['exit_price'] == pytest.approx(110.0)
+    assert closed[0]['pnl'] == pytest.approx(50.0)
+
+def test_simulated_broker_stream(journal):
+    sim = SimulatedBroker({'AAPL': 100.0}, slippage=0.001)
+    tracker = OrderTracker(sim.trade_updates, journal)
+    tracker.register("o1", "AAPL", 0, 0.03, 0.05)
+
+    sim.submit_order("AAPL", qty=3, side='buy', client_order_id="o1")
+    entry = journal.get("AAPL")
+    assert entry['qty'] == 3 and entry['entry'] == pytest.approx(100.1)
+
+def test_resolve_pending_after_missed_events(journal):
+    sim = SimulatedBroker({'AAPL': 100.0, 'MSFT': 50.0})
+    # El stream no llega al seguimiento: sus eventos se pierden
+    tracker = OrderTracker(LocalEventSource(), journal)
+    tracker.register("o1", "AAPL", 0, 0.03, 0.05)
+    tracker.register("o2", "MSFT", 0, 0.03, 0.05)
+    sim.submit_order("AAPL", qty=2, side='buy', client_order_id="o1")
+    sim.submit_order("MSFT", qty=4, side='buy', type='limit', limit_price=45.0, client_order_id="o2")
+    assert not tracker.wait(0)
+
+    tracker.resolve_pending(sim)
+    assert journal.get("AAPL")['qty'] == 2
+    assert journal.get("AAPL")['entry'] == pytest.approx(100.0)
+    # La orden límite sigue abierta: continúa pendiente
+    assert tracker.pending() == ["o2"]
+
+    sim.cancel_order(sim.get_order_by_client_order_id("o2").id)
+    tracker.resolve_pending(sim)
+    assert tracker.pending() == [] and journal.get("MSFT") is None
@@ -0,0 +1,51 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.telegram_notifier import TelegramNotifier
+
+class _Response:
+    status_code = 200
+
+class _Session:
+    def __init__(self):
+        self.texts = []
+
+    def post(self, url, data=None, timeout=None):
+        self.texts.append(data['text'])
+        return _Response()
+
+def _notifier():
+    session = _Session()
+    return TelegramNotifier("token", "chat", min_interval=0, coalesce_window=0, session=session), session
+
+def _in_thread(func):
+    thread = threading.Thread(target=func)
+    thread.start()
+    thread.join()
+
+def test_digest_ignores_other_threads():
+    notifier, session = _notifier()
+    with notifier.digest("Resumen") as digest:
+        notifier.notify("propio")
+        _in_thread(lambda: notifier.notify("de otro hilo"))
+        assert digest == ["propio"]
+        # El hilo de otro resumen no desapila el de este
+        _in_thread(lambda: notifier.digest().__enter__())
+        notifier.notify("después")
+    assert notifier.flush(5)
+    assert "de otro hilo" in session.texts[0]
+    assert any(text.startswith("Resumen\npropio\ndespués") for text in session.texts)
+
+def test_joined_threads_share_the_digest():
+    notifier, session = _notifier()
+    with notifier.digest("Resumen") as digest:
+        def worker():
+            with notifier.joined(digest):
+                notifier.notify("trabajo")
+        _in_thread(worker)
+        assert notifier.current_digest() is digest
+    assert notifier.flush(5)
+    assert session.texts == ["Resumen\ntrabajo"]
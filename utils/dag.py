@@ -0,0 +1,183 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.metrics import span
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+# Valor centinela: la etapa no tiene fallback y su fallo detiene a las que dependen de ella
+NO_FALLBACK = object()
+
+class DagAbort(Exception):
+    """Una etapa la lanza para terminar la ejecución (p.ej. sin datos o sin señales)."""
+
+class Stage:
+    """
+    Etapa del grafo de ejecución.
+
+    Args:
+        name: Nombre de la etapa (también el de su resultado para las dependientes)
+        func: Función que recibe como argumentos con nombre los resultados de deps
+        deps: Etapas de las que depende
+        fallback: Resultado si func falla; sin él, las etapas dependientes no se ejecutan
+        label: Nombre en logs y métricas (por defecto name)
+        cached: Guardar su resultado en la caché de run_dag y reutilizarlo
+    """
+
+    def __init__(self, name, func, deps=(), fallback=NO_FALLBACK, label=None, cached=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.fallback = fallback
+        self.label = label or name
+        self.cached = cached
+
+class DagResult:
+    """
+    Resultado de run_dag.
+
+    Attributes:
+        results: Etapa -> resultado (o fallback) de las etapas completadas
+        errors: Etapa -> excepción de todas las que fallaron (con o sin fallback)
+        failed: Etapa -> excepción de las que fallaron sin fallback
+        skipped: Etapas no ejecutadas (dependencia fallida o ejecución abortada)
+        from_cache: Etapas cuyo resultado se tomó de la caché
+        aborted: DagAbort que terminó la ejecución, o None
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+        self.failed = {}
+        self.skipped = []
+        self.from_cache = []
+        self.aborted = None
+
+    @property
+    def completed(self):
+        return self.aborted is None and not self.skipped
+
+def _validate(stages):
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Nombres de etapa repetidos")
+    known = set(names)
+    for stage in stages:
+        missing = set(stage.deps) - known
+        if missing:
+            raise ValueError(f"La etapa '{stage.name}' depende de etapas desconocidas: {sorted(missing)}")
+
+    # Detectar ciclos (orden topológico de Kahn)
+    pending = {stage.name: set(stage.deps) for stage in stages}
+    while pending:
+        ready = [name for name, deps in pending.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependencias circulares entre: {sorted(pending)}")
+        for name in ready:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+
+def _needed(stages, resolved):
+    """
+    Etapas que hay que ejecutar: las finales sin resultado y, hacia atrás, las
+    dependencias sin resultado de estas. Una etapa en caché corta la cadena.
+    """
+    depended_on = {dep for stage in stages for dep in stage.deps}
+    by_name = {stage.name: stage for stage in stages}
+    needed = set()
+    frontier = [stage.name for stage in stages if stage.name not in depended_on and stage.name not in resolved]
+    while frontier:
+        name = frontier.pop()
+        if name in needed:
+            continue
+        needed.add(name)
+        frontier.extend(dep for dep in by_name[name].deps if dep not in resolved)
+    return needed
+
+def run_dag(stages, max_workers=4, cache=None):
+    """
+    Ejecuta las etapas en hilos, cada una en cuanto terminan sus dependencias,
+    de forma que la duración total es la del camino crítico y no la suma.
+
+    Cada etapa se mide con metrics.span. Si una etapa falla se usa su
+    fallback; si no tiene, las que dependen de ella se omiten. DagAbort
+    detiene el lanzamiento de nuevas etapas (las que están en curso terminan).
+
+    Con cache, las etapas marcadas como cached se toman de ella si están y se
+    guardan al completarse (no si se usó su fallback). Las etapas de las que
+    ya no depende ninguna pendiente no se ejecutan.
+
+    Args:
+        stages: Lista de Stage
+        max_workers: Etapas ejecutándose a la vez como máximo
+        cache: Objeto con get(nombre) -> (encontrado, resultado) y put(nombre, resultado)
+
+    Returns:
+        DagResult
+    """
+    _validate(stages)
+    by_name = {stage.name: stage for stage in stages}
+    outcome = DagResult()
+
+    if cache is not None:
+        for stage in stages:
+            if stage.cached:
+                found, result = cache.get(stage.name)
+                if found:
+                    outcome.results[stage.name] = result
+                    outcome.from_cache.append(stage.name)
+        if outcome.from_cache:
+            logger.info(f"Etapas recuperadas de la caché: {', '.join(by_name[n].label for n in outcome.from_cache)}")
+    needed = _needed(stages, outcome.results)
+
+    def execute(stage):
+        kwargs = {dep: outcome.results[dep] for dep in stage.deps}
+        with span(stage.label):
+            return stage.func(**kwargs)
+
+    pending = {name: stage for name, stage in by_name.items() if name in needed}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            if outcome.aborted is None:
+                for name, stage in list(pending.items()):
+                    if any(dep in outcome.failed or dep in outcome.skipped for dep in stage.deps):
+                        # Dependencia fallida sin fallback
+                        del pending[name]
+                        outcome.skipped.append(name)
+                    elif all(dep in outcome.results for dep in stage.deps):
+                        del pending[name]
+                        running[executor.submit(execute, stage)] = name
+            else:
+                outcome.skipped.extend(pending)
+                pending.clear()
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                stage = by_name[name]
+                try:
+                    result = future.result()
+                except DagAbort as e:
+                    logger.warning(f"Ejecución detenida en la etapa '{stage.label}': {e}")
+                    outcome.aborted = e
+                    outcome.failed[name] = e
+                    continue
+                except Exception as e:
+                    logger.error(f"Error en la etapa '{stage.label}': {e}")
+                    outcome.errors[name] = e
+                    if stage.fallback is NO_FALLBACK:
+                        outcome.failed[name] = e
+                        continue
+                    outcome.results[name] = stage.fallback
+                    continue
+                outcome.results[name] = result
+                if cache is not None and stage.cached:
+                    try:
+                        cache.put(name, result)
+                    except Exception as e:
+                        logger.warning(f"No se pudo guardar '{stage.label}' en la caché: {e}")
+    return outcome
@@ -26,4 +26,31 @@ ALPACA_API_KEY = get_env_variable("ALPACA_API_KEY")
 ALPACA_SECRET_KEY = get_env_variable("ALPACA_SECRET_KEY")
 BASE_URL = get_env_variable("BASE_URL", "https://paper-api.alpaca.markets")
 TELEGRAM_API_TOKEN = get_env_variable("TELEGRAM_API_TOKEN")
-TELEGRAM_CHAT_ID = get_env_variable("TELEGRAM_CHAT_ID")
\ No newline at end of file
+TELEGRAM_CHAT_ID = get_env_variable("TELEGRAM_CHAT_ID")
+
+# Procesar los tickers de execute_trades en paralelo ("true"/"false")
+CONCURRENT_EXECUTION = get_env_variable("CONCURRENT_EXECUTION", "false").lower() == "true"
+
+# Registrar los llenados reales desde el stream de trade updates ("true"/"false")
+TRACK_FILLS = get_env_variable("TRACK_FILLS", "false").lower() == "true"
+
+# Modo de órdenes: "market" (SL/TP vigilados por el monitor) o "bracket"
+# (SL/TP como órdenes bracket/OCO en el broker)
+ORDER_MODE = get_env_variable("ORDER_MODE", "market").lower()
+
+# Niveles de SL/TP: "pct" (porcentaje fijo) o "atr" (múltiplos del ATR diario)
+STOP_MODE = get_env_variable("STOP_MODE", "pct").lower()
+
+# Fichero de métricas de tiempos por etapa: ".prom" (textfile de Prometheus) o
+# JSON lines con cualquier otra extensión. Vacío = métricas desactivadas
+METRICS_FILE = get_env_variable("METRICS_FILE", "")
+
+# Servicio local de predicción (python -m model.prediction_service). Si responde,
+# main.py le pide las predicciones en lugar de cargar los modelos. Vacío = no usarlo
+PREDICTION_SERVICE_URL = get_env_variable("PREDICTION_SERVICE_URL", "http://127.0.0.1:8765")
+
+# Estrategias de multi_strategy.py (JSON con una lista de estrategias)
+STRATEGIES_FILE = get_env_variable("STRATEGIES_FILE", "strategies.json")
+
+# Precios y series derivadas en float32 sin copias intermedias ("true"/"false")
+COMPACT_NUMERICS = get_env_variable("COMPACT_NUMERICS", "false").lower() == "true"
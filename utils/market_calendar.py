@@ -0,0 +1,188 @@
+"""
+Calendario local de la bolsa de Nueva York (NYSE): festivos, cierres
+anticipados y horario de cada sesión, sin llamadas a la API.
+
+Los festivos y cierres anticipados se calculan con las reglas vigentes de la
+NYSE (incluido Juneteenth desde 2022) y se guardan en caché por año. Solo
+usa la biblioteca estándar, así que los workflows pueden consultarlo antes
+de instalar las dependencias:
+
+    python -m utils.market_calendar            # sesión de hoy
+    python -m utils.market_calendar --open     # código 0 si el mercado está abierto ahora
+    python -m utils.market_calendar --trading-day
+
+Un cierre no programado (p.ej. por duelo nacional) no está en las reglas:
+el reloj del broker sigue siendo la referencia una vez pasada esta puerta.
+"""
+import sys
+import argparse
+from functools import lru_cache
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# Cierres extraordinarios ya conocidos (fuera de las reglas)
+ADHOC_CLOSURES = {
+    date(2018, 12, 5): "Funeral de George H. W. Bush",
+    date(2025, 1, 9): "Funeral de Jimmy Carter"
+}
+
+def _nth_weekday(year, month, weekday, n):
+    """n-ésimo día de la semana (lunes = 0) del mes; n = -1 para el último."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year):
+    """Domingo de Pascua (algoritmo gregoriano anónimo)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed(day):
+    """Festivo en sábado: se cierra el viernes; en domingo: el lunes."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=None)
+def _year(year):
+    holidays = {}
+    # Año Nuevo en sábado no se adelanta al viernes (cerraría el año anterior)
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays[_observed(new_year)] = "Año Nuevo"
+    holidays[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr."
+    holidays[_nth_weekday(year, 2, 0, 3)] = "Presidents' Day"
+    holidays[_easter(year) - timedelta(days=2)] = "Viernes Santo"
+    holidays[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        holidays[_observed(date(year, 6, 19))] = "Juneteenth"
+    holidays[_observed(date(year, 7, 4))] = "Independence Day"
+    holidays[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    thanksgiving = _nth_weekday(year, 11, 3, 4)
+    holidays[thanksgiving] = "Thanksgiving"
+    holidays[_observed(date(year, 12, 25))] = "Navidad"
+    holidays.update({day: name for day, name in ADHOC_CLOSURES.items() if day.year == year})
+
+    # Cierre a las 13:00 la víspera del 4 de julio y de Navidad (de lunes a
+    # jueves: en viernes la víspera es el festivo) y el día después de Thanksgiving
+    early_closes = {}
+    for day in (date(year, 7, 3), thanksgiving + timedelta(days=1), date(year, 12, 24)):
+        if day.weekday() < 5 and day not in holidays:
+            early_closes[day] = EARLY_CLOSE
+    return holidays, early_closes
+
+def holidays(year):
+    """
+    Festivos de un año.
+
+    Returns:
+        dict: fecha -> nombre del festivo
+    """
+    return dict(_year(year)[0])
+
+def early_closes(year):
+    """
+    Sesiones con cierre anticipado de un año.
+
+    Returns:
+        dict: fecha -> hora de cierre (hora de Nueva York)
+    """
+    return dict(_year(year)[1])
+
+def _as_date(day):
+    if day is None:
+        return datetime.now(EXCHANGE_TZ).date()
+    if isinstance(day, datetime):
+        return (day if day.tzinfo is None else day.astimezone(EXCHANGE_TZ)).date()
+    return day
+
+def is_trading_day(day=None):
+    """Indica si hay sesión en una fecha (por defecto hoy en Nueva York)."""
+    day = _as_date(day)
+    return day.weekday() < 5 and day not in _year(day.year)[0]
+
+def session(day=None):
+    """
+    Apertura y cierre de la sesión de una fecha.
+
+    Args:
+        day: date o datetime (por defecto hoy en Nueva York)
+
+    Returns:
+        tuple: (apertura, cierre) como datetime en UTC, o None si no hay sesión
+    """
+    day = _as_date(day)
+    if not is_trading_day(day):
+        return None
+    close = _year(day.year)[1].get(day, REGULAR_CLOSE)
+    return (datetime.combine(day, REGULAR_OPEN, EXCHANGE_TZ).astimezone(timezone.utc),
+            datetime.combine(day, close, EXCHANGE_TZ).astimezone(timezone.utc))
+
+def is_open(now=None):
+    """Indica si el mercado está en sesión regular en un instante (por defecto ahora)."""
+    now = now or datetime.now(timezone.utc)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    hours = session(now)
+    return hours is not None and hours[0] <= now < hours[1]
+
+def next_session(now=None):
+    """
+    Sesión en curso o, si no la hay, la siguiente.
+
+    Returns:
+        tuple: (apertura, cierre) como datetime en UTC
+    """
+    now = now or datetime.now(timezone.utc)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    day = _as_date(now)
+    while True:
+        hours = session(day)
+        if hours is not None and now < hours[1]:
+            return hours
+        day += timedelta(days=1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calendario local de la NYSE")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--open", action='store_true', help="Código de salida 0 si el mercado está abierto ahora")
+    group.add_argument("--trading-day", action='store_true', help="Código de salida 0 si hoy hay sesión")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="Fecha a consultar (AAAA-MM-DD)")
+    args = parser.parse_args(argv)
+
+    if args.open:
+        result = is_open()
+        print("Mercado abierto" if result else "Mercado cerrado")
+        return 0 if result else 1
+
+    day = _as_date(args.date)
+    hours = session(day)
+    if hours is None:
+        reason = _year(day.year)[0].get(day, "fin de semana")
+        opens, _ = next_session(datetime.combine(day, time(23, 59), EXCHANGE_TZ))
+        print(f"{day}: sin sesión ({reason}). Siguiente apertura: {opens.astimezone(EXCHANGE_TZ):%Y-%m-%d %H:%M} ET")
+    else:
+        opens, closes = (value.astimezone(EXCHANGE_TZ) for value in hours)
+        print(f"{day}: sesión {opens:%H:%M}-{closes:%H:%M} ET")
+    return 0 if hours is not None or not args.trading_day else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import functools
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from utils.environment import METRICS_FILE
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("trading_bot")
+
+# Límites (segundos) de los buckets de los histogramas, al estilo Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Prefijo de todas las métricas exportadas
+METRIC_PREFIX = "trading_bot_"
+
+# Contexto vacío que devuelve span() con las métricas desactivadas
+_NOOP = nullcontext()
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas en memoria, identificados por nombre y etiquetas.
+
+    Args:
+        buckets: Límites superiores de los buckets de los histogramas
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            hist['buckets'][bisect_left(self.buckets, value)] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def gauge_max(self, name, value, **labels):
+        """Gauge que conserva el mayor valor observado (p.ej. picos de memoria)."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = max(self._gauges.get(key, value), value)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {'counters': [...], 'histograms': [...], 'gauges': [...]} con nombre, etiquetas y valores
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self._counters.items()]
+            histograms = [{'name': name, 'labels': dict(labels), 'count': hist['count'],
+                           'sum': round(hist['sum'], 6), 'buckets': list(hist['buckets'])}
+                          for (name, labels), hist in self._histograms.items()]
+            gauges = [{'name': name, 'labels': dict(labels), 'value': value}
+                      for (name, labels), value in self._gauges.items()]
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def to_prometheus(self):
+        """Métricas en formato de texto de Prometheus (para el textfile collector)."""
+        def labels_text(labels, extra=None):
+            items = list(labels.items()) + ([extra] if extra else [])
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted({c['name'] for c in snapshot['counters']}):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+            for c in snapshot['counters']:
+                if c['name'] == name:
+                    lines.append(f"{METRIC_PREFIX}{name}{labels_text(c['labels'])} {c['value']}")
+        for name in sorted({g['name'] for g in snapshot['gauges']}):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} gauge")
+            for g in snapshot['gauges']:
+                if g['name'] == name:
+                    lines.append(f"{METRIC_PREFIX}{name}{labels_text(g['labels'])} {g['value']}")
+        for name in sorted({h['name'] for h in snapshot['histograms']}):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+            for h in snapshot['histograms']:
+                if h['name'] != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), h['buckets']):
+                    cumulative += count
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{labels_text(h['labels'], ('le', bound))} {cumulative}")
+                lines.append(f"{METRIC_PREFIX}{name}_sum{labels_text(h['labels'])} {h['sum']}")
+                lines.append(f"{METRIC_PREFIX}{name}_count{labels_text(h['labels'])} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+_registry = MetricsRegistry()
+_enabled = False
+_output = None
+_atexit_registered = False
+
+def enable(path):
+    """
+    Activa las métricas y las exporta a path al terminar el proceso.
+
+    Con extensión .prom se escribe un textfile de Prometheus (se sustituye en
+    cada ejecución); con cualquier otra se añade una línea JSON por ejecución.
+    """
+    global _enabled, _output, _atexit_registered
+    _output = path
+    _enabled = True
+    if not _atexit_registered:
+        atexit.register(export)
+        _atexit_registered = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def get_registry():
+    return _registry
+
+def inc(name, value=1, **labels):
+    """Suma value al contador name (no hace nada si las métricas están desactivadas)."""
+    if _enabled:
+        _registry.inc(name, value, **labels)
+
+def observe(name, value, **labels):
+    """Añade una observación al histograma name (no hace nada si están desactivadas)."""
+    if _enabled:
+        _registry.observe(name, value, **labels)
+
+def peak_rss_bytes():
+    """
+    Pico de memoria residente del proceso hasta ahora (None si no se puede medir).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+@contextmanager
+def _timed_span(stage):
+    start = time.perf_counter()
+    start_peak = peak_rss_bytes()
+    try:
+        yield
+    except BaseException:
+        _registry.inc("stage_errors_total", stage=stage)
+        raise
+    finally:
+        _registry.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage)
+        if start_peak is not None:
+            # El pico es del proceso: con etapas en paralelo, el crecimiento se
+            # atribuye a todas las que estaban en curso
+            end_peak = peak_rss_bytes()
+            _registry.gauge_max("stage_peak_rss_bytes", end_peak, stage=stage)
+            _registry.gauge_max("stage_peak_rss_growth_bytes", end_peak - start_peak, stage=stage)
+
+def span(stage):
+    """
+    Mide la duración de una etapa del pipeline (y cuenta sus errores).
+
+    Uso:
+        with span("get_data"):
+            price_data = get_data()
+
+    Con las métricas desactivadas devuelve un contexto vacío compartido.
+    """
+    if not _enabled:
+        return _NOOP
+    return _timed_span(stage)
+
+def timed(stage):
+    """Decorador equivalente a envolver la función en span(stage)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _timed_span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def memory_report():
+    """
+    Returns:
+        dict: Etapa -> {'peak_rss_mb', 'growth_mb'} de las etapas medidas
+    """
+    report = {}
+    for gauge in _registry.snapshot()['gauges']:
+        field = {'stage_peak_rss_bytes': 'peak_rss_mb', 'stage_peak_rss_growth_bytes': 'growth_mb'}.get(gauge['name'])
+        if field:
+            report.setdefault(gauge['labels']['stage'], {})[field] = round(gauge['value'] / 2 ** 20, 1)
+    return report
+
+def log_memory_report():
+    """Registra en el log el pico de memoria residente de cada etapa (con métricas activas)."""
+    report = memory_report()
+    if not report:
+        return
+    lines = [f"  {stage:<24} pico {values.get('peak_rss_mb', 0):>8.1f} MB  (+{values.get('growth_mb', 0):.1f} MB)"
+             for stage, values in sorted(report.items(), key=lambda item: item[1].get('peak_rss_mb', 0))]
+    logger.info("Memoria por etapa:\n" + "\n".join(lines))
+
+def export(path=None):
+    """
+    Escribe las métricas acumuladas en path (por defecto el de enable()).
+
+    Returns:
+        bool: True si se escribieron
+    """
+    path = path or _output
+    if not _enabled or not path:
+        return False
+    if path.endswith(".prom"):
+        # Escritura atómica: el collector nunca lee un fichero a medias
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(_registry.to_prometheus())
+        os.replace(tmp, path)
+    else:
+        record = dict(_registry.snapshot(), timestamp=datetime.now().isoformat(), buckets=list(_registry.buckets))
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+    return True
+
+if METRICS_FILE:
+    enable(METRICS_FILE)
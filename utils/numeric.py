@@ -0,0 +1,80 @@
+"""
+Modo numérico compacto (COMPACT_NUMERICS).
+
+Activado, los precios se guardan como un único bloque float32 (un DataFrame
+sobre un solo array, sin una copia por columna) y las series derivadas
+(retornos, drawdown, características de los modelos, series escaladas del
+LSTM) se calculan como arrays float32 sobre ese bloque, sin DataFrames
+intermedios del histórico completo. El RandomForest y keras trabajan en
+float32 internamente, así que las predicciones no cambian de forma apreciable.
+"""
+import numpy as np
+import pandas as pd
+from utils.environment import COMPACT_NUMERICS
+
+_compact = COMPACT_NUMERICS
+
+def is_compact():
+    return _compact
+
+def set_compact(enabled):
+    """Activa o desactiva el modo compacto (p.ej. en benchmarks)."""
+    global _compact
+    _compact = bool(enabled)
+
+def dtype():
+    """Tipo de los precios y series derivadas en el modo actual."""
+    return np.float32 if _compact else np.float64
+
+def price_frame(block, index, columns):
+    """
+    DataFrame de precios sobre un array 2D (filas x tickers) sin copiarlo.
+    """
+    return pd.DataFrame(block, index=index, columns=columns, copy=False)
+
+def price_block(data):
+    """
+    Array 2D de precios de un DataFrame: una vista si ya es un único bloque
+    del tipo del modo actual, una copia convertida si no.
+    """
+    return data.to_numpy(dtype=dtype(), copy=False)
+
+def simple_returns(prices, dropna=True):
+    """
+    Retornos simples de un array 2D de precios en un solo array nuevo
+    (equivalente a pct_change().dropna() sin DataFrames intermedios).
+
+    Args:
+        prices: Array 2D (filas x tickers)
+        dropna: Quitar las filas con algún NaN, como dropna()
+
+    Returns:
+        numpy.ndarray: (filas - 1) x tickers, del tipo de prices
+    """
+    returns = np.empty((max(len(prices) - 1, 0), prices.shape[1]), dtype=prices.dtype)
+    np.divide(prices[1:], prices[:-1], out=returns)
+    returns -= 1
+    if dropna:
+        valid = ~np.isnan(returns).any(axis=1)
+        if not valid.all():
+            returns = returns[valid]
+    return returns
+
+def current_drawdowns(returns):
+    """
+    Drawdown de la última fila de cada columna a partir de los retornos, con
+    un único array temporal (en lugar de los DataFrames de retorno acumulado,
+    máximo acumulado y drawdown completos).
+
+    Args:
+        returns: DataFrame o array 2D de retornos
+
+    Returns:
+        numpy.ndarray: Drawdown actual por columna
+    """
+    values = returns.to_numpy(copy=False) if isinstance(returns, pd.DataFrame) else np.asarray(returns)
+    growth = values + 1
+    np.nan_to_num(growth, copy=False, nan=1.0)
+    np.cumprod(growth, axis=0, out=growth)
+    peak = growth.max(axis=0)
+    return (peak - growth[-1]) / peak
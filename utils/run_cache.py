@@ -0,0 +1,143 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import logging
+from datetime import date
+from model.artifacts import MODEL_DIR, artifact_version
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+# Directorio de la caché de ejecuciones
+RUN_CACHE_DIR = "./run_cache"
+
+# Días de ejecuciones que se conservan
+RUN_CACHE_KEEP_DAYS = 7
+
+def run_key(as_of, params):
+    """
+    Clave de una ejecución: última barra y parámetros (riesgo, umbral,
+    tickers...). Si cualquiera cambia, nada se reutiliza.
+    """
+    payload = json.dumps({'as_of': str(as_of), 'params': params},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+class RunCache:
+    """
+    Resultados de las etapas completadas de la ejecución del día, en disco.
+
+    Un reintento el mismo día (tras un fallo o al repetir el workflow) retoma
+    desde la última etapa completada, y si la ejecución ya terminó no vuelve a
+    hacer nada. La clave se fija con bind() cuando se conoce la última barra;
+    el día guarda a qué clave apunta para que un reintento la conozca antes de
+    descargar los datos.
+
+    Los resultados de las etapas que dependen de los modelos guardan la versión
+    de los artefactos con la que se calcularon y solo se reutilizan si sigue
+    siendo la actual (un reentrenamiento a mitad de la ejecución, en cambio,
+    no invalida los datos ya descargados).
+
+    Args:
+        params: Parámetros que afectan al resultado (entran en la clave)
+        root: Directorio de la caché
+        day: Día de la ejecución (por defecto hoy)
+        model_dir: Directorio de los modelos
+        model_stages: Etapas que dependen de los modelos (None = todas)
+    """
+
+    def __init__(self, params, root=RUN_CACHE_DIR, day=None, model_dir=MODEL_DIR, model_stages=None):
+        self.params = params
+        self.root = root
+        self.day = (day or date.today()).isoformat()
+        self.model_dir = model_dir
+        self.model_stages = model_stages
+        self.key = None
+        self.as_of = None
+
+        # Si hoy ya hubo una ejecución, se retoma con la misma barra
+        pointer = self._pointer_path()
+        if os.path.exists(pointer):
+            try:
+                with open(pointer, 'r') as f:
+                    self.bind(json.load(f)['as_of'], write_pointer=False)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Puntero de la caché de ejecución ilegible ({e}); se ignora")
+
+    def _pointer_path(self):
+        return os.path.join(self.root, f"{self.day}.json")
+
+    def _stage_path(self, stage):
+        return os.path.join(self.root, self.key, f"{stage}.pkl")
+
+    def bind(self, as_of, write_pointer=True):
+        """
+        Fija la clave de la ejecución a partir de la última barra de los datos.
+
+        Returns:
+            str: Clave de la ejecución
+        """
+        self.key = run_key(as_of, self.params)
+        self.as_of = str(as_of)
+        os.makedirs(os.path.join(self.root, self.key), exist_ok=True)
+        if write_pointer:
+            with open(self._pointer_path(), 'w') as f:
+                json.dump({'as_of': str(as_of), 'key': self.key}, f)
+        return self.key
+
+    def _model_version(self, stage):
+        if self.model_stages is not None and stage not in self.model_stages:
+            return None
+        return artifact_version(self.model_dir)
+
+    def get(self, stage):
+        """
+        Returns:
+            tuple: (True, resultado) si la etapa está en la caché, (False, None) si no
+        """
+        if self.key is None or not os.path.exists(self._stage_path(stage)):
+            return False, None
+        try:
+            with open(self._stage_path(stage), 'rb') as f:
+                entry = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Resultado de '{stage}' en caché ilegible ({e}); se recalcula")
+            return False, None
+        if entry['models'] != self._model_version(stage):
+            logger.info(f"Los modelos han cambiado desde que se guardó '{stage}'; se recalcula")
+            return False, None
+        return True, entry['result']
+
+    def put(self, stage, result):
+        """Guarda el resultado de una etapa (no hace nada hasta que hay clave)."""
+        if self.key is None:
+            return
+        path = self._stage_path(stage)
+        # Escritura atómica: un fallo a mitad no deja un resultado corrupto
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump({'models': self._model_version(stage), 'result': result}, f)
+        os.replace(tmp, path)
+
+    def prune(self, keep_days=RUN_CACHE_KEEP_DAYS):
+        """Borra las ejecuciones de días anteriores a los keep_days más recientes."""
+        if not os.path.isdir(self.root):
+            return
+        pointers = sorted(name for name in os.listdir(self.root) if name.endswith(".json"))
+        keep_keys = set()
+        for name in pointers[-keep_days:]:
+            try:
+                with open(os.path.join(self.root, name), 'r') as f:
+                    keep_keys.add(json.load(f)['key'])
+            except (OSError, ValueError, KeyError):
+                pass
+        for name in pointers[:-keep_days]:
+            os.remove(os.path.join(self.root, name))
+        if self.key is not None:
+            keep_keys.add(self.key)
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path) and name not in keep_keys:
+                shutil.rmtree(path, ignore_errors=True)
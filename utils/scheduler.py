@@ -53,14 +53,37 @@ def schedule_training(data):
         except Exception as e:
             logger.error(f"Error durante el entrenamiento programado: {e}")
             # En caso de error, intentar cargar modelos existentes
-            rf_model, lstm_model = _load_models(data)
+            rf_model, lstm_model = _load_models(data.columns)
             return rf_model, lstm_model
     else:
         # Si no es necesario entrenar, cargar modelos existentes
         logger.info("Cargando modelos existentes...")
-        rf_model, lstm_model = _load_models(data)
+        rf_model, lstm_model = _load_models(data.columns)
         return rf_model, lstm_model
 
+def load_current_models(tickers):
+    """
+    Carga los modelos guardados si no toca reentrenar. No necesita los datos,
+    así que puede hacerse mientras se descargan.
+    
+    Args:
+        tickers: Tickers cuyos modelos LSTM cargar
+    
+    Returns:
+        tuple: (modelo_rf, modelo_lstm), o None si hay que entrenar (usar schedule_training)
+    """
+    if is_training_due():
+        return None
+    logger.info("Cargando modelos existentes...")
+    return _load_models(tickers)
+
+def is_training_due():
+    """
+    Returns:
+        bool: True si toca reentrenar o aún no hay modelos guardados
+    """
+    return _check_training_required() or not os.path.exists(RF_MODEL_FILE)
+
 def _check_training_required():
     """
     Determina si es necesario reentrenar los modelos basado en la fecha
@@ -114,12 +137,12 @@ def _save_rf_model(rf_model):
     except Exception as e:
         logger.error(f"Error guardando modelo RandomForest: {e}")
 
-def _load_models(data):
+def _load_models(tickers):
     """
     Carga los modelos previamente guardados.
     
     Args:
-        data: DataFrame con los datos históricos (para saber qué tickers cargar)
+        tickers: Tickers cuyos modelos LSTM cargar
         
     Returns:
         tuple: (modelo_rf, modelo_lstm) - modelos cargados o None si ocurre un error
@@ -138,7 +161,7 @@ def _load_models(data):
     
     # Cargar modelos LSTM y sus escaladores
     try:
-        lstm_model, _ = load_lstm_models(data.columns)
+        lstm_model, _ = load_lstm_models(tickers)
         logger.info(f"Cargados {len(lstm_model)} modelos LSTM correctamente")
     except Exception as e:
         logger.error(f"Error cargando modelos LSTM: {e}")
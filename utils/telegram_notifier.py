@@ -1,30 +1,238 @@
-import requests
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
 from utils.environment import TELEGRAM_API_TOKEN, TELEGRAM_CHAT_ID
+from utils.transport import get_session
+
+# Límite de longitud de un mensaje de Telegram
+TELEGRAM_MAX_LENGTH = 4096
+
+_default_notifier = None
+_default_lock = threading.Lock()
+
+class TelegramNotifier:
+    """
+    Envío de mensajes a Telegram en un hilo en segundo plano.
+
+    notify() solo encola: el código de trading nunca espera a la red. El hilo
+    emisor agrupa los mensajes que llegan casi a la vez en un único envío,
+    respeta el ritmo máximo de Telegram (y el retry_after de sus 429) y
+    reutiliza la conexión con una sesión keep-alive.
+
+    Args:
+        token: Token del bot
+        chat_id: Chat de destino
+        max_queue: Mensajes pendientes como máximo (los que no caben se descartan)
+        min_interval: Segundos mínimos entre envíos
+        coalesce_window: Segundos que se espera a más mensajes para agruparlos
+        timeout: Timeout de cada petición HTTP
+        session: Sesión HTTP a reutilizar (por defecto la compartida del proceso)
+    """
+
+    def __init__(self, token, chat_id, max_queue=1000, min_interval=1.0, coalesce_window=0.5,
+                 timeout=10, session=None):
+        self.token = token
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.coalesce_window = coalesce_window
+        self.timeout = timeout
+        self.dropped = 0
+        self.sent = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()  # pila de resúmenes abiertos con digest(), por hilo
+        self._digest_lock = threading.Lock()
+        self._last_send = 0.0
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        self.session = session if session is not None else get_session()
+
+    @property
+    def enabled(self):
+        return bool(self.token and self.chat_id)
+
+    def notify(self, message):
+        """
+        Encola un mensaje sin bloquear.
+
+        Returns:
+            bool: True si el mensaje se encoló (o se añadió al resumen en curso)
+        """
+        if not self.enabled:
+            print("Advertencia: Token de Telegram o Chat ID no configurados")
+            return False
+
+        digests = self._digests()
+        if digests:
+            with self._digest_lock:
+                digests[-1].append(message)
+            return True
+
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _digests(self):
+        digests = getattr(self._local, 'digests', None)
+        if digests is None:
+            digests = self._local.digests = []
+        return digests
+
+    @contextmanager
+    def digest(self, title=None):
+        """
+        Agrupa en un único mensaje todo lo notificado dentro del bloque por
+        este hilo (p.ej. un ciclo del monitor o un rebalanceo). Lo que notifican
+        otros hilos (streams, callbacks) sale aparte, salvo que se unan al
+        resumen con joined().
+
+        Returns:
+            list: Resumen abierto, para pasarlo a joined()
+        """
+        messages = []
+        digests = self._digests()
+        digests.append(messages)
+        try:
+            yield messages
+        finally:
+            digests.pop()
+            with self._digest_lock:
+                body = "\n".join(messages)
+            if body:
+                self.notify(f"{title}\n{body}" if title else body)
+
+    def current_digest(self):
+        """Resumen abierto más interno de este hilo (None si no hay ninguno)."""
+        digests = self._digests()
+        return digests[-1] if digests else None
+
+    @contextmanager
+    def joined(self, digest):
+        """
+        Envía al resumen dado lo notificado por este hilo dentro del bloque
+        (p.ej. un hilo de trabajo del resumen de otro hilo). Sin resumen no hace nada.
+        """
+        if digest is None:
+            yield
+            return
+        digests = self._digests()
+        digests.append(digest)
+        try:
+            yield
+        finally:
+            digests.pop()
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="telegram-notifier", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            messages = [self._queue.get()]
+            # Esperar un poco a los mensajes que lleguen justo después para enviarlos juntos
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    messages.append(self._queue.get(timeout=max(remaining, 0)) if remaining > 0
+                                    else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for chunk in _split("\n\n".join(messages)):
+                self._send(chunk)
+            for _ in messages:
+                self._queue.task_done()
+
+    def _send(self, text, attempts=3):
+        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        data = {"chat_id": self.chat_id, "text": text, "parse_mode": "HTML"}
+        for _ in range(attempts):
+            wait = self.min_interval - (time.monotonic() - self._last_send)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = self.session.post(url, data=data, timeout=self.timeout)
+                self._last_send = time.monotonic()
+                if response.status_code == 429:
+                    # Telegram indica cuánto esperar antes de reintentar
+                    retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+                    time.sleep(retry_after)
+                    continue
+                if response.status_code == 200:
+                    self.sent += 1
+                    return True
+                print(f"Error enviando mensaje a Telegram: HTTP {response.status_code}")
+                return False
+            except Exception as e:
+                self._last_send = time.monotonic()
+                print(f"Excepción enviando mensaje: {e}")
+        return False
+
+    def flush(self, timeout=None):
+        """
+        Espera a que se envíen los mensajes pendientes.
+
+        Returns:
+            bool: True si la cola quedó vacía antes del timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+def _split(text, limit=TELEGRAM_MAX_LENGTH):
+    """Divide un texto en trozos que quepan en un mensaje, por saltos de línea."""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        chunks.append(text)
+    return chunks
+
+def get_notifier():
+    """
+    Notificador compartido por el proceso. Al terminar se esperan (con límite)
+    los mensajes pendientes para no perderlos en las ejecuciones de cron.
+    """
+    global _default_notifier
+    with _default_lock:
+        if _default_notifier is None:
+            _default_notifier = TelegramNotifier(TELEGRAM_API_TOKEN, TELEGRAM_CHAT_ID)
+            atexit.register(_default_notifier.flush, 30)
+        return _default_notifier
+
+def set_notifier(notifier):
+    """Sustituye el notificador compartido (por ejemplo, en benchmarks)."""
+    global _default_notifier
+    with _default_lock:
+        _default_notifier = notifier
 
 def send_telegram_message(message):
     """
     Envía un mensaje a través de Telegram usando el token y chat ID definidos
     en las variables de entorno.
-    
+
+    El envío se hace en segundo plano: la llamada no espera a la red.
+
     Args:
         message: Texto del mensaje a enviar
-    
+
     Returns:
-        bool: True si el mensaje se envió con éxito, False en caso contrario
+        bool: True si el mensaje quedó encolado, False en caso contrario
     """
-    if not TELEGRAM_API_TOKEN or not TELEGRAM_CHAT_ID:
-        print("Advertencia: Token de Telegram o Chat ID no configurados")
-        return False
-        
-    url = f"https://api.telegram.org/bot{TELEGRAM_API_TOKEN}/sendMessage"
-    data = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": message,
-        "parse_mode": "HTML"
-    }
-    try:
-        response = requests.post(url, data=data)
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Excepción enviando mensaje: {e}")
-        return False
+    return get_notifier().notify(message)
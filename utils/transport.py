@@ -0,0 +1,180 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+import alpaca_trade_api as tradeapi
+from requests.adapters import HTTPAdapter
+from utils import metrics
+
+# Configuración de logging
+logger = logging.getLogger("trading_bot")
+
+# Conexiones keep-alive por host y hosts distintos con pool propio
+POOL_MAXSIZE = 16
+POOL_CONNECTIONS = 8
+
+# Timeout por defecto (conexión, lectura) en segundos
+DEFAULT_TIMEOUT = (5, 30)
+
+# Reintentos ante errores de red y 5xx transitorios
+TRANSPORT_RETRIES = 2
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 4.0
+RETRY_STATUSES = (502, 503, 504)
+
+# Solo se reintentan métodos idempotentes: una orden (POST) nunca se reenvía aquí
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'DELETE')
+
+# Latencias guardadas por host para los percentiles
+LATENCY_SAMPLES = 1000
+
+_shared_session = None
+_session_lock = threading.Lock()
+
+class TransportStats:
+    """
+    Métricas por host de las peticiones HTTP: número, errores, reintentos y latencias.
+    """
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self._samples = samples
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, host):
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = {
+                'requests': 0, 'errors': 0, 'retries': 0, 'total_s': 0.0,
+                'latencies': deque(maxlen=self._samples)
+            }
+        return stats
+
+    def record(self, host, elapsed, error=False):
+        metrics.observe("http_request_duration_seconds", elapsed, host=host)
+        metrics.inc("http_requests_total", host=host, outcome="error" if error else "ok")
+        with self._lock:
+            stats = self._host(host)
+            stats['requests'] += 1
+            stats['errors'] += int(error)
+            stats['total_s'] += elapsed
+            stats['latencies'].append(elapsed)
+
+    def record_retry(self, host):
+        metrics.inc("http_retries_total", host=host)
+        with self._lock:
+            self._host(host)['retries'] += 1
+
+    def summary(self):
+        """
+        Returns:
+            dict: Host -> requests, errors, retries, total_s, p50_ms, p95_ms, max_ms
+        """
+        with self._lock:
+            hosts = {host: dict(stats, latencies=sorted(stats['latencies'])) for host, stats in self._hosts.items()}
+        summary = {}
+        for host, stats in hosts.items():
+            latencies = stats.pop('latencies')
+            def percentile(q):
+                return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1) if latencies else 0.0
+            summary[host] = dict(stats, total_s=round(stats['total_s'], 3), p50_ms=percentile(0.5),
+                                 p95_ms=percentile(0.95), max_ms=round(latencies[-1] * 1000, 1) if latencies else 0.0)
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+class PooledSession(requests.Session):
+    """
+    Sesión HTTP con pools keep-alive por host, timeout por defecto, reintentos
+    con backoff y jitter para métodos idempotentes y métricas de latencia.
+
+    Es un requests.Session normal, así que se puede inyectar en cualquier
+    cliente que use requests (Alpaca, Telegram, yfinance...).
+
+    Args:
+        timeout: Timeout por defecto si la petición no indica uno
+        retries: Reintentos ante errores de red o respuestas RETRY_STATUSES
+        pool_maxsize: Conexiones keep-alive por host
+        pool_connections: Número de hosts con pool propio
+        stats: TransportStats donde registrar las métricas
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=TRANSPORT_RETRIES, pool_maxsize=POOL_MAXSIZE,
+                 pool_connections=POOL_CONNECTIONS, stats=None):
+        super().__init__()
+        self.timeout = timeout
+        self.retries = retries
+        self.stats = stats if stats is not None else TransportStats()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        # Solo el host: la URL puede llevar credenciales (p.ej. el token de Telegram)
+        host = urlsplit(str(url)).netloc
+        retries = self.retries if method.upper() in IDEMPOTENT_METHODS else 0
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.stats.record(host, time.perf_counter() - start, error=True)
+                if attempt >= retries:
+                    raise
+            else:
+                error = response.status_code >= 500
+                self.stats.record(host, time.perf_counter() - start, error=error)
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                response.close()
+
+            self.stats.record_retry(host)
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+            time.sleep(random.uniform(0, delay))
+            attempt += 1
+
+def get_session():
+    """
+    Sesión compartida por todo el proceso, creada la primera vez que se usa.
+    """
+    global _shared_session
+    with _session_lock:
+        if _shared_session is None:
+            _shared_session = PooledSession()
+        return _shared_session
+
+def set_session(session):
+    """Sustituye la sesión compartida (por ejemplo, en benchmarks)."""
+    global _shared_session
+    with _session_lock:
+        _shared_session = session
+
+def rest_client(key_id, secret_key, base_url, api_version='v2'):
+    """
+    Cliente REST de Alpaca que usa la sesión compartida en lugar de abrir la suya.
+    """
+    api = tradeapi.REST(key_id, secret_key, base_url, api_version=api_version)
+    # Las credenciales van en las cabeceras de cada petición, así que la sesión se puede compartir
+    api._session = get_session()
+    return api
+
+def log_transport_stats():
+    """Escribe en el log las métricas de red acumuladas por host."""
+    stats = getattr(get_session(), 'stats', None)
+    if stats is None:
+        return
+    for host, host_stats in sorted(stats.summary().items()):
+        logger.info(
+            f"Red {host}: {host_stats['requests']} peticiones, {host_stats['errors']} errores, "
+            f"{host_stats['retries']} reintentos, {host_stats['total_s']}s en total "
+            f"(p50 {host_stats['p50_ms']}ms, p95 {host_stats['p95_ms']}ms, máx {host_stats['max_ms']}ms)"
+        )